@@ -0,0 +1,348 @@
+"""rag 패키지 오프라인 벤치마크
+
+OpenAI 임베딩과 프롬프트 허브 대신 결정적(deterministic) 가짜 임베딩과 고정 응답
+LLM을 사용하므로 네트워크 없이 실행됩니다. 결과는 JSON으로 저장되며 --compare로
+이전 결과와 비교할 수 있습니다.
+
+사용 예:
+    python -m rag.benchmark --sizes 1000 5000 --output bench.json
+    python -m rag.benchmark --compare bench.json
+"""
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.prompts import ChatPromptTemplate
+from rag.pdf import PDFRetrievalChain
+from rag.utils import format_docs
+
+from contextlib import redirect_stdout
+from pathlib import Path
+from typing import Dict, List
+import argparse
+import hashlib
+import io
+import json
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import numpy as np
+
+
+class FakeEmbeddings(Embeddings):
+    """텍스트 해시로 시드를 정하는 결정적 가짜 임베딩입니다.
+
+    latency를 지정하면 요청마다 네트워크 왕복 시간을 흉내 내어 대기합니다.
+    """
+
+    def __init__(self, size: int = 256, latency: float = 0.0):
+        self.size = size
+        self.latency = latency
+        self.requests = 0
+
+    def _embed(self, text: str) -> List[float]:
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        seed = int.from_bytes(digest[:8], "big")
+        vector = np.random.default_rng(seed).standard_normal(self.size)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+class BenchmarkPDFRetrievalChain(PDFRetrievalChain):
+    """가짜 임베딩, 고정 응답 LLM, 로컬 프롬프트를 사용하는 PDFRetrievalChain입니다."""
+
+    def __init__(self, source_uri, work_dir, embedding_latency=0.0, **kwargs):
+        # 페이지 캐시는 생성자에서 열리므로 처음부터 work_dir 안의 파일을 사용합니다.
+        kwargs.setdefault("page_cache_path", Path(work_dir) / "pages.sqlite")
+        with redirect_stdout(io.StringIO()):
+            super().__init__(source_uri, **kwargs)
+        self.cache_dir = Path(work_dir) / "embeddings"
+        self.index_dir = Path(work_dir) / "faiss_index"
+        self.shard_dir = Path(work_dir) / "shards"
+        self.embedding_latency = embedding_latency
+
+    def create_base_embedding(self):
+        return FakeEmbeddings(latency=self.embedding_latency)
+
+    def create_model(self):
+        return FakeListChatModel(responses=["benchmark answer"])
+
+    def create_prompt(self):
+        return ChatPromptTemplate.from_template(
+            "Question: {question}\nContext: {context}\nAnswer:"
+        )
+
+
+def timed(func, *args, **kwargs):
+    """함수를 출력 없이 실행하고 (결과, 경과 시간(초))를 반환합니다."""
+    with redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+    return result, elapsed
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """밀리초 단위 p50/p95/p99와 평균을 계산합니다."""
+    ms = sorted(sample * 1000 for sample in samples)
+    quantiles = statistics.quantiles(ms, n=100, method="inclusive")
+    return {
+        "p50_ms": quantiles[49],
+        "p95_ms": quantiles[94],
+        "p99_ms": quantiles[98],
+        "mean_ms": statistics.fmean(ms),
+    }
+
+
+def synthetic_chunks(pages: List[Document], size: int) -> List[Document]:
+    """실제 PDF 페이지 텍스트를 변형하여 size개의 서로 다른 청크를 만듭니다."""
+    rng = random.Random(0)
+    words = " ".join(page.page_content for page in pages).split() or ["empty"]
+    chunks = []
+    for i in range(size):
+        start = rng.randrange(len(words))
+        text = " ".join(words[start : start + 180])
+        chunks.append(
+            Document(
+                page_content=f"{text} [{i}]",
+                metadata={"source": f"synthetic-{i // 50}.pdf", "page": i % 50},
+            )
+        )
+    return chunks
+
+
+def bench_load(source_uris, work_dir, workers: List[int]) -> Dict:
+    results = {}
+    for num_workers in workers:
+        chain = BenchmarkPDFRetrievalChain(
+            source_uris, work_dir, num_workers=num_workers, page_cache_path=None
+        )
+        pages, elapsed = timed(chain.load_documents, source_uris)
+        results[f"workers_{num_workers}"] = {
+            "pages": len(pages),
+            "seconds": elapsed,
+            "pages_per_sec": len(pages) / elapsed,
+        }
+
+    # 페이지 캐시: 첫 로딩(추출 후 저장)과 두 번째 로딩(캐시에서 읽기)
+    chain = BenchmarkPDFRetrievalChain(source_uris, Path(work_dir) / "page-cache")
+    for mode in ("miss", "hit"):
+        _, elapsed = timed(chain.load_documents, source_uris)
+        results[f"page_cache_{mode}"] = {
+            "seconds": elapsed,
+            "pages_per_sec": len(pages) / elapsed,
+        }
+    return results, pages
+
+
+def bench_split(pages: List[Document], work_dir, repeat: int = 20) -> Dict:
+    chain = BenchmarkPDFRetrievalChain([], work_dir)
+    docs = pages * repeat
+    splitter = chain.create_text_splitter()
+    chunks, elapsed = timed(chain.split_documents, docs, splitter)
+    # 청크마다 Document를 만드는 text splitter 기본 분할과 비교
+    _, documents_elapsed = timed(splitter.split_documents, docs)
+    num_chars = sum(len(doc.page_content) for doc in docs)
+    return {
+        "pages": len(docs),
+        "chunks": len(chunks),
+        "seconds": elapsed,
+        "documents_seconds": documents_elapsed,
+        "chunks_per_sec": len(chunks) / elapsed,
+        "mb_per_sec": num_chars / elapsed / 1e6,
+    }
+
+
+def bench_embedding_cache(chunks: List[Document], work_dir, latency: float) -> Dict:
+    chain = BenchmarkPDFRetrievalChain([], work_dir, embedding_latency=latency)
+    texts = [chunk.page_content for chunk in chunks]
+    embedding, _ = timed(chain.create_embedding)
+    _, miss = timed(embedding.embed_documents, texts)
+    _, hit = timed(embedding.embed_documents, texts)
+    return {
+        "texts": len(texts),
+        "miss_seconds": miss,
+        "hit_seconds": hit,
+        "miss_ms_per_1k": miss * 1000 / len(texts) * 1000,
+        "hit_ms_per_1k": hit * 1000 / len(texts) * 1000,
+    }
+
+
+def bench_index(
+    pages, sizes, work_dir, index_types, num_queries: int, latency: float
+) -> Dict:
+    results = {}
+    rng = random.Random(1)
+    for size in sizes:
+        chunks = synthetic_chunks(pages, size)
+        queries = [
+            " ".join(rng.choice(chunks).page_content.split()[:8])
+            for _ in range(num_queries)
+        ]
+        for index_type in index_types:
+            run_dir = Path(work_dir) / f"index-{index_type}-{size}"
+            chain = BenchmarkPDFRetrievalChain(
+                [], run_dir, embedding_latency=latency, index_type=index_type
+            )
+            vectorstore, build = timed(chain.create_vectorstore, chunks)
+
+            # 임베딩 캐시가 채워진 상태에서 다시 빌드하여 순수 인덱스 구축 시간 측정
+            for path in chain.index_dir.rglob("*"):
+                if path.is_file():
+                    path.unlink()
+            _, rebuild = timed(chain.create_vectorstore, chunks)
+            _, reload = timed(chain.create_vectorstore, chunks)
+
+            retriever = chain.create_retriever(vectorstore)
+            latencies = []
+            for query in queries:
+                _, elapsed = timed(retriever.invoke, query)
+                latencies.append(elapsed)
+            _, format_elapsed = timed(format_docs, retriever.invoke(queries[0]))
+
+            # 질의 5개: 질의별 invoke와 한 번의 배치 검색 비교
+            multi_queries = queries[:5]
+            _, loop_elapsed = timed(
+                lambda: [retriever.invoke(query) for query in multi_queries]
+            )
+            _, batch_elapsed = timed(retriever.search_many, multi_queries)
+
+            # MMR: fetch_k개 후보에서 선택하는 추가 시간 (저장된 벡터 사용)
+            chain.search_type = "mmr"
+            mmr_retriever = chain.create_retriever(vectorstore)
+            mmr_latencies = []
+            for query in queries:
+                _, elapsed = timed(mmr_retriever.invoke, query)
+                mmr_latencies.append(elapsed)
+
+            results[f"{index_type}_{size}"] = {
+                "index_type": index_type,
+                "chunks": size,
+                "build_seconds": build,
+                "build_cached_embeddings_seconds": rebuild,
+                "load_from_cache_seconds": reload,
+                "retrieval": percentiles(latencies),
+                "mmr_retrieval": percentiles(mmr_latencies),
+                "format_docs_ms": format_elapsed * 1000,
+                "multi_query_loop_ms": loop_elapsed * 1000,
+                "multi_query_batch_ms": batch_elapsed * 1000,
+                "index_report": chain.index_report,
+            }
+    return results
+
+
+def bench_create_chain(source_uris, work_dir, latency: float) -> Dict:
+    run_dir = Path(work_dir) / "create-chain"
+    results = {}
+    for mode in ("cold", "warm"):
+        chain = BenchmarkPDFRetrievalChain(
+            source_uris, run_dir, embedding_latency=latency
+        )
+        _, elapsed = timed(chain.create_chain)
+        results[f"{mode}_seconds"] = elapsed
+    return results
+
+
+def run(args) -> Dict:
+    source_uris = [str(path) for path in args.pdf] or [
+        str(path) for path in sorted(Path("data").glob("*.pdf"))
+    ]
+    if not source_uris:
+        raise SystemExit("No PDF files found. Pass --pdf or run next to data/.")
+
+    with tempfile.TemporaryDirectory(prefix="rag-bench-") as work_dir:
+        load, pages = bench_load(source_uris, work_dir, args.workers)
+        chunks = synthetic_chunks(pages, args.cache_texts)
+        results = {
+            "meta": {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "sources": source_uris,
+                "embedding_latency": args.embedding_latency,
+            },
+            "pdf_load": load,
+            "split": bench_split(pages, work_dir),
+            "embedding_cache": bench_embedding_cache(
+                chunks, Path(work_dir) / "embedding-cache", args.embedding_latency
+            ),
+            "index": bench_index(
+                pages,
+                args.sizes,
+                work_dir,
+                args.index_types,
+                args.queries,
+                args.embedding_latency,
+            ),
+            "create_chain": bench_create_chain(
+                source_uris, work_dir, args.embedding_latency
+            ),
+        }
+    return results
+
+
+def flatten(results: Dict, prefix: str = "") -> Dict[str, float]:
+    """중첩된 결과를 'a.b.c' 형태의 숫자 지표로 펼칩니다."""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(baseline: Dict, current: Dict) -> None:
+    """두 결과에서 공통 지표를 비교하여 변화율을 출력합니다."""
+    base, cur = flatten(baseline), flatten(current)
+    for name in sorted(base.keys() & cur.keys()):
+        if name.startswith("meta.") or not base[name]:
+            continue
+        change = (cur[name] - base[name]) / base[name] * 100
+        print(
+            f"{name:60s} {base[name]:>12.4f} -> {cur[name]:>12.4f} ({change:+.1f}%)"
+        )
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Offline rag benchmark")
+    parser.add_argument("--pdf", nargs="*", default=[], help="default: data/*.pdf")
+    parser.add_argument("--sizes", nargs="*", type=int, default=[1000, 5000, 20000])
+    parser.add_argument("--index-types", nargs="*", default=["flat"])
+    parser.add_argument("--workers", nargs="*", type=int, default=[1, 4])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--cache-texts", type=int, default=2000)
+    parser.add_argument("--embedding-latency", type=float, default=0.0)
+    parser.add_argument("--output", default=None, help="JSON output path")
+    parser.add_argument("--compare", default=None, help="Baseline JSON to compare")
+    args = parser.parse_args(argv)
+
+    results = run(args)
+
+    timestamp = time.strftime("%Y%m%d-%H%M%S")
+    output = args.output or f".benchmarks/rag-{timestamp}.json"
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+    Path(output).write_text(json.dumps(results, indent=2, ensure_ascii=False))
+    print(f"Saved benchmark results to {output}")
+
+    if args.compare:
+        compare(json.loads(Path(args.compare).read_text()), results)
+    else:
+        json.dump(results, sys.stdout, indent=2, ensure_ascii=False)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+from langchain_core.stores import ByteStore
+from langchain.storage import EncoderBackedStore
+from array import array
+from itertools import islice
+from pathlib import Path
+from typing import Iterator, List, Optional, Sequence, Tuple
+import hashlib
+import sqlite3
+import threading
+
+
+class SQLiteByteStore(ByteStore):
+    """하나의 SQLite 파일에 키-값을 저장하는 ByteStore입니다.
+
+    LocalFileStore처럼 값마다 파일을 만들지 않으므로 수십만 개의 벡터를 저장해도
+    파일 수가 늘지 않고, 파일 하나만 복사하면 다른 호스트로 캐시를 옮길 수 있습니다.
+    WAL 모드로 여러 프로세스가 동시에 읽을 수 있으며, 읽기는 mmap을 사용합니다.
+    """
+
+    # SQLite 바인딩 변수 개수 제한을 넘지 않도록 나누어 조회합니다.
+    _max_variables = 500
+
+    def __init__(self, path, mmap_size: int = 1 << 30):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(self.path), check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(f"PRAGMA mmap_size={int(mmap_size)}")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value BLOB NOT NULL)"
+            " WITHOUT ROWID"
+        )
+
+    def mget(self, keys: Sequence[str]) -> List[Optional[bytes]]:
+        found = {}
+        keys_iter = iter(keys)
+        with self._lock:
+            while batch := list(islice(keys_iter, self._max_variables)):
+                placeholders = ",".join("?" * len(batch))
+                found.update(
+                    self._conn.execute(
+                        f"SELECT key, value FROM kv WHERE key IN ({placeholders})",
+                        batch,
+                    )
+                )
+        return [found.get(key) for key in keys]
+
+    def mset(self, key_value_pairs: Sequence[Tuple[str, bytes]]) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?)",
+                    key_value_pairs,
+                )
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def mdelete(self, keys: Sequence[str]) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "DELETE FROM kv WHERE key = ?", [(key,) for key in keys]
+                )
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def yield_keys(self, *, prefix: Optional[str] = None) -> Iterator[str]:
+        with self._lock:
+            if prefix:
+                # LIKE 대신 범위 조건을 사용하여 기본 키 인덱스를 활용합니다.
+                rows = self._conn.execute(
+                    "SELECT key FROM kv WHERE key >= ? AND key < ? ORDER BY key",
+                    (prefix, prefix + "\U0010ffff"),
+                ).fetchall()
+            else:
+                rows = self._conn.execute("SELECT key FROM kv ORDER BY key").fetchall()
+        for (key,) in rows:
+            yield key
+
+    def compact(self) -> None:
+        """WAL 내용을 본 파일에 반영하고 삭제된 공간을 회수합니다."""
+        with self._lock:
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self._conn.execute("VACUUM")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def encode_vector(vector: List[float]) -> bytes:
+    """임베딩 벡터를 float32 바이트열로 변환합니다."""
+    return array("f", vector).tobytes()
+
+
+def decode_vector(data: bytes) -> List[float]:
+    """float32 바이트열을 임베딩 벡터로 변환합니다."""
+    vector = array("f")
+    vector.frombytes(data)
+    return vector.tolist()
+
+
+def create_embedding_store(path, namespace: str) -> EncoderBackedStore:
+    """CacheBackedEmbeddings에서 사용할 float32 벡터 캐시 저장소를 생성합니다.
+
+    키는 namespace(임베딩 모델명)와 텍스트의 SHA-256 해시로 구성되며,
+    값은 JSON 대신 raw float32 바이트열로 저장됩니다.
+    """
+
+    def key_encoder(text: str) -> str:
+        return namespace + hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    return EncoderBackedStore(
+        SQLiteByteStore(path),
+        key_encoder=key_encoder,
+        value_serializer=encode_vector,
+        value_deserializer=decode_vector,
+    )
@@ -0,0 +1,159 @@
+from langchain_core.embeddings import Embeddings
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+import asyncio
+import random
+import threading
+import time
+
+
+def is_throttled(error: Exception) -> bool:
+    """요청 한도 초과(HTTP 429) 오류인지 확인합니다."""
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(error, "response", None), "status_code", None)
+    return status_code == 429 or type(error).__name__ == "RateLimitError"
+
+
+class ConcurrentEmbeddings(Embeddings):
+    """텍스트를 배치로 나누어 여러 임베딩 요청을 동시에 보내는 Embeddings 래퍼입니다.
+
+    요청 한도 초과(429)가 발생하면 모든 요청이 지수 백오프 시간만큼 대기하고
+    동시 요청 수를 절반으로 줄입니다. 이후 요청이 연속으로 성공하면 동시 요청 수를
+    max_concurrency까지 하나씩 다시 늘립니다.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        batch_size: int = 128,
+        max_concurrency: int = 4,
+        max_retries: int = 6,
+        initial_backoff: float = 1.0,
+        max_backoff: float = 60.0,
+    ):
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+
+        # 적응형 동시 요청 수와 백오프 상태 (모든 호출이 공유)
+        self._lock = threading.Lock()
+        self._limit = max_concurrency
+        self._successes = 0
+        self._resume_at = 0.0
+
+    def _batches(self, texts: List[str]) -> List[List[str]]:
+        return [
+            texts[i : i + self.batch_size]
+            for i in range(0, len(texts), self.batch_size)
+        ]
+
+    def _throttle_delay(self) -> float:
+        with self._lock:
+            return max(0.0, self._resume_at - time.monotonic())
+
+    def _on_throttled(self, attempt: int) -> None:
+        """백오프 시간을 설정하고 동시 요청 수를 절반으로 줄입니다."""
+        delay = min(self.max_backoff, self.initial_backoff * 2**attempt)
+        delay *= 0.5 + random.random() / 2
+        with self._lock:
+            self._resume_at = max(self._resume_at, time.monotonic() + delay)
+            self._limit = max(1, self._limit // 2)
+            self._successes = 0
+
+    def _on_success(self) -> None:
+        """연속 성공 시 동시 요청 수를 하나씩 늘립니다."""
+        with self._lock:
+            self._successes += 1
+            if self._successes >= self._limit and self._limit < self.max_concurrency:
+                self._limit += 1
+                self._successes = 0
+
+    def _embed_batch(self, batch: List[str]) -> List[List[float]]:
+        return self._with_retry(self.embeddings.embed_documents, batch)
+
+    async def _aembed_batch(self, batch: List[str]) -> List[List[float]]:
+        return await self._awith_retry(self.embeddings.aembed_documents, batch)
+
+    def _with_retry(self, func, *args):
+        """요청 한도 초과 시 백오프 후 재시도하며 임베딩 요청을 실행합니다."""
+        for attempt in range(self.max_retries + 1):
+            time.sleep(self._throttle_delay())
+            try:
+                result = func(*args)
+            except Exception as e:
+                if not is_throttled(e) or attempt == self.max_retries:
+                    raise
+                self._on_throttled(attempt)
+                continue
+            self._on_success()
+            return result
+
+    async def _awith_retry(self, func, *args):
+        """_with_retry의 비동기 버전입니다."""
+        for attempt in range(self.max_retries + 1):
+            await asyncio.sleep(self._throttle_delay())
+            try:
+                result = await func(*args)
+            except Exception as e:
+                if not is_throttled(e) or attempt == self.max_retries:
+                    raise
+                self._on_throttled(attempt)
+                continue
+            self._on_success()
+            return result
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        batches = self._batches(texts)
+        if len(batches) <= 1:
+            return self._embed_batch(batches[0]) if batches else []
+
+        results = [None] * len(batches)
+        slots = threading.Condition()
+        in_flight = 0
+
+        def run(i: int) -> None:
+            nonlocal in_flight
+            with slots:
+                slots.wait_for(lambda: in_flight < self._limit)
+                in_flight += 1
+            try:
+                results[i] = self._embed_batch(batches[i])
+            finally:
+                with slots:
+                    in_flight -= 1
+                    slots.notify_all()
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            list(executor.map(run, range(len(batches))))
+
+        return [vector for vectors in results for vector in vectors]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        batches = self._batches(texts)
+        slots = asyncio.Condition()
+        in_flight = 0
+
+        async def run(batch: List[str]) -> List[List[float]]:
+            nonlocal in_flight
+            async with slots:
+                await slots.wait_for(lambda: in_flight < self._limit)
+                in_flight += 1
+            try:
+                return await self._aembed_batch(batch)
+            finally:
+                async with slots:
+                    in_flight -= 1
+                    slots.notify_all()
+
+        results = await asyncio.gather(*(run(batch) for batch in batches))
+        return [vector for vectors in results for vector in vectors]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._with_retry(self.embeddings.embed_query, text)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self._awith_retry(self.embeddings.aembed_query, text)
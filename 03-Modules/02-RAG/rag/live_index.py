@@ -0,0 +1,380 @@
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from rag.bm25 import BM25Index
+from rag.cache import decode_vector, encode_vector
+from rag.mmap_store import has_docstore, load_vectorstore, save_vectorstore, to_writable
+
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple
+import asyncio
+import base64
+import json
+import os
+import sys
+import threading
+import time
+
+
+WAL_FILE = "wal.jsonl"
+WAL_ARCHIVE = "wal.archive.jsonl"
+SNAPSHOT_DIR = "snapshot"
+SNAPSHOT_META = "snapshot.json"
+
+
+class LiveIndex:
+    """검색 중에도 문서를 추가할 수 있는 내구성 있는 FAISS + BM25 인덱스입니다.
+
+    - 쓰기 전 로그(WAL): 추가된 청크를 임베딩 벡터와 함께 wal.jsonl에 덧붙이고
+      fsync한 뒤에 인덱스에 반영하므로, 재시작해도 추가한 문서가 유지됩니다.
+    - 마이크로 배치: 동시에 들어온 추가 요청을 max_batch_delay 동안 모아
+      한 번의 임베딩 요청과 한 번의 인덱스 갱신으로 처리합니다.
+    - 스냅샷: snapshot_every개의 청크 또는 snapshot_interval초마다 인덱스를
+      저장하고, 시작할 때 스냅샷을 읽은 뒤 그 이후의 WAL만 다시 적용합니다.
+      스냅샷에 반영된 WAL 기록은 wal.archive.jsonl로 옮겨지며, 원본 문서가
+      바뀌어 인덱스를 새로 만들 때만 읽습니다.
+    - 일관된 읽기: 인덱스를 두 벌(replica) 유지합니다. 쓰기는 읽는 사람이 없는
+      replica에 적용한 뒤 교체하고, 이전 replica의 검색이 끝나면 같은 변경을
+      적용합니다. 따라서 검색은 잠금을 기다리지 않고 항상 배치 단위로 완결된
+      인덱스를 봅니다. (대신 메모리를 두 배 사용합니다.)
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        data_dir,
+        max_batch_size: int = 256,
+        max_batch_delay: float = 0.02,
+        max_pending: int = 1024,
+        snapshot_every: int = 1000,
+        snapshot_interval: float = 60.0,
+        on_update: Optional[Callable[[], None]] = None,
+    ):
+        self.embeddings = embeddings
+        self.data_dir = Path(data_dir)
+        self.max_batch_size = max_batch_size
+        self.max_batch_delay = max_batch_delay
+        self.max_pending = max_pending
+        self.snapshot_every = snapshot_every
+        self.snapshot_interval = snapshot_interval
+        self.on_update = on_update
+
+        self._replicas: List[Optional[Tuple[FAISS, BM25Index]]] = [None, None]
+        self._active = 0
+        self._readers = [0, 0]
+        self._cond = threading.Condition()
+
+        self._seq = 0
+        self._snapshot_seq = 0
+        self._snapshot_time = time.monotonic()
+        self._source = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._writer: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._replicas[self._active] is not None
+
+    @contextmanager
+    def read(self) -> Iterator[Tuple[FAISS, BM25Index]]:
+        """현재 인덱스 (vector_store, keyword_index)를 반환합니다.
+
+        with 블록 안에서는 쓰기가 진행되어도 같은 인덱스를 계속 사용할 수 있습니다.
+        """
+        with self._cond:
+            replica = self._active
+            self._readers[replica] += 1
+        try:
+            yield self._replicas[replica]
+        finally:
+            with self._cond:
+                self._readers[replica] -= 1
+                if not self._readers[replica]:
+                    self._cond.notify_all()
+
+    def _wait_for_readers(self, replica: int) -> None:
+        with self._cond:
+            self._cond.wait_for(lambda: not self._readers[replica])
+
+    def _create_replica(self, docs: Sequence[Document], vectors) -> Tuple:
+        vector_store = FAISS.from_embeddings(
+            zip([doc.page_content for doc in docs], vectors),
+            self.embeddings,
+            metadatas=[doc.metadata for doc in docs],
+        )
+        keyword_index = BM25Index()
+        keyword_index.add_documents(docs)
+        return vector_store, keyword_index
+
+    def build(self, docs: Sequence[Document], vectors, source=None) -> None:
+        """원본 문서로 인덱스를 새로 만들고, WAL의 추가 문서를 모두 다시 적용합니다."""
+        self._replicas = [self._create_replica(docs, vectors) for _ in range(2)]
+        self._source = source
+        self._snapshot_seq = 0
+        self._replay_wal(include_archive=True)
+        self.snapshot()
+
+    def load(self, source=None) -> bool:
+        """스냅샷을 로드하고 이후의 WAL을 적용합니다. 사용할 수 없으면 False."""
+        meta_file = self.data_dir / SNAPSHOT_META
+        snapshot_dir = self.data_dir / SNAPSHOT_DIR
+        try:
+            if not meta_file.exists():
+                return False
+            meta = json.loads(meta_file.read_text())
+            # JSON으로 저장된 값과 비교할 수 있도록 같은 형태로 변환
+            if meta.get("source") != json.loads(json.dumps(source)):
+                print(
+                    "Source changed, rebuilding index from source documents",
+                    file=sys.stderr,
+                )
+                return False
+
+            replicas = []
+            for _ in range(2):
+                vector_store = self._read_snapshot(snapshot_dir)
+                if vector_store.index.ntotal != meta.get("num_docs"):
+                    print(
+                        "Warning: Snapshot is incomplete, rebuilding index",
+                        file=sys.stderr,
+                    )
+                    return False
+                keyword_index = BM25Index()
+                keyword_index.add_documents(
+                    [
+                        vector_store.docstore.search(
+                            vector_store.index_to_docstore_id[position]
+                        )
+                        for position in range(vector_store.index.ntotal)
+                    ]
+                )
+                replicas.append((vector_store, keyword_index))
+        except Exception as e:
+            print(f"Warning: Failed to load index snapshot: {e}", file=sys.stderr)
+            return False
+
+        self._replicas = replicas
+        self._source = source
+        self._snapshot_seq = self._seq = meta["seq"]
+        num_replayed = self._replay_wal()
+        print(
+            f"Loaded index snapshot ({meta['num_docs']} chunks, "
+            f"{num_replayed} chunks replayed from WAL)",
+            file=sys.stderr,
+        )
+        return True
+
+    def _read_snapshot(self, snapshot_dir) -> FAISS:
+        """저장된 스냅샷을 수정 가능한 vectorstore로 읽습니다."""
+        if has_docstore(snapshot_dir):
+            return to_writable(load_vectorstore(snapshot_dir, self.embeddings))
+        # 이전 버전에서 pickle로 저장된 스냅샷
+        return FAISS.load_local(
+            str(snapshot_dir), self.embeddings, allow_dangerous_deserialization=True
+        )
+
+    def _read_wal(self, include_archive: bool = False) -> Iterator[dict]:
+        """WAL 기록을 seq 순서대로 반환합니다. (보관 파일을 먼저 읽음)"""
+        names = (WAL_ARCHIVE, WAL_FILE) if include_archive else (WAL_FILE,)
+        last_seq = 0
+        for name in names:
+            wal_file = self.data_dir / name
+            if not wal_file.exists():
+                continue
+            with open(wal_file, "rb") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # 기록 도중 중단된 마지막 줄은 건너뜁니다.
+                        print(
+                            "Warning: Skipping incomplete WAL record",
+                            file=sys.stderr,
+                        )
+                        continue
+                    # WAL 정리 도중 중단되면 같은 기록이 두 파일에 남을 수 있습니다.
+                    if record["seq"] <= last_seq:
+                        continue
+                    last_seq = record["seq"]
+                    yield record
+
+    def _replay_wal(self, include_archive: bool = False) -> int:
+        docs, vectors = [], []
+        for record in self._read_wal(include_archive):
+            self._seq = max(self._seq, record["seq"])
+            if record["seq"] <= self._snapshot_seq:
+                continue
+            docs.append(
+                Document(page_content=record["text"], metadata=record["metadata"])
+            )
+            vectors.append(decode_vector(base64.b64decode(record["vector"])))
+        if docs:
+            for vector_store, keyword_index in self._replicas:
+                self._apply(vector_store, keyword_index, docs, vectors)
+        return len(docs)
+
+    def _apply(self, vector_store, keyword_index, docs, vectors) -> None:
+        vector_store.add_embeddings(
+            zip([doc.page_content for doc in docs], vectors),
+            metadatas=[doc.metadata for doc in docs],
+        )
+        keyword_index.add_documents(docs)
+
+    def _append_wal(self, docs, vectors) -> None:
+        """청크를 WAL에 덧붙이고 디스크에 기록될 때까지 기다립니다. (group commit)"""
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+        lines = []
+        for doc, vector in zip(docs, vectors):
+            self._seq += 1
+            record = {
+                "seq": self._seq,
+                "text": doc.page_content,
+                "metadata": doc.metadata,
+                "vector": base64.b64encode(encode_vector(vector)).decode("ascii"),
+            }
+            lines.append(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        with open(self.data_dir / WAL_FILE, "ab") as f:
+            f.write("".join(lines).encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def commit(self, docs: Sequence[Document], vectors) -> None:
+        """임베딩된 청크를 WAL에 기록하고 두 replica에 차례로 적용합니다."""
+        self._append_wal(docs, vectors)
+
+        standby = 1 - self._active
+        self._wait_for_readers(standby)
+        self._apply(*self._replicas[standby], docs, vectors)
+        with self._cond:
+            self._active = standby
+
+        # 새 검색은 갱신된 replica를 사용하고, 이전 replica는 검색이 끝난 뒤 갱신
+        previous = 1 - standby
+        self._wait_for_readers(previous)
+        self._apply(*self._replicas[previous], docs, vectors)
+
+        if self.on_update is not None:
+            self.on_update()
+
+    def add_documents_sync(self, docs: Sequence[Document]) -> int:
+        """이벤트 루프 밖에서 문서를 즉시 추가합니다. (배치 없이 동기 처리)"""
+        vectors = self.embeddings.embed_documents([doc.page_content for doc in docs])
+        self.commit(docs, vectors)
+        self._maybe_snapshot()
+        return self._seq
+
+    async def add_documents(self, docs: Sequence[Document]) -> int:
+        """문서를 추가하고, WAL에 기록되어 검색에 반영되면 마지막 seq를 반환합니다.
+
+        동시에 들어온 요청은 하나의 배치로 합쳐 처리됩니다. 처리 대기 중인 요청이
+        max_pending개를 넘으면 자리가 날 때까지 기다립니다.
+        """
+        if self._writer is None or self._writer.done():
+            self._queue = asyncio.Queue(self.max_pending)
+            self._writer = asyncio.create_task(self._run_writer())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((list(docs), future))
+        return await future
+
+    async def _next_batch(self) -> List[Tuple[List[Document], asyncio.Future]]:
+        batch = [await self._queue.get()]
+        num_docs = len(batch[0][0])
+        deadline = asyncio.get_running_loop().time() + self.max_batch_delay
+        while num_docs < self.max_batch_size:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            batch.append(item)
+            num_docs += len(item[0])
+        return batch
+
+    async def _run_writer(self) -> None:
+        while True:
+            batch = await self._next_batch()
+            docs = [doc for docs, _ in batch for doc in docs]
+            try:
+                vectors = await self.embeddings.aembed_documents(
+                    [doc.page_content for doc in docs]
+                )
+                await asyncio.to_thread(self.commit, docs, vectors)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for _, future in batch:
+                if not future.done():
+                    future.set_result(self._seq)
+            await asyncio.to_thread(self._maybe_snapshot)
+
+    def _maybe_snapshot(self) -> None:
+        pending = self._seq - self._snapshot_seq
+        elapsed = time.monotonic() - self._snapshot_time
+        if pending >= self.snapshot_every or (
+            pending and elapsed >= self.snapshot_interval
+        ):
+            self.snapshot()
+
+    def snapshot(self) -> None:
+        """대기 중인 replica를 저장합니다. (쓰기 작업 사이에서만 호출)"""
+        try:
+            vector_store, _ = self._replicas[1 - self._active]
+            save_vectorstore(self.data_dir / SNAPSHOT_DIR, vector_store)
+
+            # 메타데이터는 마지막에 교체하여, 중간에 중단되면 문서 수 불일치로 감지
+            meta = {
+                "seq": self._seq,
+                "num_docs": vector_store.index.ntotal,
+                "source": self._source,
+            }
+            meta_tmp = self.data_dir / (SNAPSHOT_META + ".tmp")
+            meta_tmp.write_text(json.dumps(meta, ensure_ascii=False))
+            os.replace(meta_tmp, self.data_dir / SNAPSHOT_META)
+
+            self._snapshot_seq = self._seq
+            self._snapshot_time = time.monotonic()
+        except Exception as e:
+            print(f"Warning: Failed to save index snapshot: {e}", file=sys.stderr)
+            return
+        try:
+            self._rotate_wal()
+        except Exception as e:
+            print(f"Warning: Failed to rotate WAL: {e}", file=sys.stderr)
+
+    def _rotate_wal(self) -> None:
+        """스냅샷에 반영된 WAL 기록을 보관 파일로 옮기고 이후 기록만 남깁니다.
+
+        시작할 때는 wal.jsonl만 다시 적용하므로 재시작 시간이 WAL 전체 크기에
+        비례하지 않습니다.
+        """
+        wal_file = self.data_dir / WAL_FILE
+        if not wal_file.exists():
+            return
+        archived, pending = [], []
+        with open(wal_file, "rb") as f:
+            for line in f:
+                try:
+                    seq = json.loads(line)["seq"]
+                except json.JSONDecodeError:
+                    continue
+                (archived if seq <= self._snapshot_seq else pending).append(line)
+
+        # 보관 파일에 먼저 기록한 뒤 WAL을 교체하므로 중간에 중단되어도 기록을
+        # 잃지 않습니다. (중복된 기록은 _read_wal에서 건너뜀)
+        if archived:
+            with open(self.data_dir / WAL_ARCHIVE, "ab") as f:
+                f.writelines(archived)
+                f.flush()
+                os.fsync(f.fileno())
+        wal_tmp = self.data_dir / (WAL_FILE + ".tmp")
+        with open(wal_tmp, "wb") as f:
+            f.writelines(pending)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(wal_tmp, wal_file)
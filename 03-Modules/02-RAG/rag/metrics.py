@@ -0,0 +1,283 @@
+from langchain_core.embeddings import Embeddings
+from langchain_core.stores import BaseStore
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+import bisect
+import sys
+import threading
+import time
+
+
+# 지연시간 히스토그램 버킷(초): 1ms ~ 2분
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+    10.0, 30.0, 60.0, 120.0,
+)  # fmt: skip
+
+# hook(kind, name, value, labels) - kind는 "counter" 또는 "histogram"
+MetricHook = Callable[[str, str, float, Dict[str, str]], None]
+
+# collector() -> [(name, value, labels), ...] - 내보낼 때마다 호출되는 gauge
+MetricCollector = Callable[[], Sequence[Tuple[str, float, Dict[str, str]]]]
+
+
+def _label_key(labels: Dict[str, Any]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (
+        (key, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in pairs
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+class Metrics:
+    """카운터와 지연시간 히스토그램을 모으는 스레드 안전한 레지스트리입니다.
+
+    - increment(): 카운터 증가 (예: 캐시 히트, 임베딩한 청크 수, 읽은 바이트)
+    - timer(): with 블록의 실행 시간을 히스토그램에 기록
+    - add_hook(): 기록될 때마다 호출되는 콜백 등록 (로깅, 트레이싱 연동 등)
+    - add_collector(): 내보낼 때 값을 읽어 오는 gauge 등록 (예: 질의 캐시 통계)
+    - to_prometheus(): Prometheus 텍스트 형식으로 내보내기
+    """
+
+    def __init__(self, namespace: str = "rag", buckets=DEFAULT_BUCKETS):
+        self.namespace = namespace
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[tuple, float]] = {}
+        self._histograms: Dict[str, Dict[tuple, Dict[str, Any]]] = {}
+        self._hooks: List[MetricHook] = []
+        self._collectors: List[MetricCollector] = []
+
+    def add_hook(self, hook: MetricHook) -> None:
+        self._hooks.append(hook)
+
+    def remove_hook(self, hook: MetricHook) -> None:
+        self._hooks.remove(hook)
+
+    def add_collector(self, collector: MetricCollector) -> None:
+        self._collectors.append(collector)
+
+    def _notify(self, kind: str, name: str, value: float, labels: Dict) -> None:
+        for hook in list(self._hooks):
+            try:
+                hook(kind, name, value, labels)
+            except Exception as e:
+                print(f"Warning: Metrics hook failed: {e}", file=sys.stderr)
+
+    def increment(self, name: str, value: float = 1, **labels) -> None:
+        """카운터를 value만큼 증가시킵니다."""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+        self._notify("counter", name, value, labels)
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        """히스토그램에 값(초)을 기록합니다."""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = {
+                    "buckets": [0] * len(self.buckets),
+                    "sum": 0.0,
+                    "count": 0,
+                }
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                histogram["buckets"][index] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+        self._notify("histogram", name, value, labels)
+
+    @contextmanager
+    def timer(self, name: str, errors: Optional[str] = None, **labels) -> Iterator:
+        """with 블록의 실행 시간을 기록합니다.
+
+        errors를 지정하면 예외가 발생했을 때 해당 이름의 카운터도 증가시킵니다.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            if errors:
+                self.increment(errors, **labels)
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def stage(self, stage: str):
+        """create_chain, 도구 호출 등의 단계별 실행 시간을 기록합니다."""
+        return self.timer("stage_duration_seconds", stage=stage)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """현재 카운터와 히스토그램 요약(count, sum)을 dict로 반환합니다."""
+        with self._lock:
+            counters = {
+                name: {_format_labels(key): value for key, value in series.items()}
+                for name, series in self._counters.items()
+            }
+            histograms = {
+                name: {
+                    _format_labels(key): {"count": h["count"], "sum": h["sum"]}
+                    for key, h in series.items()
+                }
+                for name, series in self._histograms.items()
+            }
+        return {"counters": counters, "histograms": histograms}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def to_prometheus(self) -> str:
+        """모든 지표를 Prometheus 텍스트 노출 형식(0.0.4)으로 반환합니다."""
+        prefix = f"{self.namespace}_" if self.namespace else ""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# TYPE {prefix}{name} counter")
+                for key, value in series.items():
+                    lines.append(f"{prefix}{name}{_format_labels(key)} {value}")
+
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f"# TYPE {prefix}{name} histogram")
+                for key, h in series.items():
+                    cumulative = 0
+                    for bound, count in zip(self.buckets, h["buckets"]):
+                        cumulative += count
+                        labels = _format_labels(key, ("le", str(bound)))
+                        lines.append(f"{prefix}{name}_bucket{labels} {cumulative}")
+                    labels = _format_labels(key, ("le", "+Inf"))
+                    lines.append(f"{prefix}{name}_bucket{labels} {h['count']}")
+                    lines.append(f"{prefix}{name}_sum{_format_labels(key)} {h['sum']}")
+                    lines.append(
+                        f"{prefix}{name}_count{_format_labels(key)} {h['count']}"
+                    )
+
+        gauges: Dict[str, List[str]] = {}
+        for collector in list(self._collectors):
+            try:
+                samples = collector()
+            except Exception as e:
+                print(f"Warning: Metrics collector failed: {e}", file=sys.stderr)
+                continue
+            for name, value, labels in samples:
+                gauges.setdefault(name, []).append(
+                    f"{prefix}{name}{_format_labels(_label_key(labels))} {value}"
+                )
+        for name, samples in sorted(gauges.items()):
+            lines.append(f"# TYPE {prefix}{name} gauge")
+            lines.extend(samples)
+
+        return "\n".join(lines) + "\n"
+
+
+# 별도로 지정하지 않으면 RetrievalChain과 MCP 서버가 함께 사용하는 레지스트리
+default_metrics = Metrics()
+
+
+class MeteredEmbeddings(Embeddings):
+    """임베딩 요청 시간("embed", "embed_query" 단계)과 임베딩한 청크 수를 기록합니다.
+
+    캐시(CacheBackedEmbeddings) 안쪽에 두면 캐시 미스로 실제 모델에 요청한
+    청크만 집계됩니다.
+    """
+
+    def __init__(self, embeddings: Embeddings, metrics: Metrics = default_metrics):
+        self.embeddings = embeddings
+        self.metrics = metrics
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with self.metrics.stage("embed"):
+            vectors = self.embeddings.embed_documents(texts)
+        self.metrics.increment("chunks_embedded_total", len(texts))
+        return vectors
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        with self.metrics.stage("embed"):
+            vectors = await self.embeddings.aembed_documents(texts)
+        self.metrics.increment("chunks_embedded_total", len(texts))
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        with self.metrics.stage("embed_query"):
+            return self.embeddings.embed_query(text)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        with self.metrics.stage("embed_query"):
+            return await self.embeddings.aembed_query(text)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """여러 질의를 한 번의 요청으로 임베딩합니다. (청크 수에는 포함하지 않음)"""
+        with self.metrics.stage("embed_query"):
+            return self.embeddings.embed_documents(texts)
+
+    async def aembed_queries(self, texts: List[str]) -> List[List[float]]:
+        with self.metrics.stage("embed_query"):
+            return await self.embeddings.aembed_documents(texts)
+
+
+class MeteredStore(BaseStore):
+    """조회(mget) 결과로 캐시 히트/미스 수를 집계하는 저장소 래퍼입니다."""
+
+    def __init__(self, store: BaseStore, name: str, metrics: Metrics = default_metrics):
+        self.store = store
+        self.name = name
+        self.metrics = metrics
+
+    def mget(self, keys: Sequence[str]) -> List[Optional[Any]]:
+        values = self.store.mget(keys)
+        hits = sum(value is not None for value in values)
+        self.metrics.increment("cache_hits_total", hits, cache=self.name)
+        self.metrics.increment(
+            "cache_misses_total", len(values) - hits, cache=self.name
+        )
+        return values
+
+    def mset(self, key_value_pairs: Sequence[Tuple[str, Any]]) -> None:
+        self.store.mset(key_value_pairs)
+
+    def mdelete(self, keys: Sequence[str]) -> None:
+        self.store.mdelete(keys)
+
+    def yield_keys(self, *, prefix: Optional[str] = None) -> Iterator[str]:
+        return self.store.yield_keys(prefix=prefix)
+
+
+def serve_prometheus(
+    metrics: Metrics = default_metrics, port: int = 9464, host: str = "127.0.0.1"
+) -> ThreadingHTTPServer:
+    """/metrics 경로로 Prometheus 지표를 제공하는 HTTP 서버를 백그라운드로 시작합니다."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.to_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # stdio MCP 서버의 stdout을 오염시키지 않도록 접근 로그를 남기지 않습니다.
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(
+        target=server.serve_forever, name="metrics-server", daemon=True
+    ).start()
+    return server
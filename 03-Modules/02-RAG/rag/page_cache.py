@@ -0,0 +1,120 @@
+from langchain_core.documents import Document
+from rag.cache import SQLiteByteStore
+
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence
+import hashlib
+import json
+import os
+import zlib
+
+
+class PageCache:
+    """PDF 페이지별 추출 텍스트를 저장하는 캐시입니다.
+
+    키는 (파일 내용 해시, 로더 종류, 페이지 번호)이므로 파일 경로가 바뀌어도
+    재사용되며, chunk_size나 임베딩 모델을 바꿔도 PDF를 다시 파싱하지 않습니다.
+    값은 zlib으로 압축한 JSON이고, 하나의 SQLite 파일(WAL 모드)에 저장되어
+    여러 프로세스가 함께 사용할 수 있습니다.
+    """
+
+    # 추출 결과 형식이 바뀌면 값을 올려 이전 캐시를 무시합니다.
+    version = 1
+
+    def __init__(self, path=".cache/pages.sqlite"):
+        self.path = Path(path)
+        self.store = SQLiteByteStore(self.path)
+
+    def file_hash(self, source_uri: str) -> str:
+        """파일 내용의 SHA-256 해시를 반환합니다.
+
+        크기와 수정 시각이 이전과 같으면 저장된 해시를 사용하여 파일을 다시 읽지 않습니다.
+        """
+        stat = os.stat(source_uri)
+        signature = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        stat_key = f"stat:{os.path.abspath(source_uri)}"
+        cached = self.store.mget([stat_key])[0]
+        if cached is not None:
+            record = json.loads(cached)
+            if record["size"] == signature["size"] and (
+                record["mtime_ns"] == signature["mtime_ns"]
+            ):
+                return record["sha256"]
+
+        file_hash = hashlib.sha256()
+        with open(source_uri, "rb") as f:
+            while block := f.read(1 << 20):
+                file_hash.update(block)
+        signature["sha256"] = file_hash.hexdigest()
+        self.store.mset([(stat_key, json.dumps(signature).encode())])
+        return signature["sha256"]
+
+    def _prefix(self, source_uri: str, loader: str) -> str:
+        return f"v{self.version}:{loader}:{self.file_hash(source_uri)}:"
+
+    def get(self, source_uri: str, loader: str) -> Optional[List[Document]]:
+        """모든 페이지가 캐시되어 있으면 페이지 Document 목록을, 아니면 None을 반환합니다."""
+        prefix = self._prefix(source_uri, loader)
+        count = self.store.mget([prefix + "pages"])[0]
+        if count is None:
+            return None
+
+        values = self.store.mget([f"{prefix}{page}" for page in range(int(count))])
+        if any(value is None for value in values):
+            return None
+
+        docs = []
+        for value in values:
+            record = json.loads(zlib.decompress(value))
+            metadata = record["metadata"]
+            # 같은 내용의 파일이 다른 경로에 있을 수 있으므로 현재 경로로 맞춥니다.
+            for key in ("source", "file_path"):
+                if key in metadata:
+                    metadata[key] = source_uri
+            docs.append(Document(page_content=record["content"], metadata=metadata))
+        return docs
+
+    def put(
+        self,
+        source_uri: str,
+        loader: str,
+        docs: Sequence[Document],
+        start: int = 0,
+        total_pages: Optional[int] = None,
+    ) -> None:
+        """start번째 페이지부터 docs를 저장합니다.
+
+        total_pages를 지정하면 파일의 모든 페이지가 저장된 것으로 표시하여
+        이후 get()으로 읽을 수 있게 합니다.
+        """
+        prefix = self._prefix(source_uri, loader)
+        items = [
+            (
+                f"{prefix}{start + offset}",
+                zlib.compress(
+                    json.dumps(
+                        {"content": doc.page_content, "metadata": doc.metadata},
+                        ensure_ascii=False,
+                        default=str,
+                    ).encode("utf-8")
+                ),
+            )
+            for offset, doc in enumerate(docs)
+        ]
+        if total_pages is not None:
+            items.append((prefix + "pages", str(total_pages).encode()))
+        self.store.mset(items)
+
+    def load(
+        self,
+        source_uri: str,
+        loader: str,
+        extract: Callable[[], List[Document]],
+    ) -> List[Document]:
+        """캐시된 페이지를 반환하고, 없으면 extract()로 추출하여 저장합니다."""
+        docs = self.get(source_uri, loader)
+        if docs is None:
+            docs = extract()
+            if docs:
+                self.put(source_uri, loader, docs, total_pages=len(docs))
+        return docs
@@ -1,17 +1,73 @@
 from rag.base import RetrievalChain
+from rag.page_cache import PageCache
 from langchain_community.document_loaders import PDFPlumberLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
-from typing import List, Annotated
+from concurrent.futures import Future, ProcessPoolExecutor
+from collections import Counter, deque
+from itertools import islice
+from typing import List, Annotated, Iterator, Optional
 from pathlib import Path
 import os
 import hashlib
+import pdfplumber
+
+
+def _load_pdf_pages(source_uri: str, start: int, end: int) -> List[Document]:
+    """PDF의 [start, end) 페이지 범위를 로드합니다. (프로세스 풀 작업 단위)
+
+    PDFPlumberLoader와 동일한 형태의 메타데이터(source, file_path, page,
+    total_pages 및 PDF 메타데이터)를 가진 페이지 단위 Document를 반환합니다.
+    """
+    with pdfplumber.open(source_uri) as pdf:
+        pdf_metadata = {
+            k: v for k, v in (pdf.metadata or {}).items() if type(v) in [str, int]
+        }
+        total_pages = len(pdf.pages)
+        docs = []
+        for page in pdf.pages[start:end]:
+            docs.append(
+                Document(
+                    page_content=(page.extract_text() or "") + "\n",
+                    metadata=dict(
+                        {
+                            "source": source_uri,
+                            "file_path": source_uri,
+                            "page": page.page_number - 1,
+                            "total_pages": total_pages,
+                        },
+                        **pdf_metadata,
+                    ),
+                )
+            )
+            # 페이지 객체의 캐시를 해제하여 메모리 사용량을 제한합니다.
+            page.close()
+        return docs
 
 
 class PDFRetrievalChain(RetrievalChain):
-    def __init__(self, source_uri: Annotated[str, "Source URI"], **kwargs):
+    def __init__(
+        self,
+        source_uri: Annotated[str, "Source URI"],
+        num_workers: Annotated[int, "PDF 로딩 프로세스 수 (1이면 순차 로딩)"] = 1,
+        pages_per_task: Annotated[int, "병렬 로딩 시 작업당 페이지 수"] = 50,
+        page_cache_path: Annotated[
+            Optional[str], "페이지 텍스트 캐시 파일 (None이면 사용 안 함)"
+        ] = ".cache/pages.sqlite",
+        **kwargs,
+    ):
         super().__init__(**kwargs)
         self.source_uri = source_uri
+        self.num_workers = num_workers
+        self.pages_per_task = pages_per_task
+
+        # 추출한 페이지 텍스트를 파일 내용 해시 기준으로 캐싱 (분할/임베딩 설정과 무관)
+        self.page_cache = None
+        if page_cache_path:
+            try:
+                self.page_cache = PageCache(page_cache_path)
+            except Exception as e:
+                self.log(f"Warning: Failed to open page cache: {e}")
 
         # PDF 파일 경로 기반으로 고유한 캐시 디렉토리 생성
         if isinstance(source_uri, str):
@@ -21,16 +77,76 @@ class PDFRetrievalChain(RetrievalChain):
 
             self.cache_dir = Path(f".cache/embeddings/{cache_suffix}")
             self.index_dir = Path(f".cache/faiss_index/{cache_suffix}")
-            print(f"Cache configured for PDF: {file_name}")
-            print(f"- Embeddings cache: {self.cache_dir}")
-            print(f"- FAISS index cache: {self.index_dir}")
+            self.log(f"Cache configured for PDF: {file_name}")
+            self.log(f"- Embeddings cache: {self.cache_dir}")
+            self.log(f"- FAISS index cache: {self.index_dir}")
         else:
             # 여러 파일의 경우 기본 캐시 사용
             self.cache_dir = Path(".cache/embeddings/multi_pdf")
             self.index_dir = Path(".cache/faiss_index/multi_pdf")
-            print("Cache configured for multi-PDF processing")
+            self.log("Cache configured for multi-PDF processing")
+
+        # 여러 파일은 기본적으로 파일별 shard로 인덱싱합니다.
+        # (파일 하나는 리스트로 전달해도 manifest 기반 캐시와 warm start를 사용)
+        if self.shard_index is None:
+            self.shard_index = not isinstance(source_uri, str) and len(source_uri) > 1
+        if self.shard_index:
+            self.log(f"- Index shards: {self.shard_dir}")
+
+    def _validate_source(self, source_uri: str) -> bool:
+        """파일 존재, 권한 및 PDF 확장자를 확인합니다."""
+        file_path = Path(source_uri)
+        if not file_path.exists():
+            self.log(f"Warning: File not found: {source_uri}")
+            return False
+
+        if not file_path.is_file():
+            self.log(f"Warning: Not a file: {source_uri}")
+            return False
+
+        if not os.access(source_uri, os.R_OK):
+            self.log(f"Warning: No read permission: {source_uri}")
+            return False
+
+        # PDF 파일 확장자 확인
+        if not source_uri.lower().endswith(".pdf"):
+            self.log(f"Warning: Not a PDF file: {source_uri}")
+            return False
+
+        return True
+
+    def _cached_pages(self, source_uri: str) -> Optional[List[Document]]:
+        """캐시에 모든 페이지가 있으면 페이지 Document 목록을 반환합니다."""
+        if self.page_cache is None:
+            return None
+        try:
+            docs = self.page_cache.get(source_uri, "pdfplumber")
+        except Exception as e:
+            self.log(f"Warning: Failed to read page cache: {e}")
+            return None
+        result = "misses" if docs is None else "hits"
+        self.metrics.increment(f"cache_{result}_total", cache="pages")
+        return docs
+
+    def _store_pages(
+        self,
+        source_uri: str,
+        docs: List[Document],
+        start: int = 0,
+        total_pages: Optional[int] = None,
+    ) -> None:
+        """추출한 페이지를 캐시에 저장합니다. total_pages는 파일 전체를 저장했을 때 지정."""
+        if self.page_cache is None:
+            return
+        try:
+            self.page_cache.put(source_uri, "pdfplumber", docs, start, total_pages)
+        except Exception as e:
+            self.log(f"Warning: Failed to write page cache: {e}")
 
     def load_documents(self, source_uris: List[str]) -> List[Document]:
+        if self.num_workers and self.num_workers > 1:
+            return self._load_documents_parallel(source_uris)
+
         docs = []
         successful_files = 0
         failed_files = []
@@ -38,64 +154,268 @@ class PDFRetrievalChain(RetrievalChain):
         for source_uri in source_uris:
             try:
                 # 파일 존재 및 권한 확인
-                file_path = Path(source_uri)
-                if not file_path.exists():
-                    print(f"Warning: File not found: {source_uri}")
+                if not self._validate_source(source_uri):
                     failed_files.append(source_uri)
                     continue
 
-                if not file_path.is_file():
-                    print(f"Warning: Not a file: {source_uri}")
+                # PDF 로딩 시도 (캐시된 페이지가 있으면 파싱하지 않음)
+                self.log(f"Loading PDF: {source_uri}")
+                loaded_docs = self._cached_pages(source_uri)
+                if loaded_docs is None:
+                    loader = PDFPlumberLoader(source_uri)
+                    loaded_docs = loader.load()
+                    if loaded_docs:
+                        self._store_pages(
+                            source_uri, loaded_docs, total_pages=len(loaded_docs)
+                        )
+
+                if not loaded_docs:
+                    self.log(f"Warning: No content loaded from: {source_uri}")
                     failed_files.append(source_uri)
                     continue
 
-                if not os.access(source_uri, os.R_OK):
-                    print(f"Warning: No read permission: {source_uri}")
+                docs.extend(loaded_docs)
+                successful_files += 1
+                self._record_loaded(source_uri, len(loaded_docs))
+                self.log(
+                    f"Successfully loaded {len(loaded_docs)} pages from: {source_uri}"
+                )
+
+            except Exception as e:
+                self.log(f"Error loading PDF {source_uri}: {e}")
+                failed_files.append(source_uri)
+                continue
+
+        self._check_loading_result(len(docs), successful_files, failed_files)
+        return docs
+
+    def _plan_page_ranges(
+        self, source_uris: List[str], failed_files: List[str], cached: dict
+    ):
+        """파일별로 병렬 로딩할 페이지 범위 작업 목록을 생성합니다.
+
+        모든 페이지가 캐시된 파일은 cached에 기록하고 파일 전체를 작업 하나로 둡니다.
+        """
+        tasks = []
+        for source_uri in source_uris:
+            try:
+                if not self._validate_source(source_uri):
                     failed_files.append(source_uri)
                     continue
 
-                # PDF 파일 확장자 확인
-                if not source_uri.lower().endswith(".pdf"):
-                    print(f"Warning: Not a PDF file: {source_uri}")
-                    failed_files.append(source_uri)
+                cached_docs = self._cached_pages(source_uri)
+                if cached_docs:
+                    cached[source_uri] = cached_docs
+                    tasks.append((source_uri, 0, len(cached_docs)))
                     continue
 
-                # PDF 로딩 시도
-                print(f"Loading PDF: {source_uri}")
-                loader = PDFPlumberLoader(source_uri)
-                loaded_docs = loader.load()
+                with pdfplumber.open(source_uri) as pdf:
+                    num_pages = len(pdf.pages)
 
-                if not loaded_docs:
-                    print(f"Warning: No content loaded from: {source_uri}")
+                if num_pages == 0:
+                    self.log(f"Warning: No content loaded from: {source_uri}")
                     failed_files.append(source_uri)
                     continue
 
-                docs.extend(loaded_docs)
-                successful_files += 1
-                print(
-                    f"Successfully loaded {len(loaded_docs)} pages from: {source_uri}"
-                )
+                step = max(1, self.pages_per_task or num_pages)
+                for start in range(0, num_pages, step):
+                    tasks.append((source_uri, start, min(start + step, num_pages)))
 
             except Exception as e:
-                print(f"Error loading PDF {source_uri}: {e}")
+                self.log(f"Error loading PDF {source_uri}: {e}")
+                failed_files.append(source_uri)
+
+        self.log(
+            f"Loading {len(source_uris) - len(failed_files)} PDFs in parallel "
+            f"({len(tasks)} tasks, {self.num_workers} workers)"
+        )
+        return tasks
+
+    def _iter_page_ranges(self, tasks, cached: dict):
+        """페이지 범위 작업을 프로세스 풀에서 실행하고 제출 순서대로 결과를 생성합니다.
+
+        동시에 실행 중인 작업 수를 워커 수의 2배로 제한하여, 결과를 소비하는
+        속도보다 로딩이 앞서가더라도 메모리 사용량이 늘어나지 않습니다.
+        각 결과는 (source_uri, docs, error) 형태입니다. 새로 추출한 페이지는
+        페이지 캐시에 저장하고, 파일의 모든 작업이 성공하면 완료로 표시합니다.
+        """
+        max_pending = self.num_workers * 2
+        total_pages = {}
+        remaining = Counter()
+        for source_uri, _, end in tasks:
+            total_pages[source_uri] = max(total_pages.get(source_uri, 0), end)
+            remaining[source_uri] += 1
+        failed = set()
+
+        with ProcessPoolExecutor(max_workers=self.num_workers) as executor:
+
+            def submit(task):
+                source_uri, start, end = task
+                if source_uri in cached:
+                    future = Future()
+                    future.set_result(cached[source_uri])
+                else:
+                    future = executor.submit(_load_pdf_pages, source_uri, start, end)
+                return source_uri, start, future
+
+            task_iter = iter(tasks)
+            pending = deque(submit(task) for task in islice(task_iter, max_pending))
+
+            while pending:
+                source_uri, start, future = pending.popleft()
+                for task in islice(task_iter, 1):
+                    pending.append(submit(task))
+                try:
+                    docs = future.result()
+                except Exception as e:
+                    failed.add(source_uri)
+                    yield source_uri, [], e
+                    continue
+
+                if source_uri not in cached:
+                    remaining[source_uri] -= 1
+                    complete = not remaining[source_uri] and source_uri not in failed
+                    self._store_pages(
+                        source_uri,
+                        docs,
+                        start,
+                        total_pages[source_uri] if complete else None,
+                    )
+                yield source_uri, docs, None
+
+    def _load_documents_parallel(self, source_uris: List[str]) -> List[Document]:
+        """파일과 페이지 범위를 프로세스 풀에 분배하여 병렬로 로드합니다.
+
+        결과는 입력 파일 순서와 페이지 순서를 그대로 유지합니다.
+        """
+        failed_files = []
+        cached = {}
+        tasks = self._plan_page_ranges(source_uris, failed_files, cached)
+
+        docs = []
+        successful_files = 0
+        file_docs = {}
+        file_errors = {}
+        for source_uri, loaded_docs, error in self._iter_page_ranges(tasks, cached):
+            if error is not None:
+                file_errors.setdefault(source_uri, error)
+            file_docs.setdefault(source_uri, []).extend(loaded_docs)
+
+        for source_uri in file_docs:
+            loaded_docs = file_docs[source_uri]
+            if source_uri in file_errors:
+                self.log(f"Error loading PDF {source_uri}: {file_errors[source_uri]}")
+                failed_files.append(source_uri)
+                continue
+
+            if not loaded_docs:
+                self.log(f"Warning: No content loaded from: {source_uri}")
                 failed_files.append(source_uri)
                 continue
 
-        # 결과 요약 출력
-        print(f"\nLoading Summary:")
-        print(f"- Successfully loaded: {successful_files} files")
-        print(f"- Failed to load: {len(failed_files)} files")
+            docs.extend(loaded_docs)
+            successful_files += 1
+            self._record_loaded(source_uri, len(loaded_docs))
+            self.log(f"Successfully loaded {len(loaded_docs)} pages from: {source_uri}")
+
+        self._check_loading_result(len(docs), successful_files, failed_files)
+        return docs
+
+    def lazy_load_documents(self, source_uris: List[str]) -> Iterator[Document]:
+        """페이지 단위로 문서를 하나씩 생성합니다. (스트리밍 모드)
+
+        이미 생성된 페이지는 되돌릴 수 없으므로, 로딩 도중 실패한 파일은
+        실패 목록에 기록되지만 그 이전 페이지는 그대로 전달됩니다.
+        """
+        num_docs = 0
+        successful_files = 0
+        failed_files = []
+
+        if self.num_workers and self.num_workers > 1:
+            cached = {}
+            tasks = self._plan_page_ranges(source_uris, failed_files, cached)
+            file_pages = {}
+            for source_uri, loaded_docs, error in self._iter_page_ranges(
+                tasks, cached
+            ):
+                if error is not None:
+                    if source_uri not in failed_files:
+                        self.log(f"Error loading PDF {source_uri}: {error}")
+                        failed_files.append(source_uri)
+                    continue
+                file_pages[source_uri] = file_pages.get(source_uri, 0) + len(
+                    loaded_docs
+                )
+                num_docs += len(loaded_docs)
+                yield from loaded_docs
+
+            for source_uri, num_pages in file_pages.items():
+                if source_uri not in failed_files:
+                    successful_files += 1
+                    self._record_loaded(source_uri, num_pages)
+
+        else:
+            for source_uri in source_uris:
+                if not self._validate_source(source_uri):
+                    failed_files.append(source_uri)
+                    continue
+
+                self.log(f"Loading PDF: {source_uri}")
+                num_pages = 0
+                cached_docs = self._cached_pages(source_uri)
+                try:
+                    if cached_docs is not None:
+                        pages = cached_docs
+                    else:
+                        pages = PDFPlumberLoader(source_uri).lazy_load()
+                    for doc in pages:
+                        if cached_docs is None:
+                            self._store_pages(source_uri, [doc], num_pages)
+                        num_pages += 1
+                        num_docs += 1
+                        yield doc
+                except Exception as e:
+                    self.log(f"Error loading PDF {source_uri}: {e}")
+                    failed_files.append(source_uri)
+                    continue
+
+                if cached_docs is None and num_pages:
+                    self._store_pages(source_uri, [], total_pages=num_pages)
+
+                if num_pages == 0:
+                    self.log(f"Warning: No content loaded from: {source_uri}")
+                    failed_files.append(source_uri)
+                    continue
+
+                successful_files += 1
+                self._record_loaded(source_uri, num_pages)
+                self.log(f"Successfully loaded {num_pages} pages from: {source_uri}")
+
+        self._check_loading_result(num_docs, successful_files, failed_files)
+
+    def _record_loaded(self, source_uri: str, num_pages: int) -> None:
+        """로드한 파일의 페이지 수와 읽은 바이트 수를 지표로 기록합니다."""
+        self.metrics.increment("pages_loaded_total", num_pages)
+        self.metrics.increment(
+            "bytes_read_total", os.path.getsize(source_uri), kind="source"
+        )
+
+    def _check_loading_result(
+        self, num_docs: int, successful_files: int, failed_files: List[str]
+    ) -> None:
+        """로딩 결과 요약을 출력하고 로드된 문서가 없으면 예외를 발생시킵니다."""
+        self.log(f"\nLoading Summary:")
+        self.log(f"- Successfully loaded: {successful_files} files")
+        self.log(f"- Failed to load: {len(failed_files)} files")
         if failed_files:
-            print(f"- Failed files: {failed_files}")
-        print(f"- Total documents loaded: {len(docs)}")
+            self.log(f"- Failed files: {failed_files}")
+        self.log(f"- Total documents loaded: {num_docs}")
 
-        if not docs:
+        if not num_docs:
             raise ValueError(
                 "No documents were successfully loaded from the provided source URIs"
             )
 
-        return docs
-
     def create_text_splitter(self) -> RecursiveCharacterTextSplitter:
         return RecursiveCharacterTextSplitter(
             chunk_size=1200,
@@ -1,12 +1,161 @@
-def format_docs(docs):
+from functools import lru_cache
+from typing import Callable, Iterable, Optional
+import sys
+
+
+@lru_cache(maxsize=None)
+def _get_encoding():
+    """tiktoken 인코딩을 처음 사용할 때 한 번만 로드합니다.
+
+    인코딩 파일을 내려받아야 할 수 있으므로 모듈 import 시점에는 로드하지 않습니다.
+    tiktoken이 없거나 로드에 실패하면 None을 반환합니다.
+    """
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        print(
+            f"Warning: Failed to load tiktoken encoding, estimating tokens: {e}",
+            file=sys.stderr,
+        )
+        return None
+
+
+# 문서 태그(<document>, <source>, <page> 등)에 쓰이는 대략적인 토큰 수
+DOCUMENT_TAG_TOKENS = 20
+
+
+def count_tokens(text: str) -> int:
+    """텍스트의 토큰 수를 셉니다. tiktoken이 없으면 UTF-8 바이트 수로 추정합니다."""
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return len(text.encode("utf-8")) // 4 + 1
+
+
+def _merge_text(head: str, tail: str, min_overlap: int = 20) -> Optional[str]:
+    """head의 끝과 tail의 시작이 겹치면 합친 텍스트를 반환합니다. (포함 관계 포함)
+
+    chunk_overlap으로 분할된 인접 청크는 앞 청크의 끝부분이 다음 청크의 시작과
+    같으므로, 겹치는 부분을 한 번만 남기고 이어 붙입니다.
+    """
+    if tail in head:
+        return head
+    probe = tail[:min_overlap]
+    position = head.find(probe, max(0, len(head) - len(tail)))
+    while position != -1:
+        if tail.startswith(head[position:]):
+            return head[:position] + tail
+        position = head.find(probe, position + 1)
+    return None
+
+
+def _merge_segment(segment: dict, text: str, start: Optional[int], min_overlap: int):
+    """같은 페이지의 세그먼트와 청크를 합칠 수 있으면 (텍스트, 시작 위치)를 반환합니다."""
+    if start is not None and segment["start"] is not None:
+        # splitter의 add_start_index 오프셋이 있으면 위치로 겹침/인접 여부를 판단
+        head, tail = segment, {"text": text, "start": start}
+        if tail["start"] < head["start"]:
+            head, tail = tail, head
+        head_end = head["start"] + len(head["text"])
+        if tail["start"] > head_end:
+            return None
+        return head["text"] + tail["text"][head_end - tail["start"] :], head["start"]
+
+    merged = _merge_text(segment["text"], text, min_overlap)
+    if merged is not None:
+        return merged, segment["start"]
+    merged = _merge_text(text, segment["text"], min_overlap)
+    if merged is not None:
+        return merged, start
+    return None
+
+
+def build_context(
+    docs: Iterable,
+    max_tokens: Optional[int] = None,
+    token_counter: Callable[[str], int] = count_tokens,
+    min_overlap: int = 20,
+) -> str:
+    """검색된 문서로 LLM에 전달할 컨텍스트 문자열을 생성합니다.
+
+    - 같은 출처(source)와 페이지의 청크가 겹치거나 이어지면 하나로 합칩니다.
+    - 중복된 청크는 한 번만 포함합니다.
+    - docs는 검색 점수 순서라고 가정하며, 앞에서부터 max_tokens 안에 들어가는
+      청크만 포함합니다. (들어가지 않는 청크는 건너뛰고 다음 청크를 시도)
+
+    문서를 한 번만 순회하며, 출력은 각 세그먼트가 처음 선택된 순서를 따릅니다.
+    """
+    segments = {}
+    pages = {}
+    used_tokens = 0
+
+    for doc in docs:
+        metadata = doc.metadata
+        page_key = (metadata.get("source"), metadata.get("page"))
+        start = metadata.get("start_index")
+        text = doc.page_content
+
+        # 같은 페이지의 기존 세그먼트와 합칠 수 있는지 확인
+        target = None
+        for segment_id in pages.get(page_key, ()):
+            merged = _merge_segment(segments[segment_id], text, start, min_overlap)
+            if merged is not None:
+                target = segment_id
+                break
+
+        if target is None:
+            tokens = token_counter(text) + DOCUMENT_TAG_TOKENS
+            if max_tokens is not None and used_tokens + tokens > max_tokens:
+                continue
+            segment_id = len(segments)
+            segments[segment_id] = {
+                "text": text,
+                "start": start,
+                "tokens": tokens,
+                "source": metadata.get("source"),
+                "page": metadata.get("page"),
+            }
+            pages.setdefault(page_key, []).append(segment_id)
+            used_tokens += tokens
+            continue
+
+        segment = segments[target]
+        merged_text, merged_start = merged
+        if merged_text == segment["text"]:
+            # 이미 포함된 청크 (중복)
+            continue
+        tokens = token_counter(merged_text) + DOCUMENT_TAG_TOKENS
+        added_tokens = tokens - segment["tokens"]
+        if max_tokens is not None and used_tokens + added_tokens > max_tokens:
+            continue
+        used_tokens += added_tokens
+        segment.update(text=merged_text, start=merged_start, tokens=tokens)
+
     return "\n".join(
-        [
-            f"<document><content>{doc.page_content}</content><source>{doc.metadata['source']}</source><page>{int(doc.metadata['page'])+1}</page></document>"
-            for doc in docs
-        ]
+        _format_document(segment["text"], segment["source"], segment["page"])
+        for segment in segments.values()
+    )
+
+
+def _format_document(content: str, source, page) -> str:
+    page_tag = "" if page is None else f"<page>{int(page)+1}</page>"
+    return (
+        f"<document><content>{content}</content>"
+        f"<source>{source}</source>{page_tag}</document>"
     )
 
 
+def format_docs(docs, max_tokens: Optional[int] = None):
+    """검색된 문서를 XML 형식의 컨텍스트로 변환합니다.
+
+    겹치는 청크는 합치고 중복은 제거하며, max_tokens를 지정하면 그 안에 들어가는
+    상위 문서만 포함합니다. (build_context 참고)
+    """
+    return build_context(docs, max_tokens=max_tokens)
+
+
 def format_searched_docs(docs):
     return "\n".join(
         [
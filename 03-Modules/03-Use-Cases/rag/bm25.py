@@ -0,0 +1,119 @@
+from langchain_core.documents import Document
+from collections import Counter, defaultdict
+from typing import Callable, Dict, Hashable, List, Sequence, Tuple
+import heapq
+import math
+import re
+
+
+# 한글(음절, 자모), 한자, 가나
+_CJK = "\u1100-\u11ff\u3040-\u30ff\u3130-\u318f\u4e00-\u9fff\uac00-\ud7a3"
+# 한중일 문자 구간과 그 밖의 단어(영문, 숫자 등)를 나누어 찾습니다.
+_TOKEN_PATTERN = re.compile(rf"[{_CJK}]+|[^\W{_CJK}]+")
+_CJK_PATTERN = re.compile(rf"[{_CJK}]")
+
+
+def tokenize(text: str) -> List[str]:
+    """소문자로 변환한 뒤 토큰화합니다. 문서와 질의에 같은 토크나이저를 사용합니다.
+
+    영문, 숫자 등은 단어 단위로 나눕니다. 한국어는 조사가 붙은 어절("고양이는")이
+    한 단어가 되므로, 한중일 문자 구간은 두 글자(bigram) 토큰으로 나누어
+    "고양이"로도 "고양이는"을 찾을 수 있게 합니다. 자주 쓰이는 음절의 posting
+    list가 거의 모든 문서를 포함하지 않도록 글자(unigram) 토큰은 한 글자 구간
+    (한 글자 질의 포함)에만 사용합니다.
+    """
+    tokens = []
+    for word in _TOKEN_PATTERN.findall(text.lower()):
+        if len(word) == 1 or not _CJK_PATTERN.match(word):
+            tokens.append(word)
+            continue
+        tokens.extend(word[i : i + 2] for i in range(len(word) - 1))
+    return tokens
+
+
+class BM25Index:
+    """역색인(inverted index) 기반의 BM25 키워드 검색 인덱스입니다.
+
+    질의 토큰의 posting list만 순회하므로 검색 비용은 전체 문서 수가 아니라
+    질의어가 등장하는 문서 수에 비례합니다. 문서는 언제든 추가할 수 있습니다.
+    """
+
+    def __init__(
+        self,
+        k1: float = 1.5,
+        b: float = 0.75,
+        tokenizer: Callable[[str], List[str]] = tokenize,
+    ):
+        self.k1 = k1
+        self.b = b
+        self.tokenizer = tokenizer
+        self.documents: List[Document] = []
+        self.doc_lengths: List[int] = []
+        self.postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def add_documents(self, docs: Sequence[Document]) -> None:
+        """문서를 인덱스에 추가합니다."""
+        for doc in docs:
+            doc_id = len(self.documents)
+            tokens = self.tokenizer(doc.page_content)
+            for term, tf in Counter(tokens).items():
+                self.postings[term][doc_id] = tf
+            self.documents.append(doc)
+            self.doc_lengths.append(len(tokens))
+            self.total_length += len(tokens)
+
+    def search_with_scores(
+        self, query: str, k: int = 5
+    ) -> List[Tuple[Document, float]]:
+        """BM25 점수가 높은 순서로 (문서, 점수) 목록을 반환합니다."""
+        if not self.documents:
+            return []
+
+        num_docs = len(self.documents)
+        avg_length = self.total_length / num_docs or 1.0
+        scores: Dict[int, float] = defaultdict(float)
+
+        for term in set(self.tokenizer(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            df = len(postings)
+            idf = math.log(1 + (num_docs - df + 0.5) / (df + 0.5))
+            for doc_id, tf in postings.items():
+                length_ratio = self.doc_lengths[doc_id] / avg_length
+                norm = self.k1 * (1 - self.b + self.b * length_ratio)
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        top = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(self.documents[doc_id], score) for doc_id, score in top]
+
+    def search(self, query: str, k: int = 5) -> List[Document]:
+        return [doc for doc, _ in self.search_with_scores(query, k)]
+
+
+def document_key(doc: Document) -> Hashable:
+    """서로 다른 검색 결과에서 같은 청크를 식별하기 위한 키를 반환합니다."""
+    return (doc.page_content, doc.metadata.get("source"), doc.metadata.get("page"))
+
+
+def reciprocal_rank_fusion(
+    result_lists: Sequence[Sequence[Document]], k: int = 60
+) -> List[Document]:
+    """여러 검색 결과 목록을 Reciprocal Rank Fusion으로 합쳐 순위를 매깁니다.
+
+    각 문서의 점수는 목록별 1 / (k + 순위)의 합이며, 점수가 높은 순으로 반환합니다.
+    """
+    scores: Dict[Hashable, float] = defaultdict(float)
+    documents: Dict[Hashable, Document] = {}
+    for results in result_lists:
+        for rank, doc in enumerate(results, 1):
+            key = document_key(doc)
+            scores[key] += 1.0 / (k + rank)
+            documents.setdefault(key, doc)
+
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    return [documents[key] for key in ranked]
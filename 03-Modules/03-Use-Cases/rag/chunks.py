@@ -0,0 +1,260 @@
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_text_splitters import TextSplitter
+from rag.mmap_store import is_read_only, merge_columnar, to_writable
+from collections.abc import Sequence
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+import copy
+import numpy as np
+
+
+class ChunkSet(Sequence):
+    """페이지 텍스트를 한 번만 저장하고 청크는 (텍스트 번호, 시작, 끝) 오프셋으로 표현합니다.
+
+    chunk_overlap으로 겹치는 텍스트를 중복 저장하지 않고, 청크마다 Document와
+    metadata dict를 만들지 않습니다. Document는 인덱싱(i)할 때 생성되므로
+    Document 목록처럼 사용할 수 있습니다.
+    """
+
+    def __init__(
+        self,
+        texts: List[str],
+        metadatas: List[dict],
+        text_ids,
+        starts,
+        ends,
+        start_index: bool = False,
+    ):
+        self.texts = texts
+        self.metadatas = metadatas
+        self.text_ids = np.asarray(text_ids, dtype=np.int32)
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.ends = np.asarray(ends, dtype=np.int64)
+        # splitter의 add_start_index 설정 (metadata에 start_index 포함 여부)
+        self.start_index = start_index
+
+    def __len__(self) -> int:
+        return len(self.text_ids)
+
+    def text(self, position: int) -> str:
+        text_id = int(self.text_ids[position])
+        start, end = int(self.starts[position]), int(self.ends[position])
+        return self.texts[text_id][start:end]
+
+    def iter_texts(self) -> Iterator[str]:
+        """Document를 만들지 않고 청크 텍스트만 순서대로 생성합니다."""
+        for position in range(len(self)):
+            yield self.text(position)
+
+    def document(self, position: int, id: Optional[str] = None) -> Document:
+        # 중복 제거로 추가된 metadata["sources"] 목록 등이 저장된 값과 공유되지 않도록 복사
+        metadata = copy.deepcopy(self.metadatas[int(self.text_ids[position])])
+        if self.start_index:
+            metadata["start_index"] = int(self.starts[position])
+        return Document(id=id, page_content=self.text(position), metadata=metadata)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return self.select(range(len(self))[position])
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError("ChunkSet index out of range")
+        return self.document(position)
+
+    def select(self, positions: Iterable[int]) -> "ChunkSet":
+        """선택한 청크만 담은 ChunkSet을 반환합니다. (텍스트는 공유)"""
+        positions = np.fromiter(positions, dtype=np.int64)
+        return ChunkSet(
+            self.texts,
+            self.metadatas,
+            self.text_ids[positions],
+            self.starts[positions],
+            self.ends[positions],
+            self.start_index,
+        )
+
+    def annotate(self, updates: Dict[int, dict]) -> "ChunkSet":
+        """position별 청크의 metadata에 키를 추가한 ChunkSet을 반환합니다.
+
+        추가한 metadata는 청크별로 새 항목을 만들지만, 페이지 텍스트는 복사하지
+        않고 같은 문자열을 가리킵니다.
+        """
+        if not updates:
+            return self
+        texts, metadatas = list(self.texts), list(self.metadatas)
+        text_ids = self.text_ids.copy()
+        for position, extra in updates.items():
+            text_id = int(text_ids[position])
+            text_ids[position] = len(texts)
+            texts.append(self.texts[text_id])
+            metadatas.append({**self.metadatas[text_id], **extra})
+        return ChunkSet(
+            texts, metadatas, text_ids, self.starts, self.ends, self.start_index
+        )
+
+    @classmethod
+    def concat(cls, chunk_sets: List["ChunkSet"]) -> "ChunkSet":
+        """여러 ChunkSet을 순서대로 이어 붙입니다."""
+        texts, metadatas, text_ids = [], [], []
+        for chunk_set in chunk_sets:
+            text_ids.append(chunk_set.text_ids + len(texts))
+            texts.extend(chunk_set.texts)
+            metadatas.extend(chunk_set.metadatas)
+        return cls(
+            texts,
+            metadatas,
+            np.concatenate(text_ids) if text_ids else [],
+            np.concatenate([chunk_set.starts for chunk_set in chunk_sets] or [[]]),
+            np.concatenate([chunk_set.ends for chunk_set in chunk_sets] or [[]]),
+            any(chunk_set.start_index for chunk_set in chunk_sets),
+        )
+
+
+def split_chunks(
+    docs: Iterable[Document], text_splitter
+) -> Union[ChunkSet, List[Document]]:
+    """문서를 분할하여 ChunkSet으로 반환합니다.
+
+    청크 위치는 TextSplitter.create_documents의 start_index와 같은 방식으로 찾으므로
+    결과 Document는 text_splitter.split_documents와 같습니다. TextSplitter가 아닌
+    splitter는 split_documents 결과를 그대로 반환합니다.
+    """
+    if not isinstance(text_splitter, TextSplitter):
+        return text_splitter.split_documents(list(docs))
+
+    overlap = text_splitter._chunk_overlap
+    texts, metadatas = [], []
+    text_ids, starts, ends = [], [], []
+    for doc in docs:
+        text = doc.page_content
+        text_id = len(texts)
+        texts.append(text)
+        metadatas.append(doc.metadata)
+
+        index = 0
+        previous_chunk_len = 0
+        for chunk in text_splitter.split_text(text):
+            offset = index + previous_chunk_len - overlap
+            index = text.find(chunk, max(0, offset))
+            previous_chunk_len = len(chunk)
+            if index == -1:
+                # 원문에 그대로 존재하지 않는 청크는 별도 텍스트로 저장합니다.
+                text_ids.append(len(texts))
+                texts.append(chunk)
+                metadatas.append(doc.metadata)
+                starts.append(0)
+                ends.append(len(chunk))
+                continue
+            text_ids.append(text_id)
+            starts.append(index)
+            ends.append(index + len(chunk))
+
+    return ChunkSet(
+        texts,
+        metadatas,
+        text_ids,
+        starts,
+        ends,
+        start_index=text_splitter._add_start_index,
+    )
+
+
+def select_chunks(docs, positions: List[int]):
+    """ChunkSet 또는 Document 목록에서 positions의 청크만 선택합니다."""
+    if isinstance(docs, ChunkSet):
+        return docs.select(positions)
+    return [docs[position] for position in positions]
+
+
+def chunk_texts(docs) -> List[str]:
+    if isinstance(docs, ChunkSet):
+        return list(docs.iter_texts())
+    return [doc.page_content for doc in docs]
+
+
+class ChunkDocstore(Docstore, AddableMixin):
+    """ChunkSet을 저장소로 사용하는 Docstore입니다.
+
+    검색 결과로 조회된 청크만 Document로 만듭니다. 나중에 추가된 문서는
+    InMemoryDocstore처럼 Document 그대로 저장합니다.
+    """
+
+    def __init__(self, chunks: ChunkSet, ids: List[str]):
+        self.chunks = chunks
+        self._positions = {chunk_id: position for position, chunk_id in enumerate(ids)}
+        self._dict: Dict[str, Document] = {}
+
+    def __len__(self) -> int:
+        return len(self._positions) + len(self._dict)
+
+    def _ids(self):
+        return self._positions.keys() | self._dict.keys()
+
+    def search(self, search: str) -> Union[str, Document]:
+        if search in self._dict:
+            return self._dict[search]
+        position = self._positions.get(search)
+        if position is None:
+            return f"ID {search} not found."
+        return self.chunks.document(position, id=search)
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        overlapping = set(texts).intersection(self._ids())
+        if overlapping:
+            raise ValueError(f"Tried to add ids that already exist: {overlapping}")
+        self._dict.update(texts)
+
+    def delete(self, ids: List) -> None:
+        if not set(ids).intersection(self._ids()):
+            raise ValueError(f"Tried to delete ids that does not  exist: {ids}")
+        for _id in ids:
+            if self._positions.pop(_id, None) is None:
+                self._dict.pop(_id, None)
+
+    def metadatas(self) -> Iterator[dict]:
+        """저장된 metadata dict를 반환합니다. (출처 경로 수정 등에 사용)"""
+        yield from self.chunks.metadatas
+        for doc in self._dict.values():
+            yield doc.metadata
+
+
+def merge_vectorstores(vectorstores: List[FAISS]) -> FAISS:
+    """vectorstore들을 첫 번째 vectorstore에 합칩니다.
+
+    모두 ChunkDocstore 또는 모두 저장된 열 단위 docstore를 사용하면 청크를
+    Document로 만들지 않고 이어 붙이며, 그렇지 않으면 FAISS.merge_from을 사용합니다.
+    """
+    vectorstore = vectorstores[0]
+    if len(vectorstores) == 1:
+        return vectorstore
+    if all(is_read_only(other) for other in vectorstores):
+        return merge_columnar(vectorstores)
+    if not all(
+        isinstance(other.docstore, ChunkDocstore) and not other.docstore._dict
+        for other in vectorstores
+    ):
+        vectorstore = to_writable(vectorstore)
+        for other in vectorstores[1:]:
+            # mmap으로 읽은 인덱스는 merge_from으로 비울 수 없으므로 복사합니다.
+            vectorstore.merge_from(to_writable(other))
+        return vectorstore
+
+    ids, parts = [], []
+    for other in vectorstores:
+        other_ids = [
+            other.index_to_docstore_id[position]
+            for position in range(other.index.ntotal)
+        ]
+        positions = other.docstore._positions
+        parts.append(other.docstore.chunks.select(positions[i] for i in other_ids))
+        ids.extend(other_ids)
+    if len(set(ids)) != len(ids):
+        raise ValueError("Cannot merge vectorstores, ids are overlapping.")
+
+    for other in vectorstores[1:]:
+        vectorstore.index.merge_from(other.index)
+    vectorstore.docstore = ChunkDocstore(ChunkSet.concat(parts), ids)
+    vectorstore.index_to_docstore_id = dict(enumerate(ids))
+    return vectorstore
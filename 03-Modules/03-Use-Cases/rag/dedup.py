@@ -0,0 +1,228 @@
+from langchain_core.documents import Document
+from rag.chunks import ChunkSet
+
+from typing import Dict, Iterable, List, Optional
+import hashlib
+import zlib
+import numpy as np
+
+# 단어 해시를 n-gram 해시로 조합할 때 사용하는 홀수 곱수
+_SHINGLE_MULTIPLIER = np.uint32(0x9E3779B1)
+
+
+class ChunkDeduplicator:
+    """내용이 같거나 거의 같은 청크를 묶습니다.
+
+    공백을 정규화한 내용 해시가 같으면 중복으로 보고, threshold가 주어지면
+    MinHash 서명과 LSH(band 단위 버킷)로 후보를 찾아 추정 Jaccard 유사도가
+    threshold 이상인 청크도 중복으로 묶습니다. (보고서마다 반복되는 머리글,
+    바닥글, 면책 문구, 표 등)
+
+    각 청크는 먼저 나온 대표 청크와만 비교하므로 비슷한 청크가 사슬처럼
+    이어져 서로 다른 내용이 한 묶음이 되지 않습니다.
+    """
+
+    def __init__(
+        self,
+        threshold: Optional[float] = 0.9,
+        num_perm: int = 64,
+        band_rows: int = 4,
+        shingle_size: int = 3,
+        seed: int = 1,
+    ):
+        if num_perm % band_rows:
+            raise ValueError("num_perm must be a multiple of band_rows")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.band_rows = band_rows
+        self.shingle_size = shingle_size
+        # 실행마다 같은 결과(같은 청크 ID)가 나오도록 고정된 seed를 사용합니다.
+        rng = np.random.default_rng(seed)
+        # 해시 함수 (a * x + b) mod 2^32: a가 홀수이면 32비트 값의 순열이 됩니다.
+        self._a = rng.integers(0, 1 << 32, num_perm, dtype=np.uint32) | np.uint32(1)
+        self._b = rng.integers(0, 1 << 32, num_perm, dtype=np.uint32)
+        self._token_cache: Dict[str, int] = {}
+        self.reset()
+
+    def reset(self) -> None:
+        """지금까지 본 청크(묶음) 기록을 지웁니다."""
+        self.num_groups = 0
+        self._exact: Dict[bytes, int] = {}
+        # band별 {서명 값: 대표 묶음 번호 목록}
+        self._buckets: List[Dict[bytes, List[int]]] = [
+            {} for _ in range(self.num_perm // self.band_rows)
+        ]
+        # 묶음 번호 순서대로 대표 청크의 서명 (앞의 num_groups행만 사용)
+        self._signatures = np.empty((0, self.num_perm), dtype=np.uint32)
+
+    def content_key(self, text: str) -> bytes:
+        return hashlib.sha1(" ".join(text.split()).encode("utf-8")).digest()
+
+    def _token_hashes(self, text: str) -> np.ndarray:
+        cache = self._token_cache
+        tokens = text.split()
+        hashes = list(map(cache.get, tokens))
+        if None in hashes:
+            for i, token in enumerate(tokens):
+                if hashes[i] is None:
+                    hashes[i] = cache[token] = zlib.crc32(token.encode("utf-8"))
+        return np.array(hashes or [0], dtype=np.uint32)
+
+    def _shingles(self, text: str) -> np.ndarray:
+        """단어 shingle_size-gram 해시 배열을 반환합니다.
+
+        단어는 한 번만 해시하고 n-gram 해시는 단어 해시를 NumPy로 조합합니다.
+        """
+        tokens = self._token_hashes(text)
+        size = min(self.shingle_size, len(tokens))
+        count = len(tokens) - size + 1
+        shingles = tokens[:count].copy()
+        for offset in range(1, size):
+            shingles = shingles * _SHINGLE_MULTIPLIER + tokens[offset : offset + count]
+        return shingles
+
+    def signatures(self, texts: List[str], block_size: int = 256) -> np.ndarray:
+        """텍스트별 MinHash 서명 행렬 (텍스트 수, num_perm)을 반환합니다.
+
+        block_size개 텍스트의 shingle을 한 행렬로 모아 해시 함수별로 한 번에
+        계산합니다. 짧은 텍스트의 행은 자신의 shingle을 반복하여 채우므로
+        최솟값은 바뀌지 않습니다.
+        """
+        result = np.empty((len(texts), self.num_perm), dtype=np.uint32)
+        for start in range(0, len(texts), block_size):
+            block = texts[start : start + block_size]
+            shingles = [self._shingles(text) for text in block]
+            lengths = np.array([len(values) for values in shingles])
+            offsets = np.cumsum(lengths) - lengths
+            columns = np.minimum(np.arange(lengths.max()), lengths[:, None] - 1)
+            matrix = np.concatenate(shingles)[offsets[:, None] + columns]
+            for perm, (a, b) in enumerate(zip(self._a, self._b)):
+                result[start : start + len(block), perm] = (matrix * a + b).min(axis=1)
+        return result
+
+    def signature(self, text: str) -> np.ndarray:
+        """단어 shingle_size-gram 집합의 MinHash 서명을 반환합니다."""
+        return self.signatures([text])[0]
+
+    def assign(self, texts: Iterable[str]) -> List[int]:
+        """텍스트별 묶음 번호를 반환합니다. 이전 호출에서 본 청크와도 비교합니다.
+
+        묶음 번호는 대표 청크가 나온 순서대로 붙으므로, 호출 전 num_groups 이상인
+        번호가 처음 나온 텍스트가 새 대표 청크입니다. (스트리밍 중복 제거에 사용)
+        """
+        texts = list(texts)
+        assigned: List[int] = []
+        if self.threshold is not None and texts:
+            signatures = self.signatures(texts)
+            # band별 서명 값(band_rows개)을 하나의 bytes 키로 만듭니다.
+            band_keys = signatures.view(f"V{4 * self.band_rows}").tolist()
+            # 대표 서명 버퍼는 부족할 때 두 배로 늘립니다.
+            capacity = self.num_groups + len(texts)
+            if capacity > len(self._signatures):
+                grown = np.empty(
+                    (max(capacity, 2 * len(self._signatures)), self.num_perm),
+                    dtype=np.uint32,
+                )
+                grown[: self.num_groups] = self._signatures[: self.num_groups]
+                self._signatures = grown
+
+        for position, text in enumerate(texts):
+            key = self.content_key(text)
+            if key in self._exact:
+                assigned.append(self._exact[key])
+                continue
+            if self.threshold is None:
+                self._exact[key] = self.num_groups
+                assigned.append(self.num_groups)
+                self.num_groups += 1
+                continue
+
+            keys = band_keys[position]
+            candidates = set()
+            for bucket, band_key in zip(self._buckets, keys):
+                candidates.update(bucket.get(band_key, ()))
+            if candidates:
+                candidates = sorted(candidates)
+                # 서명 값이 같은 비율 = 추정 Jaccard 유사도
+                scores = np.mean(
+                    self._signatures[candidates] == signatures[position], axis=1
+                )
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    self._exact[key] = candidates[best]
+                    assigned.append(candidates[best])
+                    continue
+
+            group = self.num_groups
+            self.num_groups += 1
+            self._exact[key] = group
+            assigned.append(group)
+            self._signatures[group] = signatures[position]
+            for bucket, band_key in zip(self._buckets, keys):
+                bucket.setdefault(band_key, []).append(group)
+        return assigned
+
+    def groups(self, texts: Iterable[str]) -> List[List[int]]:
+        """[대표 번호, 중복 번호, ...] 목록을 대표 청크 순서대로 반환합니다."""
+        self.reset()
+        groups: List[List[int]] = []
+        for position, group in enumerate(self.assign(texts)):
+            if group == len(groups):
+                groups.append([])
+            groups[group].append(position)
+        return groups
+
+
+def _source_refs(metadata: dict) -> List[dict]:
+    """청크의 출처 목록을 반환합니다. (이미 합쳐진 청크는 sources 사용)"""
+    if "sources" in metadata:
+        return list(metadata["sources"])
+    return [{"source": metadata.get("source"), "page": metadata.get("page")}]
+
+
+def deduplicate_chunks(docs, deduplicator: ChunkDeduplicator):
+    """중복 청크를 대표 청크 하나로 합치고 (청크 목록, 제거된 청크 수)를 반환합니다.
+
+    여러 페이지에서 나온 청크는 대표 청크의 metadata["sources"]에 모든 출처
+    {"source", "page"}를 기록합니다. ChunkSet은 ChunkSet으로, Document 목록은
+    Document 목록으로 반환합니다.
+    """
+    if isinstance(docs, ChunkSet):
+        texts = docs.iter_texts()
+
+        def metadata(position):
+            return docs.metadatas[int(docs.text_ids[position])]
+
+    else:
+        docs = list(docs)
+        texts = (doc.page_content for doc in docs)
+
+        def metadata(position):
+            return docs[position].metadata
+
+    groups = deduplicator.groups(texts)
+    representatives = [group[0] for group in groups]
+    updates = {}
+    for new_position, group in enumerate(groups):
+        if len(group) == 1:
+            continue
+        sources = []
+        for position in group:
+            for ref in _source_refs(metadata(position)):
+                if ref not in sources:
+                    sources.append(ref)
+        if len(sources) > 1:
+            updates[new_position] = {"sources": sources}
+
+    num_removed = len(docs) - len(representatives)
+    if isinstance(docs, ChunkSet):
+        return docs.select(representatives).annotate(updates), num_removed
+    deduped = [docs[position] for position in representatives]
+    for new_position, extra in updates.items():
+        doc = deduped[new_position]
+        deduped[new_position] = Document(
+            id=doc.id,
+            page_content=doc.page_content,
+            metadata={**doc.metadata, **extra},
+        )
+    return deduped, num_removed
@@ -0,0 +1,150 @@
+from typing import Dict, Optional
+import math
+import time
+import faiss
+import numpy as np
+
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+
+
+def index_factory_string(
+    index_type: str,
+    dim: int,
+    num_vectors: int,
+    nlist: Optional[int] = None,
+    pq_m: int = 16,
+    hnsw_m: int = 32,
+) -> str:
+    """index_type과 데이터 크기에 맞는 faiss.index_factory 문자열을 생성합니다."""
+    if index_type == "flat":
+        return "Flat"
+    if index_type == "hnsw":
+        return f"HNSW{hnsw_m},Flat"
+
+    # 클러스터 수는 지정하지 않으면 4 * sqrt(N)을 사용하고, 벡터 수를 넘지 않게 합니다.
+    nlist = nlist or int(4 * math.sqrt(num_vectors))
+    nlist = max(1, min(nlist, num_vectors))
+    if index_type == "ivf_flat":
+        return f"IVF{nlist},Flat"
+    if index_type == "ivf_pq":
+        # 서브 벡터 수는 차원을 나누어 떨어지게 해야 합니다.
+        pq_m = math.gcd(dim, pq_m)
+        return f"IVF{nlist},PQ{pq_m}"
+    raise ValueError(f"Unknown index type: {index_type} (choose from {INDEX_TYPES})")
+
+
+def apply_search_params(
+    index, nprobe: Optional[int] = None, ef_search: Optional[int] = None
+) -> None:
+    """IVF의 nprobe, HNSW의 efSearch 검색 파라미터를 설정합니다.
+
+    검색 파라미터는 인덱스 파일에 저장되지 않으므로 로드할 때마다 다시 적용합니다.
+    """
+    if nprobe:
+        try:
+            faiss.extract_index_ivf(index).nprobe = nprobe
+        except RuntimeError:
+            pass
+    if ef_search and hasattr(index, "hnsw"):
+        index.hnsw.efSearch = ef_search
+
+
+def make_direct_map(index) -> None:
+    """IVF 인덱스가 위치로 저장된 벡터를 읽을 수 있도록(reconstruct) direct map을 만듭니다.
+
+    인덱스를 수정하므로 검색 중이 아닐 때(생성하거나 로드한 직후) 호출합니다.
+    """
+    try:
+        ivf = faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return
+    if ivf.direct_map.type == faiss.DirectMap.NoMap:
+        ivf.make_direct_map()
+
+
+def build_index(
+    vectors: np.ndarray,
+    index_type: str = "flat",
+    nlist: Optional[int] = None,
+    pq_m: int = 16,
+    hnsw_m: int = 32,
+    train_size: int = 50_000,
+    exclude: Optional[np.ndarray] = None,
+):
+    """벡터로 학습한 빈 FAISS 인덱스를 생성합니다. (벡터는 추가하지 않음)
+
+    IVF 계열은 최대 train_size개의 무작위 샘플로 학습합니다. exclude 위치의
+    벡터(recall 측정용 질의)는 학습에 사용하지 않습니다.
+    """
+    num_vectors, dim = vectors.shape
+    factory = index_factory_string(index_type, dim, num_vectors, nlist, pq_m, hnsw_m)
+    index = faiss.index_factory(dim, factory, faiss.METRIC_L2)
+
+    if not index.is_trained:
+        candidates = np.arange(num_vectors)
+        if exclude is not None and len(exclude) < num_vectors:
+            candidates = np.setdiff1d(candidates, exclude)
+        if len(candidates) > train_size:
+            candidates = np.random.default_rng(0).choice(
+                candidates, train_size, replace=False
+            )
+        index.train(vectors[candidates])
+    return index
+
+
+def index_type_of(index) -> str:
+    """FAISS 인덱스 객체의 index_type 이름을 반환합니다. (실제로 생성된 종류 확인)"""
+    index = faiss.downcast_index(index)
+    for cls, name in (
+        (faiss.IndexHNSW, "hnsw"),
+        (faiss.IndexIVFPQ, "ivf_pq"),
+        (faiss.IndexIVFFlat, "ivf_flat"),
+        (faiss.IndexFlat, "flat"),
+    ):
+        if isinstance(index, cls):
+            return name
+    return type(index).__name__
+
+
+def sample_queries(num_vectors: int, num_queries: int = 100) -> np.ndarray:
+    """recall 측정에 사용할 질의 벡터 위치를 무작위로 고릅니다."""
+    return np.sort(
+        np.random.default_rng(0).choice(
+            num_vectors, min(num_queries, num_vectors), replace=False
+        )
+    )
+
+
+def measure_recall(
+    index, vectors: np.ndarray, query_positions: np.ndarray, k: int = 8
+) -> Dict[str, float]:
+    """flat(정확한) 검색 대비 recall@k와 질의당 지연시간(ms)을 측정합니다.
+
+    query_positions의 벡터를 질의로 사용합니다. 질의는 인덱스 학습에서 제외하고
+    (build_index의 exclude), 정답과 검색 결과에서도 질의 자신을 제외하므로
+    인덱스에 저장된 벡터를 그대로 찾는 쉬운 경우로 recall이 부풀려지지 않습니다.
+    정답은 인덱스를 복사하지 않고 faiss.knn으로 계산합니다.
+    """
+    num_vectors = len(vectors)
+    k = min(k, num_vectors - 1)
+    queries = vectors[query_positions]
+
+    def timed_search(search):
+        results = []
+        start = time.perf_counter()
+        for position, query in zip(query_positions, queries):
+            neighbors = search(query.reshape(1, -1))
+            results.append([i for i in neighbors if i != position][:k])
+        return results, (time.perf_counter() - start) * 1000 / len(queries)
+
+    exact, flat_ms = timed_search(lambda query: faiss.knn(query, vectors, k + 1)[1][0])
+    approx, index_ms = timed_search(lambda query: index.search(query, k + 1)[1][0])
+    recall = np.mean([len(set(a) & set(e)) / k for a, e in zip(approx, exact)])
+    return {
+        "k": k,
+        "num_queries": len(queries),
+        "recall": float(recall),
+        "latency_ms": index_ms,
+        "flat_latency_ms": flat_ms,
+    }
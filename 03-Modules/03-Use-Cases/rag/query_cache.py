@@ -0,0 +1,232 @@
+from langchain_core.embeddings import Embeddings
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+import threading
+import time
+import numpy as np
+
+
+def normalize_query(query: str) -> str:
+    """대소문자와 공백 차이를 무시하도록 질의를 정규화합니다."""
+    return " ".join(query.lower().split())
+
+
+class QueryCache:
+    """검색 결과를 질의 단위로 캐싱하는 LRU 캐시입니다.
+
+    정규화된 질의가 같으면(exact) 바로 결과를 반환하고, 그렇지 않으면 질의 임베딩과
+    캐시된 질의 임베딩의 코사인 유사도가 similarity_threshold 이상인 항목을 찾습니다.
+    두 경우 모두 실패하면 이미 계산한 질의 임베딩으로 검색을 수행하므로
+    임베딩 요청은 캐시 미스당 한 번만 발생합니다.
+
+    - max_size: 최대 항목 수 (초과 시 가장 오래 사용하지 않은 항목부터 제거)
+    - ttl: 항목 유효 시간(초), None이면 만료되지 않음
+    - invalidate(): 인덱스가 변경되었을 때 모든 항목을 무효화
+    """
+
+    def __init__(
+        self,
+        embeddings: Optional[Embeddings] = None,
+        max_size: int = 1024,
+        ttl: Optional[float] = 600.0,
+        similarity_threshold: float = 0.95,
+    ):
+        self.embeddings = embeddings
+        self.max_size = max_size
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Dict[str, Any]]" = OrderedDict()
+        self._vectors: Optional[np.ndarray] = None
+        self._slot_keys: List[Optional[Hashable]] = [None] * max_size
+        self._free_slots = list(range(max_size - 1, -1, -1))
+        self._generation = 0
+        self.counters = {
+            "exact_hits": 0,
+            "semantic_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """히트율을 포함한 캐시 통계를 반환합니다."""
+        with self._lock:
+            stats = dict(self.counters, size=len(self._entries))
+        hits = stats["exact_hits"] + stats["semantic_hits"]
+        total = hits + stats["misses"]
+        stats["hit_rate"] = hits / total if total else 0.0
+        return stats
+
+    def invalidate(self) -> None:
+        """인덱스 변경 시 캐시된 모든 결과를 무효화합니다."""
+        with self._lock:
+            self._entries.clear()
+            self._slot_keys = [None] * self.max_size
+            self._free_slots = list(range(self.max_size - 1, -1, -1))
+            self._generation += 1
+            self.counters["invalidations"] += 1
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._entries.pop(key)
+        if entry["slot"] is not None:
+            self._slot_keys[entry["slot"]] = None
+            self._free_slots.append(entry["slot"])
+
+    def _is_expired(self, entry: Dict[str, Any], now: float) -> bool:
+        return self.ttl is not None and now - entry["created"] > self.ttl
+
+    def _get_exact(self, key: Hashable) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self._is_expired(entry, time.monotonic()):
+            self._remove(key)
+            self.counters["expirations"] += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _get_similar(self, vector: np.ndarray, params: Hashable):
+        if self._vectors is None or not self._entries:
+            return None
+        similarities = self._vectors @ vector
+        now = time.monotonic()
+        for slot in np.argsort(-similarities):
+            if similarities[slot] < self.similarity_threshold:
+                break
+            key = self._slot_keys[slot]
+            if key is None or key[1] != params:
+                continue
+            entry = self._entries[key]
+            if self._is_expired(entry, now):
+                self._remove(key)
+                self.counters["expirations"] += 1
+                continue
+            self._entries.move_to_end(key)
+            return entry
+        return None
+
+    def _put(self, key: Hashable, results: Any, vector: Optional[np.ndarray]) -> None:
+        if key in self._entries:
+            self._remove(key)
+        while len(self._entries) >= self.max_size:
+            self._remove(next(iter(self._entries)))
+            self.counters["evictions"] += 1
+
+        slot = None
+        if vector is not None:
+            if self._vectors is None:
+                self._vectors = np.zeros(
+                    (self.max_size, len(vector)), dtype=np.float32
+                )
+            slot = self._free_slots.pop()
+            self._vectors[slot] = vector
+            self._slot_keys[slot] = key
+
+        self._entries[key] = {
+            "results": results,
+            "slot": slot,
+            "created": time.monotonic(),
+        }
+
+    def get_or_search(
+        self,
+        query: str,
+        search: Callable[[Optional[List[float]]], Any],
+        params: Hashable = (),
+        semantic: bool = True,
+    ) -> Any:
+        """캐시된 결과를 반환하거나, 없으면 search를 실행하여 결과를 캐싱합니다.
+
+        search는 질의 임베딩(semantic=False이거나 임베딩 모델이 없으면 None)을
+        받아 검색 결과를 반환하는 함수입니다. params는 k, 검색 방식 등 결과에
+        영향을 주는 값으로, params가 같은 항목끼리만 결과를 공유합니다.
+        """
+        key = (normalize_query(query), params)
+        entry = self._lookup_exact(key)
+        if entry is not None:
+            return entry["results"]
+
+        query_vector = None
+        if semantic and self.embeddings is not None:
+            query_vector = self.embeddings.embed_query(query)
+            entry = self._lookup_similar(query_vector, params)
+            if entry is not None:
+                return entry["results"]
+
+        generation = self._record_miss()
+        results = search(query_vector)
+        self._store(key, results, query_vector, generation)
+        return results
+
+    async def aget_or_search(
+        self,
+        query: str,
+        search: Callable[[Optional[List[float]]], Awaitable[Any]],
+        params: Hashable = (),
+        semantic: bool = True,
+    ) -> Any:
+        """get_or_search의 비동기 버전입니다.
+
+        질의 임베딩은 aembed_query로 요청하고, search는 코루틴 함수여야 합니다.
+        캐시 조회는 잠깐 잠금을 잡는 메모리 연산이므로 이벤트 루프에서 실행합니다.
+        """
+        key = (normalize_query(query), params)
+        entry = self._lookup_exact(key)
+        if entry is not None:
+            return entry["results"]
+
+        query_vector = None
+        if semantic and self.embeddings is not None:
+            query_vector = await self.embeddings.aembed_query(query)
+            entry = self._lookup_similar(query_vector, params)
+            if entry is not None:
+                return entry["results"]
+
+        generation = self._record_miss()
+        results = await search(query_vector)
+        self._store(key, results, query_vector, generation)
+        return results
+
+    def _lookup_exact(self, key: Hashable) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._get_exact(key)
+            if entry is not None:
+                self.counters["exact_hits"] += 1
+            return entry
+
+    def _lookup_similar(
+        self, query_vector: List[float], params: Hashable
+    ) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._get_similar(self._normalize(query_vector), params)
+            if entry is not None:
+                self.counters["semantic_hits"] += 1
+            return entry
+
+    def _record_miss(self) -> int:
+        with self._lock:
+            self.counters["misses"] += 1
+            return self._generation
+
+    def _store(
+        self,
+        key: Hashable,
+        results: Any,
+        query_vector: Optional[List[float]],
+        generation: int,
+    ) -> None:
+        vector = None if query_vector is None else self._normalize(query_vector)
+        with self._lock:
+            # 검색 도중 무효화되었다면 이전 인덱스의 결과이므로 캐싱하지 않습니다.
+            if generation == self._generation:
+                self._put(key, results, vector)
+
+    @staticmethod
+    def _normalize(query_vector: List[float]) -> np.ndarray:
+        vector = np.array(query_vector, dtype=np.float32)
+        vector /= np.linalg.norm(vector) or 1.0
+        return vector
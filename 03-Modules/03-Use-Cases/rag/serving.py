@@ -0,0 +1,449 @@
+from rag.metrics import Metrics, default_metrics
+
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+import asyncio
+import json
+import os
+import select
+import signal
+import socket
+import sys
+import time
+import uvicorn
+
+
+class AdmissionControl:
+    """동시에 처리하는 HTTP 요청 수를 제한하는 ASGI 미들웨어입니다.
+
+    max_concurrency개를 넘는 요청은 대기열에서 기다리고, 대기열이 max_queue개로
+    가득 찼거나 queue_timeout초 안에 처리를 시작하지 못하면 즉시 503
+    (Retry-After)을 반환합니다. 과부하 시 요청이 무한히 쌓여 모든 요청의 응답
+    시간이 늘어나는 대신 클라이언트가 다시 시도하거나 다른 서버를 사용할 수
+    있습니다.
+    """
+
+    def __init__(
+        self,
+        app,
+        max_concurrency: int = 8,
+        max_queue: int = 32,
+        queue_timeout: float = 10.0,
+        retry_after: int = 1,
+        metrics: Metrics = default_metrics,
+    ):
+        self.app = app
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.metrics = metrics
+        self.active = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        metrics.add_collector(self.samples)
+
+    def samples(self):
+        """처리 중, 대기 중인 요청 수를 Prometheus gauge로 내보냅니다."""
+        return [
+            ("http_requests_active", self.active, {}),
+            ("http_requests_waiting", self.waiting, {}),
+        ]
+
+    async def _reject(self, send, reason: str) -> None:
+        self.metrics.increment("http_requests_rejected_total", reason=reason)
+        body = json.dumps({"error": "Server is busy, please retry"}).encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(self.retry_after).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            # lifespan 등은 제한하지 않습니다.
+            return await self.app(scope, receive, send)
+
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            return await self._reject(send, "queue_full")
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            return await self._reject(send, "queue_timeout")
+        finally:
+            self.waiting -= 1
+
+        self.active += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+
+class _CloseConnections:
+    """draining이 True이면 응답에 Connection: close를 붙이는 ASGI 미들웨어입니다.
+
+    keep-alive 연결을 사용하는 클라이언트가 다음 요청을 새 연결(다른 워커)로
+    보내게 하여, 종료하는 워커가 연결을 닫을 때 요청이 유실되지 않게 합니다.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.draining = False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.draining:
+            return await self.app(scope, receive, send)
+
+        async def send_closing(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"connection", b"close"))
+                message = dict(message, headers=headers)
+            await send(message)
+
+        await self.app(scope, receive, send_closing)
+
+
+def bind_socket(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    """워커들이 함께 accept할 리스닝 소켓을 생성합니다."""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+class WorkerPool:
+    """pre-fork 방식으로 여러 프로세스에서 하나의 ASGI 앱을 실행합니다.
+
+    부모 프로세스는 리스닝 소켓을 만들고 워커를 fork한 뒤 감독만 하며,
+    워커들은 같은 소켓에서 요청을 나누어 받습니다. (CPU를 사용하는 검색과
+    결과 포맷팅이 코어 수만큼 병렬로 실행됨) 인덱스는 mmap으로 읽기 전용
+    로드하므로 워커 수와 관계없이 물리 메모리에는 한 벌만 올라갑니다.
+
+    - build(): 인덱스를 생성(또는 갱신)합니다. 부모 프로세스에 스레드와
+      네트워크 연결이 남지 않도록 별도 자식 프로세스에서 실행합니다.
+    - create_app(worker_id): 워커에서 호출되어 ASGI 앱을 반환합니다. 반환 전에
+      인덱스를 로드해 두면 준비된 워커만 요청을 받습니다.
+    - signature(): 값이 바뀌면(예: 원본 PDF 수정) 인덱스를 다시 만들고
+      워커를 하나씩 교체합니다. (graceful reload)
+    - SIGHUP을 받으면 인덱스를 다시 만들고 워커를 교체하며, SIGTERM/SIGINT를
+      받으면 처리 중인 요청을 마친 뒤 종료합니다.
+
+    교체되는 워커는 SIGUSR1을 받아 새 연결을 받지 않고, drain_timeout초 동안
+    응답마다 keep-alive 연결을 닫은 뒤 처리 중인 요청을 마치고 종료합니다.
+
+    비정상 종료한 워커는 바로 다시 시작하지만, 준비되기 전에 계속 종료하면
+    (예: 인덱스 파일 손상) restart_backoff초부터 두 배씩 max_restart_backoff초까지
+    기다렸다가 다시 시작합니다.
+    """
+
+    def __init__(
+        self,
+        create_app: Callable[[int], Any],
+        host: str = "127.0.0.1",
+        port: int = 8000,
+        workers: Optional[int] = None,
+        build: Optional[Callable[[], None]] = None,
+        signature: Optional[Callable[[], Any]] = None,
+        poll_interval: float = 30.0,
+        ready_timeout: float = 300.0,
+        graceful_timeout: float = 30.0,
+        drain_timeout: float = 2.0,
+        restart_backoff: float = 1.0,
+        max_restart_backoff: float = 60.0,
+    ):
+        self.create_app = create_app
+        self.host = host
+        self.port = port
+        self.workers = workers or os.cpu_count() or 1
+        self.build = build
+        self.signature = signature
+        self.poll_interval = poll_interval
+        self.ready_timeout = ready_timeout
+        self.graceful_timeout = graceful_timeout
+        self.drain_timeout = drain_timeout
+        self.restart_backoff = restart_backoff
+        self.max_restart_backoff = max_restart_backoff
+
+        self.sock = None
+        self._workers: Dict[int, int] = {}  # pid -> worker_id
+        # 다시 시작하여 준비를 기다리는 워커: ready_fd -> (pid, worker_id, 기한)
+        self._starting: Dict[int, Tuple[int, int, float]] = {}
+        self._ready: Set[int] = set()  # 준비 완료를 알린 워커 pid
+        self._failures: Dict[int, int] = {}  # worker_id -> 연속 비정상 종료 횟수
+        self._restart_at: Dict[int, float] = {}  # worker_id -> 다시 시작할 시각
+        self._reload = False
+        self._stop = False
+
+    def _log(self, message: str) -> None:
+        print(f"[workers {os.getpid()}] {message}", file=sys.stderr, flush=True)
+
+    def _run_build(self) -> bool:
+        """build()를 자식 프로세스에서 실행하고 성공 여부를 반환합니다."""
+        if self.build is None:
+            return True
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                self.build()
+            except BaseException as e:
+                print(f"Error: Failed to build index: {e}", file=sys.stderr)
+                code = 1
+            finally:
+                sys.stderr.flush()
+                os._exit(code)
+        _, status = os.waitpid(pid, 0)
+        return os.waitstatus_to_exitcode(status) == 0
+
+    def _serve(self, worker_id: int, ready_fd: int) -> None:
+        """워커 프로세스의 본문입니다."""
+        # SIGHUP(재로드)은 부모만 처리하고, SIGTERM/SIGINT는 uvicorn이 graceful하게 처리합니다.
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, signal.SIG_DFL)
+        app = _CloseConnections(self.create_app(worker_id))
+        config = uvicorn.Config(
+            app,
+            log_level="warning",
+            timeout_graceful_shutdown=self.graceful_timeout,
+        )
+        server = uvicorn.Server(config)
+
+        async def drain():
+            # 이 워커만 리스닝 소켓을 닫으므로 새 연결은 다른 워커가 받습니다.
+            for listener in server.servers:
+                listener.close()
+            app.draining = True
+            await asyncio.sleep(self.drain_timeout)
+            server.should_exit = True
+
+        async def serve():
+            asyncio.get_running_loop().add_signal_handler(
+                signal.SIGUSR1, lambda: asyncio.ensure_future(drain())
+            )
+            # 앱이 준비되면 부모에게 알립니다.
+            os.write(ready_fd, b"1")
+            os.close(ready_fd)
+            await server.serve(sockets=[self.sock])
+
+        asyncio.run(serve())
+
+    def _spawn(self, worker_id: int):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            code = 0
+            try:
+                self._serve(worker_id, write_fd)
+            except BaseException as e:
+                print(f"Error: Worker {worker_id} failed: {e}", file=sys.stderr)
+                code = 1
+            finally:
+                sys.stderr.flush()
+                os._exit(code)
+        os.close(write_fd)
+        self._workers[pid] = worker_id
+        return pid, read_fd
+
+    def _wait_ready(self, read_fd: int) -> bool:
+        try:
+            readable, _, _ = select.select([read_fd], [], [], self.ready_timeout)
+            return bool(readable) and os.read(read_fd, 1) == b"1"
+        finally:
+            os.close(read_fd)
+
+    def _start_worker(self, worker_id: int) -> None:
+        """워커를 시작합니다. 준비 완료는 _check_starting에서 확인합니다."""
+        pid, read_fd = self._spawn(worker_id)
+        deadline = time.monotonic() + self.ready_timeout
+        self._starting[read_fd] = (pid, worker_id, deadline)
+
+    def _check_starting(self, timeout: float) -> None:
+        """다시 시작한 워커들의 준비 신호를 최대 timeout초 동안 기다립니다.
+
+        준비를 기다리는 동안에도 감독 루프가 다른 워커를 회수하고 다시 시작할 수
+        있도록 블로킹하지 않고 확인합니다. ready_timeout 안에 준비되지 않은 워커는
+        종료시키며, 종료된 워커는 _reap에서 다시 시작됩니다.
+        """
+        if not self._starting:
+            time.sleep(timeout)
+            return
+        readable, _, _ = select.select(list(self._starting), [], [], timeout)
+        now = time.monotonic()
+        for read_fd, (pid, worker_id, deadline) in list(self._starting.items()):
+            if read_fd in readable:
+                # 준비 전에 종료한 워커는 EOF를 받습니다.
+                if os.read(read_fd, 1) == b"1":
+                    self._mark_ready(pid, worker_id)
+            elif now < deadline:
+                continue
+            else:
+                self._log(f"Worker {worker_id} did not become ready, stopping it")
+                self._stop_worker(pid)
+            del self._starting[read_fd]
+            os.close(read_fd)
+
+    def _mark_ready(self, pid: int, worker_id: int) -> None:
+        self._ready.add(pid)
+        if self._failures.pop(worker_id, 0):
+            self._log(f"Worker {worker_id} is ready")
+
+    def _schedule_restart(self, worker_id: int, code: int) -> None:
+        """비정상 종료한 워커를 다시 시작할 시각을 정합니다.
+
+        처음에는 바로 다시 시작하고, 준비되기 전에 다시 종료할 때마다 대기 시간을
+        restart_backoff초부터 두 배씩 늘립니다. (fork를 반복하지 않도록)
+        """
+        failures = self._failures.get(worker_id, 0) + 1
+        self._failures[worker_id] = failures
+        delay = 0.0
+        if failures > 1:
+            delay = min(
+                self.max_restart_backoff, self.restart_backoff * 2 ** (failures - 2)
+            )
+        self._log(f"Worker {worker_id} exited ({code}), restarting in {delay:g}s")
+        self._restart_at[worker_id] = time.monotonic() + delay
+
+    def _restart_due(self) -> None:
+        now = time.monotonic()
+        for worker_id, restart_at in list(self._restart_at.items()):
+            if now >= restart_at:
+                del self._restart_at[worker_id]
+                self._start_worker(worker_id)
+
+    def _stop_worker(self, pid: int, drain: bool = False) -> None:
+        """워커에 처리 중인 요청을 마치고 종료하도록 신호를 보냅니다."""
+        try:
+            os.kill(pid, signal.SIGUSR1 if drain else signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    def _reap(self, block: bool = False) -> list:
+        """종료된 워커를 회수하고 (pid, worker_id, 종료 코드) 목록을 반환합니다."""
+        exited = []
+        while self._workers:
+            try:
+                pid, status = os.waitpid(-1, 0 if block else os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            worker_id = self._workers.pop(pid, None)
+            if worker_id is not None:
+                exited.append((pid, worker_id, os.waitstatus_to_exitcode(status)))
+            if block:
+                break
+        return exited
+
+    def rolling_restart(self) -> None:
+        """새 워커가 준비될 때마다 이전 워커를 하나씩 종료합니다.
+
+        교체 중에도 나머지 워커가 요청을 처리하므로 서비스가 중단되지 않습니다.
+        """
+        for old_pid, worker_id in list(self._workers.items()):
+            if self._stop:
+                return
+            pid, read_fd = self._spawn(worker_id)
+            if not self._wait_ready(read_fd):
+                self._log(f"Worker {worker_id} failed to start, keeping old worker")
+                self._stop_worker(pid)
+                continue
+            self._mark_ready(pid, worker_id)
+            self._stop_worker(old_pid, drain=True)
+
+    def reload(self) -> None:
+        """인덱스를 다시 만들고 워커를 교체합니다."""
+        self._log("Rebuilding index...")
+        if not self._run_build():
+            self._log("Index build failed, keeping current workers")
+            return
+        self.rolling_restart()
+        self._log("Reload complete")
+
+    def _handle_signal(self, signum, frame) -> None:
+        if signum == signal.SIGHUP:
+            self._reload = True
+        else:
+            self._stop = True
+
+    def run(self) -> None:
+        """워커를 시작하고 종료 신호를 받을 때까지 감독합니다."""
+        self.sock = bind_socket(self.host, self.port)
+        for signum in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, self._handle_signal)
+
+        current = self.signature() if self.signature else None
+        if not self._run_build():
+            raise RuntimeError("Failed to build index")
+        try:
+            for worker_id in range(self.workers):
+                self._start_worker(worker_id)
+            while self._starting and not self._stop:
+                self._check_starting(0.5)
+            # 준비 완료를 알린 워커 수를 보고합니다. (나머지는 아래에서 다시 시작)
+            self._log(
+                f"Serving on http://{self.host}:{self.port} "
+                f"with {len(self._ready)} of {self.workers} workers ready"
+            )
+
+            last_poll = time.monotonic()
+            while not self._stop:
+                self._check_starting(0.5)
+                for pid, worker_id, code in self._reap():
+                    self._ready.discard(pid)
+                    if not self._stop and worker_id not in self._workers.values():
+                        # 비정상 종료한 워커를 다시 시작합니다. (준비는 기다리지 않음)
+                        self._schedule_restart(worker_id, code)
+                self._restart_due()
+
+                if self.signature and time.monotonic() - last_poll > self.poll_interval:
+                    last_poll = time.monotonic()
+                    try:
+                        signature = self.signature()
+                    except Exception as e:
+                        self._log(f"Warning: Failed to check index source: {e}")
+                        signature = current
+                    if signature != current:
+                        current = signature
+                        self._reload = True
+                if self._reload:
+                    self._reload = False
+                    self.reload()
+        finally:
+            self.shutdown()
+
+    def shutdown(self) -> None:
+        """모든 워커를 graceful하게 종료합니다. 시간 안에 끝나지 않으면 강제 종료합니다."""
+        for read_fd in self._starting:
+            os.close(read_fd)
+        self._starting.clear()
+        for pid in list(self._workers):
+            self._stop_worker(pid)
+        deadline = time.monotonic() + self.graceful_timeout
+        while self._workers and time.monotonic() < deadline:
+            if not self._reap():
+                time.sleep(0.1)
+        for pid in list(self._workers):
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        while self._workers:
+            if not self._reap(block=True):
+                break
+        if self.sock is not None:
+            self.sock.close()
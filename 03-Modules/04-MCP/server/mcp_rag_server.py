@@ -1,15 +1,24 @@
-
 from mcp.server.fastmcp import FastMCP
 from langchain_openai import OpenAIEmbeddings
-from langchain_community.vectorstores import FAISS
 from langchain_community.document_loaders import PyMuPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_tavily import TavilySearch
 from langchain_core.documents import Document
 from dotenv import load_dotenv
 from typing import List, Literal
+from rag.bm25 import reciprocal_rank_fusion
+from rag.dedup import ChunkDeduplicator, deduplicate_chunks
+from rag.live_index import LiveIndex
+from rag.metrics import MeteredEmbeddings, default_metrics as metrics, serve_prometheus
+from rag.page_cache import PageCache
+from rag.query_cache import QueryCache
+from rag.serving import AdmissionControl
+from rag.web_search import TavilyBackend, WebSearch
+import asyncio
+import json
 import os
 import pickle
+import sys
+import uvicorn
 
 load_dotenv(override=True)
 
@@ -19,28 +28,134 @@ mcp = FastMCP(
     instructions="A RAG server that provides vector search, document addition, and web search capabilities."
 )
 
-# 전역 변수로 벡터스토어 관리
-vector_store = None
-embeddings = OpenAIEmbeddings()
+current_dir = os.path.dirname(os.path.abspath(__file__))
+pdf_path = os.path.join(current_dir, "data", "SPRI_AI_Brief_2023년12월호_F.pdf")
 
-def initialize_vector_store():
-    """벡터 스토어를 초기화하고 PDF 문서를 로드합니다."""
-    global vector_store
+embeddings = MeteredEmbeddings(OpenAIEmbeddings(), metrics)
+
+# 반복되거나 거의 같은 질의의 검색 결과를 재사용하는 캐시
+query_cache = QueryCache(embeddings)
 
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    pdf_path = os.path.join(current_dir, "data", "SPRI_AI_Brief_2023년12월호_F.pdf")
+def query_cache_samples():
+    """질의 캐시 통계를 Prometheus gauge로 내보냅니다."""
+    return [(f"query_cache_{name}", value, {}) for name, value in query_cache.stats().items()]
+
+metrics.add_collector(query_cache_samples)
+
+# 벡터스토어와 키워드(BM25) 인덱스를 함께 관리합니다.
+# 추가한 문서는 WAL과 스냅샷으로 저장되어 재시작 후에도 유지되며,
+# 동시에 들어온 추가 요청은 한 번의 임베딩과 인덱스 갱신으로 묶어 처리합니다.
+live_index = LiveIndex(
+    embeddings,
+    os.path.join(current_dir, ".cache", "rag_server"),
+    on_update=query_cache.invalidate,
+)
 
-    loader = PyMuPDFLoader(pdf_path)
-    documents = loader.load()
+# PDF에서 추출한 페이지 텍스트 캐시 (PDF 내용이 같으면 재시작 시 파싱을 건너뜀)
+page_cache = PageCache(os.path.join(current_dir, ".cache", "pages.sqlite"))
+
+# 웹 검색 결과 캐시와 공유 HTTP 클라이언트
+# (TAVILY_BASE_URL로 로컬 stub 서버 tests/fake_search_server.py 사용 가능)
+web_search_client = WebSearch(
+    TavilyBackend(),
+    cache_path=os.path.join(current_dir, ".cache", "web_search.sqlite"),
+    ttl=float(os.environ.get("WEB_SEARCH_TTL", 24 * 3600)),
+    max_concurrency=int(os.environ.get("WEB_SEARCH_CONCURRENCY", 4)),
+    metrics=metrics,
+)
+
+# 동시에 들어온 첫 요청들이 초기화를 중복 실행하지 않도록 보호합니다.
+init_lock = asyncio.Lock()
+
+def source_signature():
+    """원본 PDF가 바뀌었는지 확인하기 위한 (경로, 크기, 수정 시각)"""
+    stat = os.stat(pdf_path)
+    return [pdf_path, stat.st_size, stat.st_mtime_ns]
+
+def load_documents():
+    """PDF 문서를 로드하고 청크로 분할합니다."""
+    with metrics.stage("load"):
+        documents = page_cache.load(
+            pdf_path, "pymupdf", lambda: PyMuPDFLoader(pdf_path).load()
+        )
+    metrics.increment("pages_loaded_total", len(documents))
+    metrics.increment("bytes_read_total", os.path.getsize(pdf_path), kind="source")
 
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size=1000,
         chunk_overlap=200
     )
-    splits = text_splitter.split_documents(documents)
+    with metrics.stage("split"):
+        splits = text_splitter.split_documents(documents)
+
+    # 페이지마다 반복되는 머리글, 면책 문구 등은 하나로 합쳐 한 번만 임베딩합니다.
+    with metrics.stage("dedup"):
+        splits, num_removed = deduplicate_chunks(splits, ChunkDeduplicator())
+    metrics.increment("chunks_deduplicated_total", num_removed)
+    return splits
+
+def build_indexes(splits, vectors):
+    """임베딩된 청크로 벡터 스토어와 키워드 인덱스를 생성합니다. (추가 문서는 WAL에서 복원)"""
+    with metrics.stage("index"):
+        live_index.build(splits, vectors, source=source_signature())
+    metrics.increment("chunks_indexed_total", len(splits))
+    query_cache.invalidate()
+
+def load_snapshot():
+    """저장된 스냅샷이 원본 PDF와 일치하면 로드합니다."""
+    with metrics.stage("load_from_cache"):
+        loaded = live_index.load(source=source_signature())
+    metrics.increment(f"cache_{'hits' if loaded else 'misses'}_total", cache="index")
+    if loaded:
+        query_cache.invalidate()
+    return loaded
+
+def initialize_vector_store():
+    """벡터 스토어와 키워드 인덱스를 초기화하고 PDF 문서를 로드합니다."""
+    if not load_snapshot():
+        splits = load_documents()
+        vectors = embeddings.embed_documents([doc.page_content for doc in splits])
+        build_indexes(splits, vectors)
+    with live_index.read() as (vector_store, _):
+        return vector_store
+
+async def ainitialize_vector_store():
+    """initialize_vector_store의 비동기 버전입니다.
+
+    PDF 파싱과 FAISS 인덱스 생성은 스레드에서 실행하고, 임베딩은 비동기로 요청하여
+    초기화 중에도 이벤트 루프가 다른 요청을 처리할 수 있게 합니다.
+    """
+    if await asyncio.to_thread(load_snapshot):
+        return
+    splits = await asyncio.to_thread(load_documents)
+    vectors = await embeddings.aembed_documents([doc.page_content for doc in splits])
+    await asyncio.to_thread(build_indexes, splits, vectors)
+
+async def ensure_vector_store():
+    """벡터 스토어가 없으면 한 번만 초기화합니다."""
+    if not live_index.ready:
+        async with init_lock:
+            if not live_index.ready:
+                await ainitialize_vector_store()
+
+def search_indexes(query, query_vector, search_type, k):
+    """인덱스에서 검색합니다. (CPU 작업이므로 스레드에서 실행)
 
-    vector_store = FAISS.from_documents(splits, embeddings)
-    return vector_store
+    검색 도중 문서가 추가되어도 검색을 시작한 시점의 인덱스를 사용합니다.
+    """
+    with live_index.read() as (vector_store, keyword_index):
+        if search_type == "semantic":
+            return vector_store.similarity_search_by_vector(query_vector, k=k)
+        elif search_type == "keyword":
+            return keyword_index.search(query, k=k)
+        elif search_type == "hybrid":
+            # 각 검색에서 후보를 넉넉히 가져온 뒤 순위를 결합합니다.
+            fetch_k = max(k * 4, 20)
+            semantic_results = vector_store.similarity_search_by_vector(
+                query_vector, k=fetch_k
+            )
+            keyword_results = keyword_index.search(query, k=fetch_k)
+    return reciprocal_rank_fusion([semantic_results, keyword_results])[:k]
 
 @mcp.tool()
 async def vector_search(
@@ -48,69 +163,114 @@ async def vector_search(
     search_type: Literal["semantic", "keyword", "hybrid"] = "semantic",
     k: int = 5
 ) -> str:
-    """벡터 스토어에서 문서를 검색합니다."""
-    global vector_store
+    """벡터 스토어에서 문서를 검색합니다.
 
-    if vector_store is None:
-        initialize_vector_store()
+    - semantic: 임베딩 유사도 검색
+    - keyword: BM25 키워드 검색
+    - hybrid: 두 검색 결과를 Reciprocal Rank Fusion으로 결합
+    """
+    with metrics.timer("tool_duration_seconds", errors="tool_errors_total", tool="vector_search"):
+        await ensure_vector_store()
 
-    if search_type == "semantic":
-        results = vector_store.similarity_search(query, k=k)
-    elif search_type == "keyword":
-        all_docs = vector_store.similarity_search("", k=100)
-        results = [doc for doc in all_docs if query.lower() in doc.page_content.lower()][:k]
-    elif search_type == "hybrid":
-        semantic_results = vector_store.similarity_search(query, k=k*2)
-        keyword_results = [doc for doc in semantic_results if query.lower() in doc.page_content.lower()]
-        results = keyword_results[:k] if keyword_results else semantic_results[:k]
+        async def search(query_vector):
+            with metrics.stage("search"):
+                return await asyncio.to_thread(
+                    search_indexes, query, query_vector, search_type, k
+                )
 
-    return "\n\n".join([doc.page_content for doc in results])
+        # 키워드 검색은 임베딩을 사용하지 않으므로 정확히 같은 질의만 캐시를 공유합니다.
+        results = await query_cache.aget_or_search(
+            query, search, params=(search_type, k), semantic=search_type != "keyword"
+        )
+
+        with metrics.stage("format"):
+            return "\n\n".join([doc.page_content for doc in results])
 
 @mcp.tool()
 async def add_document(text: str, metadata: dict = None) -> str:
-    """사용자 텍스트를 벡터 스토어에 추가합니다."""
-    global vector_store
-
-    if vector_store is None:
-        initialize_vector_store()
+    """사용자 텍스트를 벡터 스토어와 키워드 인덱스에 추가합니다."""
+    with metrics.timer("tool_duration_seconds", errors="tool_errors_total", tool="add_document"):
+        await ensure_vector_store()
 
-    if metadata is None:
-        metadata = {"source": "user_input"}
+        if metadata is None:
+            metadata = {"source": "user_input"}
 
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=200
-    )
+        text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=1000,
+            chunk_overlap=200
+        )
 
-    documents = [Document(page_content=text, metadata=metadata)]
-    splits = text_splitter.split_documents(documents)
+        documents = [Document(page_content=text, metadata=metadata)]
+        splits = text_splitter.split_documents(documents)
 
-    vector_store.add_documents(splits)
+        # WAL에 기록되고 검색에 반영될 때까지 기다립니다. (동시 요청과 함께 배치 처리)
+        with metrics.stage("index"):
+            await live_index.add_documents(splits)
+        metrics.increment("chunks_indexed_total", len(splits))
 
     return f"문서가 성공적으로 추가되었습니다. 총 {len(text)} 문자, {len(splits)}개 청크로 분할됨"
 
-@mcp.tool()
-async def web_search(query: str, max_results: int = 3) -> str:
-    """TavilySearch를 사용하여 웹 검색을 수행합니다."""
-    tavily = TavilySearch(max_results=max_results)
-    results = tavily.invoke(query)
+@mcp.resource("stats://query-cache")
+def query_cache_stats() -> str:
+    """질의 캐시 히트율 통계를 반환합니다."""
+    return json.dumps(query_cache.stats())
 
+@mcp.resource("metrics://prometheus")
+def prometheus_metrics() -> str:
+    """단계별 실행 시간, 캐시 히트/미스 등의 지표를 Prometheus 텍스트 형식으로 반환합니다."""
+    return metrics.to_prometheus()
+
+def format_web_results(results: List[dict]) -> str:
     formatted_results = []
     for i, result in enumerate(results, 1):
         formatted_results.append(
             f"검색 결과 {i}:\n"
-            f"제목: {result.get('title', 'N/A')}\n"
-            f"URL: {result.get('url', 'N/A')}\n"
-            f"내용: {result.get('content', 'N/A')}\n"
+            f"제목: {result.get('title') or 'N/A'}\n"
+            f"URL: {result.get('url') or 'N/A'}\n"
+            f"내용: {result.get('content') or 'N/A'}\n"
         )
-
     return "\n".join(formatted_results)
 
+@mcp.tool()
+async def web_search(query: str, max_results: int = 3) -> str:
+    """Tavily를 사용하여 웹 검색을 수행합니다. (같은 질의는 캐시된 결과를 재사용)"""
+    with metrics.timer("tool_duration_seconds", errors="tool_errors_total", tool="web_search"):
+        results = await web_search_client.search(query, max_results)
+    return format_web_results(results)
+
+@mcp.tool()
+async def multi_web_search(queries: List[str], max_results: int = 3) -> str:
+    """여러 질의를 동시에 웹 검색하고 URL 중복 없이 합친 결과를 반환합니다."""
+    with metrics.timer("tool_duration_seconds", errors="tool_errors_total", tool="multi_web_search"):
+        result_lists = await web_search_client.search_many(queries, max_results)
+    return format_web_results(WebSearch.merge(result_lists))
+
 if __name__ == "__main__":
+    # METRICS_PORT가 설정되어 있으면 http://127.0.0.1:<port>/metrics 로 지표를 제공합니다.
+    if os.environ.get("METRICS_PORT"):
+        serve_prometheus(port=int(os.environ["METRICS_PORT"]))
+
     # 서버 초기화
-    print("RAG MCP 서버를 초기화합니다...")
+    print("RAG MCP 서버를 초기화합니다...", file=sys.stderr)
     initialize_vector_store()
-    print("벡터 스토어 초기화 완료!")
+    print("벡터 스토어 초기화 완료!", file=sys.stderr)
 
     # MCP 서버 실행
-    mcp.run(transport="stdio")
+    if os.environ.get("RAG_TRANSPORT") == "streamable-http":
+        # add_document는 프로세스 하나가 WAL과 인덱스를 갱신하므로 워커 하나로 실행하고,
+        # 동시 요청 수와 대기열 길이만 제한합니다.
+        mcp.settings.stateless_http = True
+        mcp.settings.json_response = True
+        app = AdmissionControl(
+            mcp.streamable_http_app(),
+            max_concurrency=int(os.environ.get("RAG_MAX_CONCURRENCY", 8)),
+            max_queue=int(os.environ.get("RAG_MAX_QUEUE", 32)),
+        )
+        uvicorn.run(
+            app,
+            host=os.environ.get("RAG_HOST", "127.0.0.1"),
+            port=int(os.environ.get("RAG_PORT", 8006)),
+            log_level="warning",
+        )
+    else:
+        mcp.run(transport="stdio")
@@ -1,28 +1,136 @@
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import PyMuPDFLoader
-from langchain_community.vectorstores import FAISS
-from langchain_openai import OpenAIEmbeddings
 from mcp.server.fastmcp import FastMCP
 from dotenv import load_dotenv
-from typing import Any
+from typing import Any, Optional
+from rag.metrics import default_metrics as metrics, serve_prometheus
 from rag.pdf import PDFRetrievalChain
+from rag.query_cache import QueryCache
+from rag.serving import AdmissionControl, WorkerPool
+import asyncio
+import faiss
+import json
+import os
+import sys
+import threading
+import time
 
 
 load_dotenv(override=True)
 
+current_dir = os.path.dirname(os.path.abspath(__file__))
+pdf_path = os.path.join(current_dir, "data", "SPRI_AI_Brief_2023년12월호_F.pdf")
+
+
+def create_index() -> PDFRetrievalChain:
+    """PDF 문서를 인덱싱하여 retriever가 준비된 체인을 생성합니다."""
+    # stdio 전송에서는 stdout이 MCP 메시지 채널이므로 진행 로그를 stderr로 보냅니다.
+    # (RAG_SEARCH_TYPE=mmr 이면 서로 겹치지 않는 청크를 우선 반환합니다.)
+    return PDFRetrievalChain(
+        [pdf_path],
+        mmap_index=True,
+        search_type=os.environ.get("RAG_SEARCH_TYPE", "similarity"),
+        log_file=sys.stderr,
+    ).create_index()
+
 
 def create_retriever() -> Any:
-    """"""
-    # PDF 문서를 로드합니다.
-    import os
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    pdf_path = os.path.join(current_dir, "data", "SPRI_AI_Brief_2023년12월호_F.pdf")
-    pdf = PDFRetrievalChain([pdf_path]).create_chain()
+    """PDF 문서를 인덱싱하여 retriever를 생성합니다."""
+    pdf = create_index()
+    pdf.close()
+    return pdf.retriever
+
+
+def source_signature(path: str = pdf_path):
+    """원본 PDF가 바뀌었는지 확인하기 위한 (수정 시각, 크기)"""
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
 
-    # retriever와 chain을 생성합니다.
-    pdf_retriever = pdf.retriever
+class SharedRetriever:
+    """서버 수명 동안 하나의 retriever를 유지하고 공유합니다.
 
-    return pdf_retriever
+    서버 시작 시 백그라운드에서 retriever를 미리 생성하고(ready 이벤트로 완료를
+    알림), 원본 PDF가 변경되면 새 retriever를 백그라운드에서 만든 뒤 교체합니다.
+    교체 전까지는 기존 retriever가 계속 요청을 처리합니다.
+    """
+
+    def __init__(self, source_path: str, poll_interval: float = 30.0):
+        self.source_path = source_path
+        self.poll_interval = poll_interval
+        self.ready = threading.Event()
+        self._chain = None
+        self._retriever = None
+        self._signature = None
+        self._lock = threading.Lock()
+        self._started = False
+
+        # 반복되거나 거의 같은 질의의 검색 결과를 재사용하는 캐시
+        self.query_cache = QueryCache()
+
+    def _source_signature(self):
+        return source_signature(self.source_path)
+
+    def reload(self) -> None:
+        """retriever를 새로 생성하여 교체합니다."""
+        signature = self._source_signature()
+        chain = create_index()
+        retriever = chain.retriever
+        with self._lock:
+            previous, self._chain = self._chain, chain
+            self._retriever = retriever
+            self._signature = signature
+            self.query_cache.embeddings = retriever.vectorstore.embeddings
+        self.query_cache.invalidate()
+        if previous is not None:
+            # 이전 체인의 임베딩 캐시 연결을 닫습니다. (질의 임베딩은 캐시를 사용하지 않음)
+            previous.close()
+        metrics.increment("retriever_reloads_total")
+        self.ready.set()
+        print("Retriever is ready", file=sys.stderr)
+
+    def _run(self) -> None:
+        while True:
+            try:
+                if self._signature is None:
+                    print("Building retriever...", file=sys.stderr)
+                    self.reload()
+                elif self._signature != self._source_signature():
+                    print("Source changed, reloading retriever...", file=sys.stderr)
+                    self.reload()
+            except Exception as e:
+                print(f"Warning: Failed to reload retriever: {e}", file=sys.stderr)
+            if self.poll_interval <= 0:
+                return
+            time.sleep(self.poll_interval)
+
+    def start(self) -> None:
+        """백그라운드 스레드에서 retriever 생성과 변경 감시를 시작합니다."""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        threading.Thread(target=self._run, name="retriever-loader", daemon=True).start()
+
+    def get(self, timeout: Optional[float] = None) -> Any:
+        """준비된 retriever를 반환합니다. timeout 안에 준비되지 않으면 None."""
+        self.start()
+        if not self.ready.wait(timeout):
+            return None
+        with self._lock:
+            return self._retriever
+
+
+shared_retriever = SharedRetriever(pdf_path)
+
+
+def query_cache_samples():
+    """질의 캐시 통계를 Prometheus gauge로 내보냅니다."""
+    return [
+        (f"query_cache_{name}", value, {})
+        for name, value in shared_retriever.query_cache.stats().items()
+    ]
+
+
+metrics.add_collector(query_cache_samples)
 
 
 # Initialize FastMCP server with configuration
@@ -37,8 +145,9 @@ async def retrieve(query: str) -> str:
     """
     Retrieves information from the document database based on the query.
 
-    This function creates a retriever, queries it with the provided input,
-    and returns the concatenated content of all retrieved documents.
+    This function uses the shared retriever that is built once at server startup,
+    queries it with the provided input, and returns the concatenated content of
+    all retrieved documents.
 
     Args:
         query (str): The search query to find relevant information
@@ -46,15 +155,92 @@ async def retrieve(query: str) -> str:
     Returns:
         str: Concatenated text content from all retrieved documents
     """
-    retriever = create_retriever()
-
-    # Use the invoke() method to get relevant documents based on the query
-    retrieved_docs = retriever.invoke(query)
-
-    # Join all document contents with newlines and return as a single string
-    return "\n".join([doc.page_content for doc in retrieved_docs])
+    with metrics.timer(
+        "tool_duration_seconds", errors="tool_errors_total", tool="retrieve"
+    ):
+        # retriever가 준비될 때까지 이벤트 루프를 막지 않고 기다립니다.
+        retriever = await asyncio.to_thread(shared_retriever.get, 300)
+        if retriever is None:
+            return "The document index is still loading. Please try again shortly."
+
+        async def search(query_vector):
+            with metrics.stage("search"):
+                if query_vector is None:
+                    # Use the ainvoke() method to get relevant documents
+                    return await retriever.ainvoke(query)
+                # 캐시에서 이미 계산한 질의 임베딩을 재사용하고,
+                # CPU를 사용하는 FAISS 검색은 스레드에서 실행합니다.
+                # (mmr 등 search_type에 맞게 저장된 벡터로 검색)
+                return await asyncio.to_thread(retriever.search_by_vector, query_vector)
+
+        # 질의 임베딩은 비동기로 요청하므로 이벤트 루프를 막지 않습니다.
+        retrieved_docs = await shared_retriever.query_cache.aget_or_search(
+            query, search
+        )
+
+        # Join all document contents with newlines and return as a single string
+        with metrics.stage("format"):
+            return "\n".join([doc.page_content for doc in retrieved_docs])
+
+
+@mcp.resource("stats://query-cache")
+def query_cache_stats() -> str:
+    """질의 캐시 히트율 통계를 반환합니다."""
+    return json.dumps(shared_retriever.query_cache.stats())
+
+
+@mcp.resource("metrics://prometheus")
+def prometheus_metrics() -> str:
+    """단계별 실행 시간, 캐시 히트/미스 등의 지표를 Prometheus 텍스트 형식으로 반환합니다."""
+    return metrics.to_prometheus()
+
+
+def create_http_app(worker_id: int = 0):
+    """HTTP 워커에서 사용할 ASGI 앱을 생성합니다.
+
+    캐시된 인덱스를 mmap으로 로드한 뒤 반환하므로 워커는 준비된 후에만 요청을
+    받습니다. 여러 워커가 같은 인덱스 파일의 페이지 캐시를 공유합니다.
+    """
+    # 워커 프로세스들이 코어를 나누어 사용하므로 FAISS는 워커당 스레드 하나만 사용합니다.
+    faiss.omp_set_num_threads(1)
+    if os.environ.get("METRICS_PORT"):
+        serve_prometheus(port=int(os.environ["METRICS_PORT"]) + worker_id)
+
+    # 원본 PDF 변경은 WorkerPool이 감지하여 인덱스를 다시 만들고 워커를 교체합니다.
+    shared_retriever.poll_interval = 0
+    if shared_retriever.get(300) is None:
+        raise RuntimeError("Retriever is not ready")
+
+    # 워커 간에 세션을 공유하지 않도록 요청마다 독립적으로 처리하고 JSON으로 응답합니다.
+    mcp.settings.stateless_http = True
+    mcp.settings.json_response = True
+    return AdmissionControl(
+        mcp.streamable_http_app(),
+        max_concurrency=int(os.environ.get("RAG_MAX_CONCURRENCY", 8)),
+        max_queue=int(os.environ.get("RAG_MAX_QUEUE", 32)),
+    )
 
 
 if __name__ == "__main__":
+    if os.environ.get("RAG_TRANSPORT") == "streamable-http":
+        # 여러 에이전트가 함께 사용하는 경우: pre-fork 워커 풀로 HTTP 서비스
+        # (RAG_WORKERS 기본값은 CPU 코어 수, SIGHUP으로 인덱스 재생성 및 워커 교체)
+        WorkerPool(
+            create_http_app,
+            host=os.environ.get("RAG_HOST", "127.0.0.1"),
+            port=int(os.environ.get("RAG_PORT", 8005)),
+            workers=int(os.environ.get("RAG_WORKERS", 0)) or None,
+            build=create_retriever,
+            signature=source_signature,
+        ).run()
+        sys.exit(0)
+
+    # METRICS_PORT가 설정되어 있으면 http://127.0.0.1:<port>/metrics 로 지표를 제공합니다.
+    if os.environ.get("METRICS_PORT"):
+        serve_prometheus(port=int(os.environ["METRICS_PORT"]))
+
+    # 서버 시작과 동시에 retriever를 미리 생성합니다.
+    shared_retriever.start()
+
     # Run the MCP server with stdio transport for integration with MCP clients
     mcp.run(transport="stdio")
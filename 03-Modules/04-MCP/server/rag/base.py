@@ -1,19 +1,55 @@
 from langchain_core.output_parsers import StrOutputParser
 from langchain_community.vectorstores import FAISS
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_openai import OpenAIEmbeddings, ChatOpenAI
 from langchain.embeddings.cache import CacheBackedEmbeddings
-from langchain.storage import LocalFileStore
+from .cache import create_embedding_store
+from .chunks import (
+    ChunkDocstore,
+    ChunkSet,
+    chunk_texts,
+    merge_vectorstores,
+    select_chunks,
+    split_chunks,
+)
+from .dedup import ChunkDeduplicator, deduplicate_chunks
+from .embeddings import ConcurrentEmbeddings
+from .index import (
+    apply_search_params,
+    build_index,
+    index_type_of,
+    measure_recall,
+    sample_queries,
+)
+from .metrics import MeteredEmbeddings, MeteredStore, default_metrics
+from .retriever import BatchRetriever
+from .mmap_store import (
+    ColumnarDocstore,
+    has_docstore,
+    is_read_only,
+    load_vectorstore,
+    save_vectorstore,
+    to_writable,
+    write_vectorstore,
+)
 
 from abc import ABC, abstractmethod
+from collections.abc import Sequence
 from operator import itemgetter
+from itertools import islice
 from pathlib import Path
 import os
+import sys
+import json
+import shutil
 import hashlib
+import faiss
+import numpy as np
 from langchain import hub
 
 
 class RetrievalChain(ABC):
-    def __init__(self):
+    def __init__(self, **kwargs):
         self.source_uri = None
         self.k = 8
         self.model_name = "gpt-4.1-mini"
@@ -22,6 +58,69 @@ class RetrievalChain(ABC):
         self.embeddings = "text-embedding-3-small"
         self.cache_dir = Path(".cache/embeddings")
         self.index_dir = Path(".cache/faiss_index")
+        self.streaming = False
+        self.batch_size = 256
+        self.embedding_batch_size = 128
+        self.embedding_concurrency = 4
+
+        # FAISS 인덱스 종류: "flat"(정확한 검색), "ivf_flat", "ivf_pq", "hnsw"
+        self.index_type = "flat"
+        self.index_nlist = None  # IVF 클러스터 수 (None이면 4 * sqrt(N))
+        self.index_nprobe = 16  # IVF 검색 시 탐색할 클러스터 수
+        self.index_pq_m = 16  # PQ 서브 벡터 수
+        self.index_hnsw_m = 32  # HNSW 노드당 연결 수
+        self.index_ef_search = 64  # HNSW 검색 후보 수
+        self.index_train_size = 50_000  # IVF 학습 샘플 수
+        # 근사 인덱스 생성 시 flat 대비 recall을 측정할 질의 수 (0이면 측정하지 않음)
+        self.index_eval_queries = 100
+        self.index_report = None
+
+        # 임베딩 전에 내용이 같은 청크와 거의 같은 청크(MinHash 추정 Jaccard 유사도가
+        # dedup_threshold 이상)를 하나로 합칩니다. None이면 내용이 같은 청크만 합칩니다.
+        self.deduplicate = True
+        self.dedup_threshold = 0.9
+
+        # 검색 방식: "similarity"(상위 k개), "mmr"(fetch_k개 후보 중 서로 겹치지 않는 k개),
+        # "similarity_score_threshold"(관련도 score_threshold 이상만, 최소 min_k개)
+        self.search_type = "similarity"
+        self.fetch_k = 100
+        self.lambda_mult = 0.5  # 1에 가까울수록 관련도, 0에 가까울수록 다양성 우선
+        self.score_threshold = 0.5
+        self.min_k = 1
+
+        # 캐시된 FAISS 인덱스 파일도 mmap으로 읽기 전용 로드 (프로세스 간 페이지 캐시 공유)
+        # 문서(docstore)는 이 설정과 관계없이 항상 mmap으로 읽습니다.
+        self.mmap_index = False
+
+        # 소스 파일별로 인덱스(shard)를 만들어 파일 내용 해시로 저장하고 로드 시 합칩니다.
+        # None이면 소스가 여러 개일 때 사용합니다. shard는 파일 묶음 간에 공유됩니다.
+        self.shard_index = None
+        self.shard_dir = Path(".cache/faiss_index/shards")
+
+        # 소스 파일 상태(크기, 수정 시각, 내용 해시)와 분할 설정. manifest에 함께 저장하여
+        # 다음 실행에서 소스가 바뀌지 않았으면 PDF 파싱 없이 캐시된 인덱스를 로드합니다.
+        self.source_state = None
+
+        # 단계별 실행 시간과 캐시 히트/미스 등의 지표를 기록할 레지스트리
+        self.metrics = default_metrics
+
+        # 진행 상황 메시지를 출력할 파일 (None이면 sys.stdout)
+        # stdout으로 메시지를 주고받는 stdio MCP 서버에서는 sys.stderr를 지정합니다.
+        self.log_file = None
+
+        # 키워드 인자로 기본 설정을 변경합니다. (예: k=4, streaming=True)
+        for key, value in kwargs.items():
+            if not hasattr(self, key):
+                raise TypeError(f"Unknown RetrievalChain option: {key}")
+            setattr(self, key, value)
+
+        # create_embedding()이 생성한 임베딩과 캐시 저장소 (체인마다 하나를 재사용)
+        self._embedding = None
+        self._embedding_store = None
+
+    def log(self, *args) -> None:
+        """진행 상황 메시지를 log_file에 출력합니다."""
+        print(*args, file=self.log_file or sys.stdout)
 
     @abstractmethod
     def load_documents(self, source_uris):
@@ -34,96 +133,868 @@ class RetrievalChain(ABC):
         pass
 
     def split_documents(self, docs, text_splitter):
-        """text splitter를 사용하여 문서를 분할합니다."""
-        return text_splitter.split_documents(docs)
+        """text splitter를 사용하여 문서를 분할합니다.
+
+        청크는 페이지 텍스트의 오프셋으로 저장하는 ChunkSet으로 반환되며,
+        Document는 조회할 때 생성됩니다.
+        """
+        return split_chunks(docs, text_splitter)
+
+    def lazy_load_documents(self, source_uris):
+        """문서를 하나씩 생성합니다. 기본 구현은 load_documents 결과를 순회합니다."""
+        yield from self.load_documents(source_uris)
+
+    def iter_split_documents(self, docs, text_splitter):
+        """문서를 하나씩 분할하여 청크를 순서대로 생성합니다."""
+        for doc in docs:
+            yield from text_splitter.split_documents([doc])
+
+    def create_base_embedding(self):
+        """캐시 없이 사용할 기본 임베딩 모델을 생성합니다."""
+        return OpenAIEmbeddings(model=self.embeddings)
 
     def create_embedding(self):
+        """캐시 기반 임베딩을 반환합니다.
+
+        처음 호출할 때 생성하고 이후에는 같은 임베딩(같은 SQLite 연결)을 반환합니다.
+        연결은 close()로 닫습니다.
+        """
+        if self._embedding is None:
+            self._embedding = self._create_embedding()
+        return self._embedding
+
+    def _create_embedding(self):
         try:
             # 캐시 디렉토리 생성
             self.cache_dir.mkdir(parents=True, exist_ok=True)
 
-            # 기본 임베딩 모델 생성
-            underlying_embeddings = OpenAIEmbeddings(model=self.embeddings)
-
-            # 파일 기반 캐시 스토어 생성
-            store = LocalFileStore(str(self.cache_dir))
+            # 기본 임베딩 모델 생성 (배치 단위 동시 요청, 실제 요청 시간과 청크 수 기록)
+            underlying_embeddings = MeteredEmbeddings(
+                ConcurrentEmbeddings(
+                    self.create_base_embedding(),
+                    batch_size=self.embedding_batch_size,
+                    max_concurrency=self.embedding_concurrency,
+                ),
+                self.metrics,
+            )
 
-            # 캐시 기반 임베딩 생성 (SHA-256 사용으로 보안 강화)
-            cached_embeddings = CacheBackedEmbeddings.from_bytes_store(
-                underlying_embeddings, 
-                store, 
-                namespace=self.embeddings,
-                key_encoder="sha256"
+            # 단일 SQLite 파일 기반 캐시 스토어 생성 (float32 벡터 저장, 히트/미스 기록)
+            self._embedding_store = create_embedding_store(
+                self.cache_dir / "embeddings.sqlite", namespace=self.embeddings
             )
+            store = MeteredStore(self._embedding_store, "embedding", self.metrics)
+
+            # 캐시 기반 임베딩 생성 (SHA-256 키 사용)
+            cached_embeddings = CacheBackedEmbeddings(underlying_embeddings, store)
 
             return cached_embeddings
 
         except Exception as e:
-            print(f"Warning: Failed to create cached embeddings: {e}")
-            print("Falling back to basic OpenAI embeddings without caching")
-            return OpenAIEmbeddings(model=self.embeddings)
+            self.log(f"Warning: Failed to create cached embeddings: {e}")
+            self.log("Falling back to basic OpenAI embeddings without caching")
+            return MeteredEmbeddings(self.create_base_embedding(), self.metrics)
+
+    def close(self):
+        """임베딩 캐시의 SQLite 연결을 닫습니다. (다시 사용하면 새로 엽니다)"""
+        if self._embedding_store is not None:
+            self._embedding_store.store.close()
+        self._embedding = None
+        self._embedding_store = None
+
+    def _chunk_id(self, doc):
+        """청크 내용과 메타데이터로부터 content-addressed ID를 계산합니다."""
+        payload = json.dumps(
+            {"content": doc.page_content, "metadata": doc.metadata},
+            sort_keys=True,
+            ensure_ascii=False,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def deduplicate_chunks(self, split_docs):
+        """중복 청크를 합칩니다. 합쳐진 청크는 metadata["sources"]에 모든 출처를 기록합니다."""
+        deduplicator = ChunkDeduplicator(threshold=self.dedup_threshold)
+        with self.metrics.stage("dedup"):
+            split_docs, num_removed = deduplicate_chunks(split_docs, deduplicator)
+        self.metrics.increment("chunks_deduplicated_total", num_removed)
+        if num_removed:
+            self.log(f"Collapsed {num_removed} duplicate chunks")
+        return split_docs
+
+    def _unique_chunks(self, split_docs):
+        """content hash가 같은 청크를 제거하고 (청크 ID 목록, 청크 목록)을 반환합니다."""
+        if not isinstance(split_docs, Sequence):
+            split_docs = list(split_docs)
+        if self.deduplicate:
+            split_docs = self.deduplicate_chunks(split_docs)
+        positions = {}
+        for position, doc in enumerate(split_docs):
+            positions.setdefault(self._chunk_id(doc), position)
+        return list(positions), select_chunks(split_docs, list(positions.values()))
+
+    def _chunk_entry(self, doc):
+        """manifest에 기록할 청크의 출처 정보를 반환합니다."""
+        return {"source": doc.metadata.get("source"), "page": doc.metadata.get("page")}
+
+    def _index_config(self):
+        """인덱스 구조에 영향을 주는 설정을 반환합니다. (검색 파라미터 제외)"""
+        if self.index_type == "flat":
+            return {"type": "flat"}
+        return {
+            "type": self.index_type,
+            "nlist": self.index_nlist,
+            "pq_m": self.index_pq_m,
+            "hnsw_m": self.index_hnsw_m,
+        }
+
+    def _chunk_manifest(self, entries, vectorstore):
+        """청크 ID별 출처 정보를 담은 manifest를 생성합니다.
+
+        index는 캐시 확인에 사용하는 요청한 설정이고, index_type은 실제로 생성된
+        인덱스 종류입니다. (학습 실패로 flat을 사용한 경우 등)
+        """
+        return {
+            "embeddings": self.embeddings,
+            "index": self._index_config(),
+            "index_type": index_type_of(vectorstore.index),
+            "index_report": self.index_report,
+            "sources": self.source_state,
+            "chunks": entries,
+        }
+
+    def _indexed_ids(self, vectorstore, manifest):
+        """인덱스에 저장된 청크 ID 집합을 반환합니다."""
+        indexed_ids = set(manifest.get("chunks", {}))
+
+        # manifest와 인덱스가 어긋난 경우 docstore ID를 기준으로 합니다.
+        if len(indexed_ids) != vectorstore.index.ntotal:
+            if is_read_only(vectorstore):
+                indexed_ids = set(vectorstore.docstore.ids())
+            else:
+                indexed_ids = set(vectorstore.index_to_docstore_id.values())
+        return indexed_ids
+
+    def _load_local(self, index_path):
+        """이전 버전에서 pickle로 저장된 인덱스를 로드합니다."""
+        return FAISS.load_local(
+            index_path,
+            self.create_embedding(),
+            allow_dangerous_deserialization=True,
+        )
+
+    def _writable(self, vectorstore):
+        """캐시에서 로드한 읽기 전용 vectorstore를 수정 가능한 vectorstore로 바꿉니다."""
+        if not is_read_only(vectorstore):
+            return vectorstore
+        vectorstore = to_writable(vectorstore)
+        apply_search_params(vectorstore.index, self.index_nprobe, self.index_ef_search)
+        return vectorstore
+
+    def _load_cached_vectorstore(self, index_path, manifest_file):
+        """캐시된 인덱스와 manifest를 로드합니다. 사용할 수 없으면 (None, None)."""
+        with self.metrics.stage("load_from_cache"):
+            vectorstore, manifest = self._read_cached_vectorstore(
+                index_path, manifest_file
+            )
+        result = "hits" if vectorstore is not None else "misses"
+        self.metrics.increment(f"cache_{result}_total", cache="index")
+        return vectorstore, manifest
+
+    def _read_cached_vectorstore(self, index_path, manifest_file):
+        try:
+            # index_path 디렉토리 안에 index.faiss와 docstore 파일이 저장됩니다.
+            if manifest_file.exists() and (Path(index_path) / "index.faiss").exists():
+                manifest = json.loads(manifest_file.read_text())
+
+                if (
+                    manifest.get("embeddings") == self.embeddings
+                    and manifest.get("index", {"type": "flat"}) == self._index_config()
+                ):
+                    # 기존 인덱스 로드 시도 (문서는 pickle 없이 mmap으로 읽음)
+                    if has_docstore(index_path, len(manifest.get("chunks", {}))):
+                        vectorstore = load_vectorstore(
+                            index_path, self.create_embedding(), self.mmap_index
+                        )
+                        if self.mmap_index:
+                            self.log("Memory-mapped existing FAISS index from cache")
+                        else:
+                            self.log("Loaded existing FAISS index from cache")
+                    else:
+                        vectorstore = self._load_local(index_path)
+                        # 다음 로드부터 pickle 대신 열 단위 docstore를 사용하도록 변환
+                        save_vectorstore(index_path, vectorstore)
+                        self.log("Loaded existing FAISS index from cache")
+
+                    apply_search_params(
+                        vectorstore.index, self.index_nprobe, self.index_ef_search
+                    )
+                    self.index_report = manifest.get("index_report")
+                    self.metrics.increment(
+                        "bytes_read_total",
+                        sum(
+                            path.stat().st_size
+                            for path in Path(index_path).iterdir()
+                            if path.is_file()
+                        ),
+                        kind="index",
+                    )
+                    return vectorstore, manifest
+
+        except Exception as e:
+            self.log(f"Warning: Failed to load existing index: {e}")
+            self.log("Creating new index...")
+
+        return None, None
+
+    def _build_index(self, vectors, exclude=None):
+        """설정된 index_type으로 학습된 빈 FAISS 인덱스를 생성합니다.
+
+        exclude 위치의 벡터(recall 측정용 질의)는 학습에 사용하지 않습니다.
+        """
+        try:
+            index = build_index(
+                vectors,
+                self.index_type,
+                nlist=self.index_nlist,
+                pq_m=self.index_pq_m,
+                hnsw_m=self.index_hnsw_m,
+                train_size=self.index_train_size,
+                exclude=exclude,
+            )
+        except RuntimeError as e:
+            # PQ 학습에 필요한 벡터 수가 부족한 경우 등
+            self.log(f"Warning: Failed to build {self.index_type} index: {e}")
+            self.log("Falling back to flat index")
+            index = faiss.IndexFlatL2(vectors.shape[1])
+        apply_search_params(index, self.index_nprobe, self.index_ef_search)
+        return index
+
+    def _add_to_vectorstore(self, vectorstore, docs, ids, embedding, index_type=None):
+        """청크를 vectorstore에 추가합니다. vectorstore가 없으면 새로 생성합니다.
+
+        새로 생성할 때는 index_type(기본값 self.index_type) 인덱스를 사용합니다.
+        "index" 단계 시간에는 새 청크의 임베딩("embed" 단계) 시간이 포함됩니다.
+        """
+        with self.metrics.stage("index"):
+            vectorstore = self._index_documents(
+                vectorstore, docs, ids, embedding, index_type or self.index_type
+            )
+        self.metrics.increment("chunks_indexed_total", len(docs))
+        return vectorstore
+
+    def _faiss_from_vectors(self, index, docs, ids, vectors, embedding):
+        """임베딩된 청크로 vectorstore를 생성합니다.
+
+        ChunkSet은 그대로 ChunkDocstore로 사용하여 청크마다 Document를 만들지 않습니다.
+        """
+        if isinstance(docs, ChunkSet):
+            index.add(vectors)
+            return FAISS(
+                embedding_function=embedding,
+                index=index,
+                docstore=ChunkDocstore(docs, ids),
+                index_to_docstore_id=dict(enumerate(ids)),
+            )
+        vectorstore = FAISS(
+            embedding_function=embedding,
+            index=index,
+            docstore=InMemoryDocstore(),
+            index_to_docstore_id={},
+        )
+        vectorstore.add_embeddings(
+            zip(chunk_texts(docs), vectors),
+            metadatas=[doc.metadata for doc in docs],
+            ids=ids,
+        )
+        return vectorstore
+
+    def _index_documents(self, vectorstore, docs, ids, embedding, index_type):
+        if vectorstore is not None:
+            vectorstore = self._writable(vectorstore)
+            vectorstore.add_documents(list(docs), ids=ids)
+            return vectorstore
+
+        vectors = np.asarray(
+            embedding.embed_documents(chunk_texts(docs)), dtype=np.float32
+        )
+        if index_type == "flat":
+            return self._faiss_from_vectors(
+                faiss.IndexFlatL2(vectors.shape[1]), docs, ids, vectors, embedding
+            )
+
+        # 근사 인덱스는 임베딩으로 먼저 학습한 뒤 같은 임베딩을 추가합니다.
+        queries = self._eval_queries(len(vectors))
+        vectorstore = self._faiss_from_vectors(
+            self._build_index(vectors, queries), docs, ids, vectors, embedding
+        )
+        self._report_index(vectorstore.index, vectors, queries)
+        return vectorstore
+
+    def _eval_queries(self, num_vectors):
+        """recall 측정에 사용할 질의 벡터 위치를 반환합니다. (측정하지 않으면 None)"""
+        if not self.index_eval_queries or num_vectors < 2:
+            return None
+        return sample_queries(num_vectors, self.index_eval_queries)
+
+    def _report_index(self, index, vectors, queries):
+        """생성된 인덱스 종류와 flat 대비 recall, 검색 지연시간을 index_report에 기록합니다."""
+        self.index_report = {"type": index_type_of(index)}
+        if queries is None:
+            self.log(f"Built {self.index_report['type']} index")
+            return
+        self.index_report.update(measure_recall(index, vectors, queries, k=self.k))
+        self.log(
+            f"Built {self.index_report['type']} index: "
+            f"recall@{self.index_report['k']}={self.index_report['recall']:.3f}, "
+            f"{self.index_report['latency_ms']:.3f} ms/query "
+            f"(flat: {self.index_report['flat_latency_ms']:.3f} ms/query)"
+        )
+
+    def _train_vectorstore(self, vectorstore):
+        """flat 인덱스에 모인 벡터로 index_type 인덱스를 학습하고 벡터를 옮깁니다.
+
+        벡터는 같은 순서로 추가되므로 docstore와 index_to_docstore_id는 그대로입니다.
+        """
+        with self.metrics.stage("index"):
+            vectors = vectorstore.index.reconstruct_n(0, vectorstore.index.ntotal)
+            queries = self._eval_queries(len(vectors))
+            index = self._build_index(vectors, queries)
+            index.add(vectors)
+            vectorstore.index = index
+        self._report_index(index, vectors, queries)
+        return vectorstore
+
+    def _delete_chunks(self, vectorstore, ids):
+        """청크를 삭제합니다. 벡터 삭제를 지원하지 않는 인덱스(HNSW)는 재구성합니다."""
+        vectorstore = self._writable(vectorstore)
+        try:
+            vectorstore.delete(ids)
+            return vectorstore
+        except RuntimeError:
+            pass
+
+        stale_ids = set(ids)
+        keep = [
+            (position, chunk_id)
+            for position, chunk_id in sorted(vectorstore.index_to_docstore_id.items())
+            if chunk_id not in stale_ids
+        ]
+        vectors = vectorstore.index.reconstruct_n(0, vectorstore.index.ntotal)
+        vectors = vectors[[position for position, _ in keep]]
+        index = self._build_index(vectors)
+        index.add(vectors)
+
+        vectorstore.index = index
+        vectorstore.index_to_docstore_id = {
+            position: chunk_id for position, (_, chunk_id) in enumerate(keep)
+        }
+        vectorstore.docstore.delete(list(stale_ids))
+        return vectorstore
+
+    def _sync_vectorstore(self, vectorstore, ids, docs, manifest):
+        """변경된 청크만 추가/삭제하여 인덱스를 최신 상태로 맞춥니다.
+
+        (vectorstore, 변경 여부)를 반환합니다. 읽기 전용(mmap) vectorstore는
+        변경이 필요할 때만 수정 가능한 vectorstore로 다시 로드합니다.
+        """
+        indexed_ids = self._indexed_ids(vectorstore, manifest)
+        positions = {chunk_id: position for position, chunk_id in enumerate(ids)}
+
+        stale_ids = [chunk_id for chunk_id in indexed_ids if chunk_id not in positions]
+        new_ids = [chunk_id for chunk_id in ids if chunk_id not in indexed_ids]
+
+        if stale_ids:
+            vectorstore = self._delete_chunks(vectorstore, stale_ids)
+        if new_ids:
+            vectorstore = self._add_to_vectorstore(
+                vectorstore,
+                select_chunks(docs, [positions[chunk_id] for chunk_id in new_ids]),
+                new_ids,
+                self.create_embedding(),
+            )
+
+        if stale_ids or new_ids:
+            self.log(
+                f"Updated FAISS index: {len(new_ids)} chunks added, "
+                f"{len(stale_ids)} chunks removed"
+            )
+        return vectorstore, bool(stale_ids or new_ids)
+
+    def _save_vectorstore(self, vectorstore, entries, index_path, manifest_file):
+        """인덱스와 청크 manifest를 저장합니다."""
+        with self.metrics.stage("save"):
+            self._write_vectorstore(vectorstore, entries, index_path, manifest_file)
+
+    def _write_vectorstore(self, vectorstore, entries, index_path, manifest_file):
+        try:
+            # 다른 프로세스가 mmap 중인 파일을 덮어쓰지 않도록 임시 디렉토리에 저장한 뒤
+            # rename으로 교체합니다.
+            save_vectorstore(index_path, vectorstore)
+            manifest_file.write_text(
+                json.dumps(
+                    self._chunk_manifest(entries, vectorstore), ensure_ascii=False
+                )
+            )
+            self.log("FAISS index saved to cache")
+        except Exception as e:
+            self.log(f"Warning: Failed to save index to cache: {e}")
+            self.log("Index will not be cached for next use")
 
     def create_vectorstore(self, split_docs):
         try:
             # 인덱스 디렉토리 생성
             self.index_dir.mkdir(parents=True, exist_ok=True)
 
-            # 문서 내용 기반 해시 계산
-            doc_contents = "\n".join([doc.page_content for doc in split_docs])
-            doc_hash = hashlib.md5(doc_contents.encode()).hexdigest()
+            # 청크 단위 content hash 계산 (동일한 청크는 하나로 취급)
+            ids, docs = self._unique_chunks(split_docs)
 
-            # 해시 파일 경로와 인덱스 파일 경로
-            hash_file = self.index_dir / "doc_hash.txt"
+            # manifest 파일 경로와 인덱스 파일 경로
+            manifest_file = self.index_dir / "manifest.json"
             index_path = str(self.index_dir / "faiss_index")
+            entries = {
+                chunk_id: self._chunk_entry(doc) for chunk_id, doc in zip(ids, docs)
+            }
 
-            # 기존 인덱스가 있고 문서가 변경되지 않았는지 확인
-            try:
-                if (
-                    hash_file.exists()
-                    and Path(index_path + ".faiss").exists()
-                    and hash_file.read_text().strip() == doc_hash
-                ):
-
-                    # 기존 인덱스 로드 시도
-                    vectorstore = FAISS.load_local(
-                        index_path,
-                        self.create_embedding(),
-                        allow_dangerous_deserialization=True,
+            # 기존 인덱스가 있으면 변경된 청크만 반영
+            vectorstore, manifest = self._load_cached_vectorstore(
+                index_path, manifest_file
+            )
+            if vectorstore is not None:
+                vectorstore, updated = self._sync_vectorstore(
+                    vectorstore, ids, docs, manifest
+                )
+                if updated:
+                    self._save_vectorstore(
+                        vectorstore, entries, index_path, manifest_file
                     )
-                    print("Loaded existing FAISS index from cache")
-                    return vectorstore
-
-            except Exception as e:
-                print(f"Warning: Failed to load existing index: {e}")
-                print("Creating new index...")
+                elif manifest.get("sources") != self.source_state:
+                    # 인덱스 내용은 같고 소스 상태만 바뀐 경우 (예: 파일 수정 시각)
+                    manifest["sources"] = self.source_state
+                    manifest_file.write_text(json.dumps(manifest, ensure_ascii=False))
+                return vectorstore
 
             # 새로운 인덱스 생성
-            vectorstore = FAISS.from_documents(
-                documents=split_docs, embedding=self.create_embedding()
+            vectorstore = self._add_to_vectorstore(
+                None, docs, ids, self.create_embedding()
             )
 
-            # 인덱스와 해시 저장 시도
-            try:
-                vectorstore.save_local(index_path)
-                hash_file.write_text(doc_hash)
-                print("FAISS index saved to cache")
-            except Exception as e:
-                print(f"Warning: Failed to save index to cache: {e}")
-                print("Index will not be cached for next use")
+            # 인덱스와 manifest 저장 시도
+            self._save_vectorstore(vectorstore, entries, index_path, manifest_file)
 
             return vectorstore
 
         except Exception as e:
-            print(f"Error: Failed to create vectorstore with caching: {e}")
-            print("Falling back to basic FAISS creation without caching")
+            self.log(f"Error: Failed to create vectorstore with caching: {e}")
+            self.log("Falling back to basic FAISS creation without caching")
             return FAISS.from_documents(
                 documents=split_docs, embedding=self.create_embedding()
             )
 
+    def iter_deduplicated_chunks(self, chunks):
+        """청크 스트림에서 먼저 나온 청크와 같거나 거의 같은 청크를 제거합니다.
+
+        batch_size 단위로 MinHash 서명을 계산하며, 대표 청크의 서명만 보관하므로
+        청크 텍스트를 모아 두지 않습니다. 이미 인덱싱된 대표 청크는 수정하지
+        않으므로 metadata["sources"]는 기록하지 않습니다.
+        """
+        deduplicator = ChunkDeduplicator(threshold=self.dedup_threshold)
+        num_removed = 0
+        chunks = iter(chunks)
+        while batch := list(islice(chunks, self.batch_size)):
+            with self.metrics.stage("dedup"):
+                num_groups = deduplicator.num_groups
+                groups = deduplicator.assign(doc.page_content for doc in batch)
+            for doc, group in zip(batch, groups):
+                if group == num_groups:
+                    num_groups += 1
+                    yield doc
+                else:
+                    num_removed += 1
+                    self.metrics.increment("chunks_deduplicated_total")
+        if num_removed:
+            self.log(f"Collapsed {num_removed} duplicate chunks")
+
+    def iter_index_batches(self, chunks):
+        """청크 스트림을 batch_size 단위로 임베딩하여 인덱스에 추가합니다.
+
+        배치가 인덱스에 반영될 때마다 (vectorstore, 누적 청크 수)를 생성하므로
+        전체 코퍼스 처리가 끝나기 전에도 self.vectorstore로 검색할 수 있습니다.
+        캐시된 인덱스가 있으면 새 청크만 임베딩하고, 스트림이 끝나면
+        더 이상 존재하지 않는 청크를 삭제한 뒤 인덱스를 저장합니다.
+
+        근사 인덱스(index_type != "flat")를 새로 만들 때는 처음 index_train_size개
+        청크를 flat 인덱스에 추가하며(바로 검색 가능), 그 벡터로 학습한 뒤 나머지
+        배치를 학습된 인덱스에 바로 추가합니다. 따라서 메모리에 더 보관하는 것은
+        최대 index_train_size개 벡터이며, 학습 샘플은 스트림 앞부분의 청크입니다.
+        (주제별로 정렬된 코퍼스라면 index_train_size를 늘리거나 순서를 섞으세요.)
+        """
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        manifest_file = self.index_dir / "manifest.json"
+        index_path = str(self.index_dir / "faiss_index")
+
+        vectorstore, manifest = self._load_cached_vectorstore(index_path, manifest_file)
+        indexed_ids = (
+            set() if vectorstore is None else self._indexed_ids(vectorstore, manifest)
+        )
+        if vectorstore is not None:
+            self.vectorstore = vectorstore
+
+        # 학습 샘플이 모일 때까지 flat 인덱스에 추가합니다.
+        training = vectorstore is None and self.index_type != "flat"
+        if self.deduplicate:
+            chunks = self.iter_deduplicated_chunks(chunks)
+
+        embedding = self.create_embedding()
+        entries = {}
+        num_added = 0
+        chunks = iter(chunks)
+        while batch := list(islice(chunks, self.batch_size)):
+            new_docs = []
+            new_ids = []
+            for doc in batch:
+                chunk_id = self._chunk_id(doc)
+                if chunk_id in entries:
+                    continue
+                entries[chunk_id] = self._chunk_entry(doc)
+                if chunk_id not in indexed_ids:
+                    new_docs.append(doc)
+                    new_ids.append(chunk_id)
+
+            if new_docs:
+                vectorstore = self._add_to_vectorstore(
+                    vectorstore,
+                    new_docs,
+                    new_ids,
+                    embedding,
+                    "flat" if training else None,
+                )
+                num_added += len(new_docs)
+                if training and vectorstore.index.ntotal >= self.index_train_size:
+                    vectorstore = self._train_vectorstore(vectorstore)
+                    training = False
+                self.vectorstore = vectorstore
+
+            if vectorstore is not None:
+                yield vectorstore, len(entries)
+
+        if vectorstore is None:
+            raise ValueError("No chunks were produced from the provided source URIs")
+        if training:
+            # 청크 수가 index_train_size보다 적은 경우
+            vectorstore = self._train_vectorstore(vectorstore)
+            self.vectorstore = vectorstore
+            yield vectorstore, len(entries)
+
+        stale_ids = [chunk_id for chunk_id in indexed_ids if chunk_id not in entries]
+        if stale_ids:
+            vectorstore = self._delete_chunks(vectorstore, stale_ids)
+            self.vectorstore = vectorstore
+
+        if num_added or stale_ids:
+            self.log(
+                f"Updated FAISS index: {num_added} chunks added, "
+                f"{len(stale_ids)} chunks removed"
+            )
+            self._save_vectorstore(vectorstore, entries, index_path, manifest_file)
+
+    def create_vectorstore_streaming(self, chunks):
+        """청크 스트림을 배치 단위로 인덱싱하고 완성된 vectorstore를 반환합니다."""
+        vectorstore = None
+        num_chunks = 0
+        for vectorstore, num_chunks in self.iter_index_batches(chunks):
+            pass
+        self.log(f"Indexed {num_chunks} chunks in streaming mode")
+        return vectorstore
+
+    def _splitter_config(self, text_splitter):
+        """청크 결과에 영향을 주는 text splitter 설정을 반환합니다."""
+        return {
+            "type": type(text_splitter).__name__,
+            "chunk_size": getattr(text_splitter, "_chunk_size", None),
+            "chunk_overlap": getattr(text_splitter, "_chunk_overlap", None),
+            "dedup": self.dedup_threshold if self.deduplicate else False,
+        }
+
+    def _source_hash(self, source_uri):
+        """소스 파일 내용의 SHA-256 해시를 계산합니다."""
+        file_hash = hashlib.sha256()
+        with open(source_uri, "rb") as f:
+            while block := f.read(1 << 20):
+                file_hash.update(block)
+        return file_hash.hexdigest()
+
+    def _fingerprint_sources(self, source_uris, known=None):
+        """소스 파일별 {size, mtime_ns, sha256}을 반환합니다.
+
+        known(이전 실행의 기록)과 크기, 수정 시각이 같은 파일은 내용을 다시 읽지 않고
+        기록된 해시를 사용합니다.
+        """
+        known = known or {}
+        files = {}
+        for source_uri in source_uris:
+            stat = os.stat(source_uri)
+            entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+            previous = known.get(source_uri) or {}
+            if all(previous.get(key) == value for key, value in entry.items()):
+                entry["sha256"] = previous["sha256"]
+            else:
+                entry["sha256"] = self._source_hash(source_uri)
+            files[source_uri] = entry
+        return files
+
+    def _sources_match(self, previous, current):
+        """파일 내용 해시와 분할 설정이 같은지 확인합니다. (수정 시각은 무시)"""
+        if not previous or not current or previous["splitter"] != current["splitter"]:
+            return False
+        hashes = {path: entry["sha256"] for path, entry in current["files"].items()}
+        return hashes == {
+            path: entry.get("sha256") for path, entry in previous["files"].items()
+        }
+
+    def _load_warm_start(self, text_splitter):
+        """소스가 바뀌지 않았으면 문서 로드와 분할 없이 캐시된 인덱스를 반환합니다.
+
+        소스 상태는 self.source_state에 기록되어 새 인덱스의 manifest에 저장됩니다.
+        """
+        source_uris = (
+            [self.source_uri] if isinstance(self.source_uri, str) else self.source_uri
+        )
+        manifest_file = self.index_dir / "manifest.json"
+        try:
+            manifest = json.loads(manifest_file.read_text())
+        except Exception:
+            manifest = {}
+        previous = manifest.get("sources")
+
+        try:
+            self.source_state = {
+                "files": self._fingerprint_sources(
+                    source_uris, (previous or {}).get("files")
+                ),
+                "splitter": self._splitter_config(text_splitter),
+            }
+        except OSError:
+            # 없는 파일 등은 일반 로딩 경로에서 보고합니다.
+            self.source_state = None
+            return None
+
+        if not self._sources_match(previous, self.source_state):
+            return None
+        vectorstore, manifest = self._load_cached_vectorstore(
+            str(self.index_dir / "faiss_index"), manifest_file
+        )
+        if vectorstore is None:
+            return None
+        self.log("Sources unchanged, skipped document loading")
+        if previous != self.source_state:
+            manifest["sources"] = self.source_state
+            manifest_file.write_text(json.dumps(manifest, ensure_ascii=False))
+        return vectorstore
+
+    def _shard_key(self, file_hash, text_splitter):
+        """파일 내용, 분할 설정, 임베딩 모델로 shard 디렉토리 이름을 만듭니다."""
+        payload = json.dumps(
+            {
+                "source": file_hash,
+                "splitter": self._splitter_config(text_splitter),
+                "embeddings": self.embeddings,
+            },
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+    def _load_shard(self, shard_path, source_uri, embedding):
+        """저장된 shard를 로드하고 문서 출처를 현재 경로로 맞춥니다."""
+        with self.metrics.stage("load_from_cache"):
+            if has_docstore(shard_path):
+                vectorstore = load_vectorstore(shard_path, embedding, self.mmap_index)
+            else:
+                vectorstore = FAISS.load_local(
+                    str(shard_path), embedding, allow_dangerous_deserialization=True
+                )
+        # 같은 내용의 파일이 다른 경로에서 사용될 수 있습니다.
+        docstore = vectorstore.docstore
+        if isinstance(docstore, (ChunkDocstore, ColumnarDocstore)):
+            metadatas = docstore.metadatas()
+        else:
+            metadatas = (doc.metadata for doc in docstore._dict.values())
+        for metadata in metadatas:
+            for key in ("source", "file_path"):
+                if key in metadata:
+                    metadata[key] = source_uri
+            # 중복 제거로 합쳐진 청크의 출처 목록 (shard는 파일 하나로 만들어짐)
+            for ref in metadata.get("sources", ()):
+                ref["source"] = source_uri
+        return vectorstore
+
+    def _build_shard(self, shard_path, source_uri, text_splitter, embedding):
+        """소스 파일 하나를 로드, 분할, 임베딩하여 shard로 저장합니다."""
+        with self.metrics.stage("load"):
+            docs = self.load_documents([source_uri])
+        with self.metrics.stage("split"):
+            split_docs = self.split_documents(docs, text_splitter)
+        self.metrics.increment("chunks_split_total", len(split_docs))
+
+        ids, docs = self._unique_chunks(split_docs)
+        with self.metrics.stage("index"):
+            vectors = np.asarray(
+                embedding.embed_documents(chunk_texts(docs)), dtype=np.float32
+            )
+            vectorstore = self._faiss_from_vectors(
+                faiss.IndexFlatL2(vectors.shape[1]), docs, ids, vectors, embedding
+            )
+        self.metrics.increment("chunks_indexed_total", len(ids))
+
+        # 임시 디렉토리에 저장한 뒤 rename하여 다른 프로세스가 미완성 shard를 보지 않게 함
+        try:
+            tmp_path = shard_path.with_name(f"{shard_path.name}.tmp-{os.getpid()}")
+            write_vectorstore(tmp_path, vectorstore)
+            (tmp_path / "shard.json").write_text(
+                json.dumps(
+                    {
+                        "source": source_uri,
+                        "embeddings": self.embeddings,
+                        "splitter": self._splitter_config(text_splitter),
+                        "num_chunks": len(ids),
+                    },
+                    ensure_ascii=False,
+                )
+            )
+            try:
+                os.rename(tmp_path, shard_path)
+            except OSError:
+                # 다른 프로세스가 같은 shard를 먼저 저장한 경우
+                shutil.rmtree(tmp_path, ignore_errors=True)
+            # 저장된 shard를 사용하여 다른 shard와 같은 형식으로 합칩니다.
+            return load_vectorstore(shard_path, embedding, self.mmap_index)
+        except Exception as e:
+            self.log(f"Warning: Failed to save index shard for {source_uri}: {e}")
+        return vectorstore
+
+    def _merge_shards(self, shards, embedding):
+        """shard들을 하나의 vectorstore로 합칩니다.
+
+        mmap_index이면 합친 flat 인덱스를 shard 목록별 디렉토리에 저장한 뒤 mmap으로
+        다시 읽습니다. 합친 인덱스는 메모리 복사본이므로, 그대로 사용하면 워커
+        프로세스마다 인덱스 전체를 따로 갖게 됩니다.
+        """
+        vectorstores = [vectorstore for vectorstore, _ in shards.values()]
+        if not self.mmap_index or len(shards) == 1 or self.index_type != "flat":
+            return merge_vectorstores(vectorstores)
+
+        # 같은 내용의 파일이 다른 경로에서 사용될 수 있으므로 경로도 키에 포함합니다.
+        payload = json.dumps(
+            [[shard_key, source_uri] for shard_key, (_, source_uri) in shards.items()]
+        )
+        merged_key = hashlib.sha256(payload.encode()).hexdigest()[:32]
+        merged_path = self.shard_dir / "merged" / merged_key
+        if not (has_docstore(merged_path) and (merged_path / "index.faiss").exists()):
+            vectorstore = merge_vectorstores(vectorstores)
+            try:
+                tmp_path = merged_path.with_name(f"{merged_key}.tmp-{os.getpid()}")
+                write_vectorstore(tmp_path, vectorstore)
+                try:
+                    os.rename(tmp_path, merged_path)
+                except OSError:
+                    # 다른 프로세스가 같은 인덱스를 먼저 저장한 경우
+                    shutil.rmtree(tmp_path, ignore_errors=True)
+            except Exception as e:
+                self.log(f"Warning: Failed to save merged index shards: {e}")
+                return vectorstore
+        return load_vectorstore(merged_path, embedding, mmap_index=True)
+
+    def create_sharded_vectorstore(self, source_uris):
+        """소스 파일별 shard를 로드(없으면 생성)하고 하나의 vectorstore로 합칩니다.
+
+        shard는 파일 내용 해시와 분할/임베딩 설정으로 식별되므로, 파일 하나가
+        추가되거나 바뀌면 그 파일의 shard만 새로 만들고 나머지는 그대로 재사용합니다.
+        근사 인덱스(index_type != "flat")는 합친 문서로 파일 묶음별 인덱스를
+        생성합니다. (임베딩은 캐시에서 읽습니다.)
+        """
+        if isinstance(source_uris, str):
+            source_uris = [source_uris]
+        self.shard_dir.mkdir(parents=True, exist_ok=True)
+        text_splitter = self.create_text_splitter()
+        embedding = self.create_embedding()
+
+        # 크기와 수정 시각이 같은 파일은 다시 해시하지 않도록 기록을 공유합니다.
+        hashes_file = self.shard_dir / "sources.json"
+        try:
+            known = json.loads(hashes_file.read_text())
+        except Exception:
+            known = {}
+
+        shards = {}
+        num_built = 0
+        for source_uri in source_uris:
+            try:
+                fingerprint = self._fingerprint_sources([source_uri], known)
+                known.update(fingerprint)
+                file_hash = fingerprint[source_uri]["sha256"]
+                shard_key = self._shard_key(file_hash, text_splitter)
+                if shard_key in shards:
+                    continue
+                shard_path = self.shard_dir / shard_key
+                if (shard_path / "shard.json").exists():
+                    vectorstore = self._load_shard(shard_path, source_uri, embedding)
+                    shards[shard_key] = (vectorstore, source_uri)
+                    self.metrics.increment("cache_hits_total", cache="shard")
+                    continue
+                self.metrics.increment("cache_misses_total", cache="shard")
+                vectorstore = self._build_shard(
+                    shard_path, source_uri, text_splitter, embedding
+                )
+                shards[shard_key] = (vectorstore, source_uri)
+                num_built += 1
+            except Exception as e:
+                self.log(f"Error indexing {source_uri}: {e}")
+
+        try:
+            tmp_file = hashes_file.with_name(f"sources.json.tmp-{os.getpid()}")
+            tmp_file.write_text(json.dumps(known, ensure_ascii=False))
+            os.replace(tmp_file, hashes_file)
+        except Exception as e:
+            self.log(f"Warning: Failed to save source hashes: {e}")
+
+        if not shards:
+            raise ValueError("No chunks were produced from the provided source URIs")
+        self.log(
+            f"Merged {len(shards)} index shards "
+            f"({len(shards) - num_built} from cache, {num_built} built)"
+        )
+
+        vectorstore = self._merge_shards(shards, embedding)
+
+        if self.index_type != "flat":
+            docstore = vectorstore.docstore
+            if isinstance(docstore, ChunkDocstore) and len(docstore) == len(
+                docstore.chunks
+            ):
+                # ChunkDocstore는 FAISS 위치 순서로 청크를 저장합니다.
+                docs = docstore.chunks
+            else:
+                docs = [
+                    docstore.search(chunk_id)
+                    for chunk_id in vectorstore.index_to_docstore_id.values()
+                ]
+            return self.create_vectorstore(docs)
+        return vectorstore
+
     def create_retriever(self, vectorstore):
         # Cosine Similarity 사용하여 검색을 수행하는 retriever를 생성합니다.
-        dense_retriever = vectorstore.as_retriever(
-            search_type="similarity", search_kwargs={"k": self.k}
+        # (search_many/multi_query로 여러 질의를 한 번에 검색할 수 있습니다.)
+        search_kwargs = {"k": self.k}
+        if self.search_type == "mmr":
+            search_kwargs["fetch_k"] = max(self.fetch_k, self.k)
+            search_kwargs["lambda_mult"] = self.lambda_mult
+        elif self.search_type == "similarity_score_threshold":
+            search_kwargs["score_threshold"] = self.score_threshold
+            search_kwargs["min_k"] = self.min_k
+        dense_retriever = BatchRetriever(
+            vectorstore=vectorstore,
+            search_type=self.search_type,
+            search_kwargs=search_kwargs,
+            tags=vectorstore._get_retriever_tags(),
         )
         return dense_retriever
 
@@ -133,14 +1004,38 @@ class RetrievalChain(ABC):
     def create_prompt(self):
         return hub.pull(self.prompt)
 
-    def create_chain(self):
-        docs = self.load_documents(self.source_uri)
+    def create_index(self):
+        """문서를 로드하고 인덱싱하여 vectorstore와 retriever만 생성합니다."""
         text_splitter = self.create_text_splitter()
-        split_docs = self.split_documents(docs, text_splitter)
-        self.vectorstore = self.create_vectorstore(split_docs)
+        if self.shard_index and not self.streaming:
+            with self.metrics.stage("vectorstore"):
+                self.vectorstore = self.create_sharded_vectorstore(self.source_uri)
+        elif self.streaming:
+            # load → split → embed → index를 배치 단위 스트림으로 처리
+            # (load와 split이 섞여 실행되므로 embed, index 단계만 따로 기록됩니다.)
+            self.source_state = None
+            with self.metrics.stage("streaming"):
+                docs = self.lazy_load_documents(self.source_uri)
+                split_docs = self.iter_split_documents(docs, text_splitter)
+                self.vectorstore = self.create_vectorstore_streaming(split_docs)
+        elif (vectorstore := self._load_warm_start(text_splitter)) is not None:
+            self.vectorstore = vectorstore
+        else:
+            with self.metrics.stage("load"):
+                docs = self.load_documents(self.source_uri)
+            with self.metrics.stage("split"):
+                split_docs = self.split_documents(docs, text_splitter)
+            self.metrics.increment("chunks_split_total", len(split_docs))
+            with self.metrics.stage("vectorstore"):
+                self.vectorstore = self.create_vectorstore(split_docs)
         self.retriever = self.create_retriever(self.vectorstore)
-        model = self.create_model()
-        prompt = self.create_prompt()
+        return self
+
+    def create_chain(self):
+        with self.metrics.stage("create_chain"):
+            self.create_index()
+            model = self.create_model()
+            prompt = self.create_prompt()
         self.chain = (
             {"question": itemgetter("question"), "context": itemgetter("context")}
             | prompt
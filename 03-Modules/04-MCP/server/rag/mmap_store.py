@@ -0,0 +1,325 @@
+from langchain_community.docstore.base import Docstore
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Iterator, List, Optional, Union
+import copy
+import json
+import mmap
+import os
+import faiss
+import numpy as np
+
+
+# 열 단위(columnar) docstore 파일. pickle을 사용하지 않으며 배열은 .npy 형식입니다.
+DOCSTORE_TEXT = "docstore.txt"  # 청크 텍스트를 이어 붙인 UTF-8 버퍼
+DOCSTORE_OFFSETS = "docstore.offsets.npy"  # 텍스트 경계 바이트 오프셋 (문서 수 + 1)
+DOCSTORE_IDS = "docstore.ids.npy"  # 문서 ID (고정 길이 bytes)
+DOCSTORE_METADATA_IDS = "docstore.metadata_ids.npy"  # metadata 테이블 번호
+DOCSTORE_START_INDEX = "docstore.start_index.npy"  # start_index (-1이면 없음)
+DOCSTORE_META = "docstore.json"  # 형식 버전, 문서 수, 중복을 제거한 metadata 테이블
+DOCSTORE_FILES = (
+    "index.faiss",
+    DOCSTORE_TEXT,
+    DOCSTORE_OFFSETS,
+    DOCSTORE_IDS,
+    DOCSTORE_METADATA_IDS,
+    DOCSTORE_START_INDEX,
+)
+DOCSTORE_VERSION = 1
+
+# 이전 형식 파일 (pickle docstore, JSON 레코드 mmap docstore)
+LEGACY_FILES = ("index.pkl", "docstore.bin", "docstore.idx")
+
+# 인덱스 파일을 읽기 전용으로 mmap 합니다. (flat 코드까지 zero-copy 지원 시 사용)
+MMAP_READ_FLAGS = (
+    getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+)
+
+
+def write_docstore(path, vectorstore: FAISS) -> None:
+    """vectorstore의 문서를 FAISS 위치 순서대로 열 단위 형식으로 저장합니다.
+
+    텍스트는 하나의 버퍼와 오프셋 배열에, metadata는 start_index를 제외하고
+    중복을 제거한 테이블과 문서별 테이블 번호로 저장합니다. (같은 페이지의
+    청크는 같은 metadata를 공유)
+    """
+    path = Path(path)
+    num_docs = vectorstore.index.ntotal
+    offsets = np.zeros(num_docs + 1, dtype=np.uint64)
+    metadata_ids = np.zeros(num_docs, dtype=np.uint32)
+    start_index = np.full(num_docs, -1, dtype=np.int64)
+    ids = []
+    metadatas = []
+    metadata_table = {}
+
+    with open(path / DOCSTORE_TEXT, "wb") as f:
+        for position in range(num_docs):
+            doc_id = vectorstore.index_to_docstore_id[position]
+            doc = vectorstore.docstore.search(doc_id)
+            text = doc.page_content.encode("utf-8")
+            f.write(text)
+            offsets[position + 1] = offsets[position] + len(text)
+
+            metadata = dict(doc.metadata)
+            if "start_index" in metadata:
+                start_index[position] = metadata.pop("start_index")
+            key = json.dumps(metadata, sort_keys=True, ensure_ascii=False, default=str)
+            if key not in metadata_table:
+                metadata_table[key] = len(metadatas)
+                metadatas.append(json.loads(key))
+            metadata_ids[position] = metadata_table[key]
+            ids.append(str(doc.id if doc.id is not None else doc_id))
+
+    np.save(path / DOCSTORE_OFFSETS, offsets)
+    np.save(
+        path / DOCSTORE_IDS,
+        np.array([doc_id.encode("utf-8") for doc_id in ids], dtype=np.bytes_),
+    )
+    np.save(path / DOCSTORE_METADATA_IDS, metadata_ids)
+    np.save(path / DOCSTORE_START_INDEX, start_index)
+    (path / DOCSTORE_META).write_text(
+        json.dumps(
+            {
+                "version": DOCSTORE_VERSION,
+                "num_docs": num_docs,
+                "metadatas": metadatas,
+            },
+            ensure_ascii=False,
+        )
+    )
+
+
+def write_vectorstore(path, vectorstore: FAISS) -> None:
+    """FAISS 인덱스와 docstore를 path 디렉토리에 저장합니다."""
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    faiss.write_index(vectorstore.index, str(path / "index.faiss"))
+    write_docstore(path, vectorstore)
+
+
+def save_vectorstore(index_path, vectorstore: FAISS) -> None:
+    """임시 디렉토리에 저장한 뒤 파일별로 rename하여 교체합니다.
+
+    다른 프로세스가 mmap 중인 파일을 덮어쓰지 않으며, docstore.json은 마지막에
+    교체합니다. 이전 형식의 pickle 파일은 삭제합니다.
+    """
+    index_path = Path(index_path)
+    tmp_path = index_path.with_name(f"{index_path.name}.tmp-{os.getpid()}")
+    write_vectorstore(tmp_path, vectorstore)
+    index_path.mkdir(parents=True, exist_ok=True)
+    for name in DOCSTORE_FILES + (DOCSTORE_META,):
+        os.replace(tmp_path / name, index_path / name)
+    tmp_path.rmdir()
+    for name in LEGACY_FILES:
+        (index_path / name).unlink(missing_ok=True)
+
+
+def has_docstore(index_path, num_docs: Optional[int] = None) -> bool:
+    """열 단위 docstore가 있고 (num_docs를 지정하면) 문서 수가 일치하는지 확인합니다."""
+    index_path = Path(index_path)
+    try:
+        meta = json.loads((index_path / DOCSTORE_META).read_text())
+    except (OSError, ValueError):
+        return False
+    if meta.get("version") != DOCSTORE_VERSION:
+        return False
+    if num_docs is not None and meta.get("num_docs") != num_docs:
+        return False
+    return all((index_path / name).exists() for name in DOCSTORE_FILES)
+
+
+class ColumnarDocstore(Docstore):
+    """열 단위로 저장된 문서를 요청된 것만 Document로 만드는 읽기 전용 Docstore입니다.
+
+    텍스트 버퍼와 배열은 mmap으로 열기 때문에 로드할 때 문서를 메모리에 올리지
+    않으며, 여러 프로세스가 같은 파일의 페이지 캐시를 공유합니다. 문서는 FAISS
+    위치(position)로 조회하고, 문서 ID(str)로도 조회할 수 있습니다.
+    """
+
+    def __init__(self, text, offsets, ids, metadata_ids, start_index, metadatas):
+        self._text = text
+        self._offsets = offsets
+        self._ids = ids
+        self._metadata_ids = metadata_ids
+        self._start_index = start_index
+        self._metadatas = metadatas
+        self._positions = None
+
+    @classmethod
+    def load(cls, index_path) -> "ColumnarDocstore":
+        index_path = Path(index_path)
+        meta = json.loads((index_path / DOCSTORE_META).read_text())
+        with open(index_path / DOCSTORE_TEXT, "rb") as f:
+            # 빈 파일은 mmap 할 수 없습니다.
+            text = (
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                if os.fstat(f.fileno()).st_size
+                else b""
+            )
+
+        def column(name):
+            return np.load(index_path / name, mmap_mode="r", allow_pickle=False)
+
+        return cls(
+            text,
+            column(DOCSTORE_OFFSETS),
+            column(DOCSTORE_IDS),
+            column(DOCSTORE_METADATA_IDS),
+            column(DOCSTORE_START_INDEX),
+            meta["metadatas"],
+        )
+
+    @classmethod
+    def concat(cls, docstores: List["ColumnarDocstore"]) -> "ColumnarDocstore":
+        """여러 docstore를 순서대로 이어 붙인 docstore를 메모리에 생성합니다."""
+        text = b"".join(bytes(docstore._text) for docstore in docstores)
+        offsets, metadata_ids, metadatas = [np.zeros(1, dtype=np.uint64)], [], []
+        for docstore in docstores:
+            offsets.append(docstore._offsets[1:] + offsets[-1][-1])
+            metadata_ids.append(docstore._metadata_ids + np.uint32(len(metadatas)))
+            metadatas.extend(docstore._metadatas)
+        return cls(
+            text,
+            np.concatenate(offsets),
+            np.concatenate([docstore._ids for docstore in docstores]),
+            np.concatenate(metadata_ids),
+            np.concatenate([docstore._start_index for docstore in docstores]),
+            metadatas,
+        )
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def ids(self) -> List[str]:
+        """저장된 모든 문서 ID를 위치 순서대로 반환합니다."""
+        return [doc_id.decode("utf-8") for doc_id in self._ids.tolist()]
+
+    def metadatas(self) -> List[dict]:
+        """중복을 제거한 metadata 테이블을 반환합니다. (출처 경로 수정 등에 사용)"""
+        return self._metadatas
+
+    def document(self, position: int) -> Document:
+        start, end = int(self._offsets[position]), int(self._offsets[position + 1])
+        # 반환한 Document를 수정해도 metadata 테이블(중첩된 목록 포함)은 바뀌지 않습니다.
+        metadata = copy.deepcopy(self._metadatas[int(self._metadata_ids[position])])
+        if self._start_index[position] >= 0:
+            metadata["start_index"] = int(self._start_index[position])
+        return Document(
+            id=self._ids[position].decode("utf-8"),
+            page_content=bytes(self._text[start:end]).decode("utf-8"),
+            metadata=metadata,
+        )
+
+    def search(self, search: Union[int, str]) -> Union[Document, str]:
+        if isinstance(search, str):
+            if self._positions is None:
+                self._positions = {
+                    doc_id: position for position, doc_id in enumerate(self.ids())
+                }
+            position = self._positions.get(search)
+        else:
+            position = int(search)
+        if position is None or not 0 <= position < len(self):
+            return f"ID {search} not found."
+        return self.document(position)
+
+    def add(self, texts) -> None:
+        raise NotImplementedError("ColumnarDocstore is read-only")
+
+    def delete(self, ids: List) -> None:
+        raise NotImplementedError("ColumnarDocstore is read-only")
+
+
+class PositionMap(Mapping):
+    """FAISS 위치를 그대로 docstore 키로 사용하는 index_to_docstore_id 매핑입니다."""
+
+    def __init__(self, size: int):
+        self.size = size
+
+    def __getitem__(self, position) -> int:
+        position = int(position)
+        if not 0 <= position < self.size:
+            raise KeyError(position)
+        return position
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(range(self.size))
+
+    def __len__(self) -> int:
+        return self.size
+
+
+def load_vectorstore(index_path, embedding, mmap_index: bool = False) -> FAISS:
+    """저장된 인덱스와 docstore로 읽기 전용 FAISS vectorstore를 생성합니다.
+
+    docstore는 항상 mmap으로 열고, mmap_index가 True이면 인덱스 파일도 mmap합니다.
+    """
+    index_file = str(Path(index_path) / "index.faiss")
+    if mmap_index:
+        index = faiss.read_index(index_file, MMAP_READ_FLAGS)
+    else:
+        index = faiss.read_index(index_file)
+    docstore = ColumnarDocstore.load(index_path)
+    if len(docstore) != index.ntotal:
+        raise ValueError(
+            f"Docstore has {len(docstore)} documents, index has {index.ntotal}"
+        )
+    return FAISS(
+        embedding_function=embedding,
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=PositionMap(index.ntotal),
+    )
+
+
+def is_read_only(vectorstore: FAISS) -> bool:
+    return isinstance(vectorstore.docstore, ColumnarDocstore)
+
+
+def copy_index(index):
+    """벡터를 메모리에 복사하여 수정할 수 있는 인덱스를 만듭니다.
+
+    mmap으로 읽은 인덱스에 faiss.clone_index를 사용하면 복사본도 같은 파일을
+    가리키므로 add/remove_ids에서 프로세스가 종료됩니다. 대신 직렬화한 바이트열로
+    새 인덱스를 만듭니다.
+    """
+    return faiss.deserialize_index(faiss.serialize_index(index))
+
+
+def to_writable(vectorstore: FAISS) -> FAISS:
+    """읽기 전용 vectorstore를 문서를 추가/삭제할 수 있는 vectorstore로 복사합니다."""
+    if not is_read_only(vectorstore):
+        return vectorstore
+    docstore = vectorstore.docstore
+    ids = docstore.ids()
+    return FAISS(
+        embedding_function=vectorstore.embedding_function,
+        # mmap으로 읽은 인덱스는 수정할 수 없으므로 메모리로 복사합니다.
+        index=copy_index(vectorstore.index),
+        docstore=InMemoryDocstore(
+            {doc_id: docstore.document(position) for position, doc_id in enumerate(ids)}
+        ),
+        index_to_docstore_id=dict(enumerate(ids)),
+    )
+
+
+def merge_columnar(vectorstores: List[FAISS]) -> FAISS:
+    """ColumnarDocstore를 사용하는 vectorstore들을 첫 번째 vectorstore에 합칩니다.
+
+    merge_from은 합치는 인덱스를 비우므로, mmap으로 읽은 인덱스일 수 있는 모든
+    인덱스를 메모리로 복사하여 합칩니다. (vectorstores의 인덱스는 바뀌지 않음)
+    """
+    vectorstore = vectorstores[0]
+    docstores = [other.docstore for other in vectorstores]
+    ids = np.concatenate([docstore._ids for docstore in docstores])
+    if len(np.unique(ids)) != len(ids):
+        raise ValueError("Cannot merge vectorstores, ids are overlapping.")
+    vectorstore.index = copy_index(vectorstore.index)
+    for other in vectorstores[1:]:
+        vectorstore.index.merge_from(copy_index(other.index))
+    vectorstore.docstore = ColumnarDocstore.concat(docstores)
+    vectorstore.index_to_docstore_id = PositionMap(vectorstore.index.ntotal)
+    return vectorstore
@@ -0,0 +1,359 @@
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStoreRetriever
+from pydantic import model_validator
+from langchain.embeddings.cache import CacheBackedEmbeddings
+from .bm25 import document_key, reciprocal_rank_fusion
+from .index import make_direct_map
+from .metrics import MeteredEmbeddings
+
+from typing import Any, List, Optional, Sequence, Tuple
+import asyncio
+import operator
+import faiss
+import numpy as np
+
+
+def maximal_marginal_relevance(
+    query, candidates, k: int = 4, lambda_mult: float = 0.5
+) -> List[int]:
+    """MMR로 선택한 후보 번호를 선택 순서대로 반환합니다.
+
+    코사인 유사도 행렬을 한 번 계산하고, 선택할 때마다 후보별 '이미 선택된
+    청크와의 최대 유사도'만 갱신하므로 후보 100개에서 k개를 고르는 데
+    수 ms 이내가 걸립니다.
+    """
+    candidates = np.asarray(candidates, dtype=np.float32)
+    k = min(k, len(candidates))
+    if k <= 0:
+        return []
+    norms = np.linalg.norm(candidates, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    candidates = candidates / norms
+    query = np.asarray(query, dtype=np.float32)
+    query = query / (np.linalg.norm(query) or 1)
+
+    relevance = candidates @ query
+    similarity = candidates @ candidates.T
+    selected = [int(np.argmax(relevance))]
+    chosen = np.zeros(len(candidates), dtype=bool)
+    chosen[selected[0]] = True
+    max_similarity = similarity[selected[0]].copy()
+    while len(selected) < k:
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[chosen] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        chosen[best] = True
+        np.maximum(max_similarity, similarity[best], out=max_similarity)
+    return selected
+
+
+class BatchRetriever(VectorStoreRetriever):
+    """여러 질의를 한 번에 검색할 수 있는 FAISS retriever입니다.
+
+    search_many()는 질의들을 한 번의 임베딩 요청으로 임베딩하고, 질의 행렬로
+    FAISS를 한 번 검색합니다. multi_query()는 그 결과를 질의 간 중복 없이 하나의
+    목록으로 합칩니다. (Multi-Query RAG에서 재작성한 질의 N개를 검색할 때 사용)
+
+    search_type은 다음을 지원합니다.
+    - "similarity": 거리 순 상위 k개 (VectorStoreRetriever와 같음)
+    - "mmr": 상위 fetch_k개 후보 중 서로 겹치지 않는 k개. 후보 벡터는 문서를 다시
+      임베딩하지 않고 FAISS 인덱스에 저장된 벡터를 사용합니다.
+    - "similarity_score_threshold": 관련도가 score_threshold 이상인 청크만 최대
+      k개. 질의에 따라 반환 개수가 달라지며, 최소 min_k개는 반환합니다.
+    """
+
+    @model_validator(mode="after")
+    def prepare_index(self) -> "BatchRetriever":
+        """mmr 검색에서 후보 벡터를 읽을 수 있도록 IVF 인덱스의 direct map을 만듭니다.
+
+        여러 스레드가 동시에 검색하므로 검색 중에는 인덱스를 수정하지 않습니다.
+        """
+        if self.search_type == "mmr" and isinstance(self.vectorstore, FAISS):
+            make_direct_map(self.vectorstore.index)
+        return self
+
+    def _can_batch(self) -> bool:
+        return isinstance(self.vectorstore, FAISS) and isinstance(
+            self.vectorstore.embedding_function, Embeddings
+        )
+
+    def _query_embedding(self) -> Embeddings:
+        """질의 임베딩에 사용할 임베딩입니다.
+
+        CacheBackedEmbeddings.embed_documents는 결과를 문서 임베딩 캐시에 저장하므로
+        캐시 안쪽의 임베딩으로 질의를 임베딩합니다.
+        """
+        embedding = self.vectorstore.embedding_function
+        if isinstance(embedding, CacheBackedEmbeddings):
+            embedding = embedding.underlying_embeddings
+        return embedding
+
+    def _embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """질의들을 한 번의 임베딩 요청으로 임베딩합니다."""
+        embedding = self._query_embedding()
+        if isinstance(embedding, MeteredEmbeddings):
+            return embedding.embed_queries(queries)
+        return embedding.embed_documents(queries)
+
+    async def _aembed_queries(self, queries: List[str]) -> List[List[float]]:
+        embedding = self._query_embedding()
+        if isinstance(embedding, MeteredEmbeddings):
+            return await embedding.aembed_queries(queries)
+        return await embedding.aembed_documents(queries)
+
+    def _query_matrix(self, vectors) -> np.ndarray:
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if self.vectorstore._normalize_L2:
+            faiss.normalize_L2(matrix)
+        return matrix
+
+    def _document(self, position: int, documents: dict) -> Document:
+        """인덱스 위치의 Document를 반환합니다. (documents에 캐시)"""
+        if position not in documents:
+            _id = self.vectorstore.index_to_docstore_id[position]
+            doc = self.vectorstore.docstore.search(_id)
+            if not isinstance(doc, Document):
+                raise ValueError(f"Could not find document for id {_id}, got {doc}")
+            documents[position] = doc
+        return documents[position]
+
+    def _stored_vectors(self, positions) -> np.ndarray:
+        """인덱스에 저장된 벡터를 위치 순서대로 반환합니다."""
+        # IVF 인덱스의 direct map은 retriever를 생성할 때 만듭니다. (prepare_index)
+        positions = np.asarray(positions, dtype=np.int64)
+        return self.vectorstore.index.reconstruct_batch(positions)
+
+    def _search_vectors(
+        self, vectors, k: int = 4, filter=None, fetch_k: int = 20, **kwargs: Any
+    ) -> List[List[Tuple[Document, float]]]:
+        """질의 벡터 행렬로 FAISS를 한 번 검색하여 질의별 (문서, 거리) 목록을 반환합니다.
+
+        FAISS.similarity_search_with_score_by_vector와 같은 k, filter, fetch_k,
+        score_threshold 인자를 지원합니다. 여러 질의에서 검색된 같은 청크는
+        Document를 한 번만 만듭니다.
+        """
+        vectorstore = self.vectorstore
+        score_threshold = kwargs.get("score_threshold")
+        matrix = self._query_matrix(vectors)
+        scores, indices = vectorstore.index.search(
+            matrix, k if filter is None else fetch_k
+        )
+
+        filter_func = None
+        if filter is not None:
+            filter_func = vectorstore._create_filter_func(filter)
+        cmp = (
+            operator.ge
+            if vectorstore.distance_strategy
+            in (DistanceStrategy.MAX_INNER_PRODUCT, DistanceStrategy.JACCARD)
+            else operator.le
+        )
+
+        documents = {}
+        results = []
+        for row_scores, row_indices in zip(scores, indices):
+            docs = []
+            for score, position in zip(row_scores, row_indices):
+                if position == -1:
+                    # 인덱스의 문서 수가 k보다 적은 경우
+                    continue
+                doc = self._document(int(position), documents)
+                if filter_func is not None and not filter_func(doc.metadata):
+                    continue
+                if score_threshold is not None and not cmp(score, score_threshold):
+                    continue
+                docs.append((doc, float(score)))
+            results.append(docs[:k])
+        return results
+
+    def _mmr_search_vectors(
+        self,
+        vectors,
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        filter=None,
+        **kwargs: Any,
+    ) -> List[List[Document]]:
+        """질의별로 상위 fetch_k개 후보에서 MMR로 k개를 선택합니다.
+
+        후보 벡터는 모든 질의의 후보를 모아 reconstruct_batch로 한 번에 읽습니다.
+        """
+        vectorstore = self.vectorstore
+        matrix = self._query_matrix(vectors)
+        _, indices = vectorstore.index.search(matrix, fetch_k)
+
+        positions = np.unique(indices[indices >= 0])
+        stored = self._stored_vectors(positions) if len(positions) else None
+        filter_func = None
+        if filter is not None:
+            filter_func = vectorstore._create_filter_func(filter)
+
+        documents = {}
+        results = []
+        for query, row in zip(matrix, indices):
+            row = row[row >= 0]
+            if filter_func is not None:
+                keep = [
+                    filter_func(self._document(int(position), documents).metadata)
+                    for position in row
+                ]
+                row = row[np.asarray(keep, dtype=bool)]
+            if not len(row):
+                results.append([])
+                continue
+            candidates = stored[np.searchsorted(positions, row)]
+            selected = maximal_marginal_relevance(query, candidates, k, lambda_mult)
+            results.append([self._document(int(row[i]), documents) for i in selected])
+        return results
+
+    def _threshold_search_vectors(
+        self,
+        vectors,
+        score_threshold: float = 0.0,
+        min_k: int = 1,
+        **kwargs: Any,
+    ) -> List[List[Document]]:
+        """관련도(0~1)가 score_threshold 이상인 청크만 최대 k개 반환합니다.
+
+        기준을 넘는 청크가 min_k개보다 적으면 상위 min_k개를 반환합니다.
+        """
+        relevance_score_fn = self.vectorstore._select_relevance_score_fn()
+        results = []
+        for docs in self._search_vectors(vectors, **kwargs):
+            relevant = [
+                doc
+                for doc, score in docs
+                if relevance_score_fn(score) >= score_threshold
+            ]
+            if len(relevant) < min_k:
+                relevant = [doc for doc, _ in docs[:min_k]]
+            results.append(relevant)
+        return results
+
+    def _search_by_type(self, vectors, **kwargs: Any) -> List[List[Document]]:
+        """search_type에 따라 질의 벡터들을 검색합니다."""
+        kwargs = self.search_kwargs | kwargs
+        if self.search_type == "mmr":
+            return self._mmr_search_vectors(vectors, **kwargs)
+        if self.search_type == "similarity_score_threshold":
+            return self._threshold_search_vectors(vectors, **kwargs)
+        return [
+            [doc for doc, _ in docs] for docs in self._search_vectors(vectors, **kwargs)
+        ]
+
+    def search_by_vector(self, vector: List[float], **kwargs: Any) -> List[Document]:
+        """임베딩된 질의 벡터로 검색합니다. (질의 임베딩 캐시와 함께 사용)"""
+        if not self._can_batch():
+            kwargs = self.search_kwargs | kwargs
+            if self.search_type == "mmr":
+                return self.vectorstore.max_marginal_relevance_search_by_vector(
+                    vector, **kwargs
+                )
+            return self.vectorstore.similarity_search_by_vector(vector, **kwargs)
+        return self._search_by_type([vector], **kwargs)[0]
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun, **kwargs: Any
+    ) -> List[Document]:
+        if self.search_type == "similarity" or not self._can_batch():
+            return super()._get_relevant_documents(
+                query, run_manager=run_manager, **kwargs
+            )
+        vector = self.vectorstore.embedding_function.embed_query(query)
+        return self._search_by_type([vector], **kwargs)[0]
+
+    async def _aget_relevant_documents(
+        self,
+        query: str,
+        *,
+        run_manager: AsyncCallbackManagerForRetrieverRun,
+        **kwargs: Any,
+    ) -> List[Document]:
+        if self.search_type == "similarity" or not self._can_batch():
+            return await super()._aget_relevant_documents(
+                query, run_manager=run_manager, **kwargs
+            )
+        vector = await self.vectorstore.embedding_function.aembed_query(query)
+        results = await asyncio.to_thread(self._search_by_type, [vector], **kwargs)
+        return results[0]
+
+    def search_many(
+        self, queries: Sequence[str], **kwargs: Any
+    ) -> List[List[Document]]:
+        """질의별 검색 결과 목록을 질의 순서대로 반환합니다."""
+        queries = list(queries)
+        if not queries:
+            return []
+        if not self._can_batch():
+            return [self.invoke(query, **kwargs) for query in queries]
+        vectors = self._embed_queries(queries)
+        return self._search_by_type(vectors, **kwargs)
+
+    async def asearch_many(
+        self, queries: Sequence[str], **kwargs: Any
+    ) -> List[List[Document]]:
+        """search_many의 비동기 버전입니다. (FAISS 검색은 스레드에서 실행)"""
+        queries = list(queries)
+        if not queries:
+            return []
+        if not self._can_batch():
+            return await asyncio.gather(
+                *[self.ainvoke(query, **kwargs) for query in queries]
+            )
+        vectors = await self._aembed_queries(queries)
+        return await asyncio.to_thread(self._search_by_type, vectors, **kwargs)
+
+    @staticmethod
+    def combine(
+        result_lists: List[List[Document]],
+        fusion: Optional[str] = "rrf",
+        limit: Optional[int] = None,
+    ) -> List[Document]:
+        """질의별 결과를 중복 없이 하나의 목록으로 합칩니다.
+
+        fusion="rrf"이면 Reciprocal Rank Fusion 순위로, None이면 질의별 순위를
+        번갈아 가며(1위들, 2위들, ...) 처음 나온 순서대로 정렬합니다.
+        """
+        if fusion == "rrf":
+            docs = reciprocal_rank_fusion(result_lists)
+        elif fusion is None:
+            docs, seen = [], set()
+            for rank in range(max(map(len, result_lists), default=0)):
+                for results in result_lists:
+                    if rank < len(results):
+                        key = document_key(results[rank])
+                        if key not in seen:
+                            seen.add(key)
+                            docs.append(results[rank])
+        else:
+            raise ValueError(f"Unknown fusion method: {fusion}")
+        return docs if limit is None else docs[:limit]
+
+    def multi_query(
+        self,
+        queries: Sequence[str],
+        fusion: Optional[str] = "rrf",
+        limit: Optional[int] = None,
+        **kwargs: Any,
+    ) -> List[Document]:
+        """여러 질의의 검색 결과를 중복 없이 합쳐 반환합니다. (combine 참고)"""
+        return self.combine(self.search_many(queries, **kwargs), fusion, limit)
+
+    async def amulti_query(
+        self,
+        queries: Sequence[str],
+        fusion: Optional[str] = "rrf",
+        limit: Optional[int] = None,
+        **kwargs: Any,
+    ) -> List[Document]:
+        results = await self.asearch_many(queries, **kwargs)
+        return self.combine(results, fusion, limit)
@@ -0,0 +1,226 @@
+from .cache import SQLiteByteStore
+from .metrics import Metrics, default_metrics
+from .query_cache import normalize_query
+
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Sequence
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import time
+import httpx
+
+
+class SearchBackend(ABC):
+    """웹 검색 API 백엔드입니다.
+
+    search()는 {"title", "url", "content"} dict 목록을 반환합니다. name은
+    캐시 키에 포함되므로 백엔드마다 달라야 합니다.
+    """
+
+    name = "backend"
+
+    @abstractmethod
+    async def search(self, query: str, max_results: int) -> List[dict]:
+        pass
+
+    async def aclose(self) -> None:
+        pass
+
+
+class TavilyBackend(SearchBackend):
+    """Tavily Search API (POST {base_url}/search) 백엔드입니다.
+
+    하나의 httpx.AsyncClient를 재사용하여 요청마다 연결(TLS 핸드셰이크)을 새로
+    맺지 않습니다. base_url을 바꾸면 같은 형식의 로컬 stub 서버로 오프라인
+    테스트할 수 있습니다.
+    """
+
+    name = "tavily"
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        timeout: float = 20.0,
+        max_connections: int = 10,
+        **search_params,
+    ):
+        self.api_key = api_key or os.environ.get("TAVILY_API_KEY", "")
+        self.base_url = (
+            base_url or os.environ.get("TAVILY_BASE_URL") or "https://api.tavily.com"
+        )
+        # search_depth, topic, include_domains 등 Tavily 검색 옵션
+        self.search_params = search_params
+        self._client_options = {
+            "timeout": timeout,
+            "limits": httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+        }
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # 연결은 이벤트 루프에 묶이므로 실행 중인 루프가 바뀌면 새로 생성합니다.
+        # (예: 노트북에서 asyncio.run을 여러 번 호출하는 경우)
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client.is_closed or self._loop is not loop:
+            self._loop = loop
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                **self._client_options,
+            )
+        return self._client
+
+    async def search(self, query: str, max_results: int) -> List[dict]:
+        response = await self.client.post(
+            "/search",
+            json={"query": query, "max_results": max_results, **self.search_params},
+        )
+        response.raise_for_status()
+        return [
+            {
+                "title": result.get("title"),
+                "url": result.get("url"),
+                "content": result.get("content"),
+            }
+            for result in response.json().get("results", [])
+        ]
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class WebSearch:
+    """캐시와 동시 실행 제한을 갖춘 비동기 웹 검색입니다.
+
+    - 결과는 정규화된 질의(대소문자, 공백 무시)와 max_results로 SQLite 파일에
+      저장되어 ttl초 동안 재사용되며, 프로세스를 다시 시작해도 유지됩니다.
+    - 같은 질의가 동시에 들어오면 백엔드 요청을 한 번만 보냅니다.
+    - 백엔드 동시 요청 수는 max_concurrency개로 제한됩니다.
+    - 백엔드 요청이 실패하면 만료된 캐시 결과라도 있으면 그 결과를 반환합니다.
+    - search_many()로 여러 질의를 동시에 검색합니다.
+    """
+
+    # 캐시 값 형식이 바뀌면 값을 올려 이전 캐시를 무시합니다.
+    version = 1
+
+    def __init__(
+        self,
+        backend: Optional[SearchBackend] = None,
+        cache_path=".cache/web_search.sqlite",
+        ttl: Optional[float] = 24 * 3600.0,
+        max_concurrency: int = 4,
+        metrics: Metrics = default_metrics,
+    ):
+        self.backend = backend or TavilyBackend()
+        self.store = SQLiteByteStore(cache_path) if cache_path else None
+        self.ttl = ttl
+        self.max_concurrency = max_concurrency
+        self.metrics = metrics
+        self._loop = None
+        self._semaphore = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def _bind_loop(self) -> None:
+        """실행 중인 이벤트 루프용 semaphore와 진행 중 요청 목록을 준비합니다."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._inflight = {}
+
+    def cache_key(self, query: str, max_results: int) -> str:
+        digest = hashlib.sha256(normalize_query(query).encode("utf-8")).hexdigest()
+        return f"v{self.version}:{self.backend.name}:{max_results}:{digest}"
+
+    def _get_cached(self, key: str) -> Optional[dict]:
+        if self.store is None:
+            return None
+        value = self.store.mget([key])[0]
+        return None if value is None else json.loads(value)
+
+    def _is_fresh(self, record: dict) -> bool:
+        return self.ttl is None or time.time() - record["created"] <= self.ttl
+
+    async def _fetch(self, key: str, query: str, max_results: int, stale) -> list:
+        try:
+            async with self._semaphore:
+                with self.metrics.timer("web_search_seconds"):
+                    results = await self.backend.search(query, max_results)
+        except Exception as e:
+            self.metrics.increment("web_search_errors_total")
+            if stale is None:
+                raise
+            print(
+                f"Warning: Web search failed, using expired cache: {e}",
+                file=sys.stderr,
+            )
+            return stale["results"]
+        if self.store is not None:
+            record = {"created": time.time(), "query": query, "results": results}
+            try:
+                # SQLite 쓰기는 이벤트 루프를 막지 않도록 스레드에서 실행합니다.
+                await asyncio.to_thread(
+                    self.store.mset,
+                    [(key, json.dumps(record, ensure_ascii=False).encode("utf-8"))],
+                )
+            except Exception as e:
+                print(
+                    f"Warning: Failed to cache web search results: {e}",
+                    file=sys.stderr,
+                )
+        return results
+
+    async def search(self, query: str, max_results: int = 3) -> List[dict]:
+        """질의 하나를 검색합니다. (캐시된 결과가 유효하면 요청하지 않음)"""
+        key = self.cache_key(query, max_results)
+        record = await asyncio.to_thread(self._get_cached, key)
+        if record is not None and self._is_fresh(record):
+            self.metrics.increment("cache_hits_total", cache="web_search")
+            return record["results"]
+        self.metrics.increment("cache_misses_total", cache="web_search")
+
+        # 진행 중인 같은 질의의 요청 결과를 함께 기다립니다.
+        self._bind_loop()
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(
+                self._fetch(key, query, max_results, record)
+            )
+            inflight = self._inflight
+            inflight[key] = future
+            future.add_done_callback(lambda _: inflight.pop(key, None))
+        return await asyncio.shield(future)
+
+    async def search_many(
+        self, queries: Sequence[str], max_results: int = 3
+    ) -> List[List[dict]]:
+        """여러 질의를 동시에 검색하여 질의 순서대로 결과 목록을 반환합니다."""
+        return await asyncio.gather(
+            *[self.search(query, max_results) for query in queries]
+        )
+
+    @staticmethod
+    def merge(result_lists: List[List[dict]]) -> List[dict]:
+        """질의별 결과를 URL 기준으로 중복 없이 순위를 번갈아 가며 합칩니다."""
+        merged, seen = [], set()
+        for rank in range(max(map(len, result_lists), default=0)):
+            for results in result_lists:
+                if rank < len(results):
+                    key = results[rank].get("url") or results[rank].get("content")
+                    if key not in seen:
+                        seen.add(key)
+                        merged.append(results[rank])
+        return merged
+
+    async def aclose(self) -> None:
+        await self.backend.aclose()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 테스트에서 server 디렉토리의 rag 패키지를 import할 수 있도록 경로를 추가합니다.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,162 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+import argparse
+import base64
+import hashlib
+import json
+import threading
+import time
+import numpy as np
+
+
+def fake_vector(text: str, dim: int = 8) -> List[float]:
+    """텍스트마다 항상 같은 float32 벡터를 반환합니다."""
+    seed = int(hashlib.md5(text.encode("utf-8")).hexdigest()[:8], 16)
+    vector = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return vector.tolist()
+
+
+class FakeEmbeddingServer:
+    """OpenAI 임베딩 API(POST /v1/embeddings) 형식으로 응답하는 로컬 서버입니다.
+
+    OpenAIEmbeddings(base_url=server.url)로 네트워크 없이 임베딩 요청의 배치,
+    동시 요청 수, 처리량을 측정할 때 사용합니다.
+
+    - latency: 요청마다 응답 전에 기다리는 시간(초)
+    - capacity: 동시에 처리하는 요청이 이 수를 넘으면 429를 반환합니다.
+    - throttle_first: 처음 n개 요청은 429를 반환합니다.
+    """
+
+    def __init__(
+        self,
+        dim: int = 8,
+        latency: float = 0.0,
+        capacity: int = 0,
+        throttle_first: int = 0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        self.dim = dim
+        self.latency = latency
+        self.capacity = capacity
+        self.throttle_first = throttle_first
+
+        # 받은 요청 기록 (테스트에서 확인)
+        self.batch_sizes: List[int] = []
+        self.num_requests = 0
+        self.num_throttled = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status: int, payload: dict) -> None:
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                if status == 429:
+                    self.send_header("Retry-After", "0")
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                if self.path.rstrip("/") != "/v1/embeddings":
+                    return self._send(404, {"error": {"message": "Not found"}})
+
+                with server._lock:
+                    server.num_requests += 1
+                    server.in_flight += 1
+                    server.max_in_flight = max(server.max_in_flight, server.in_flight)
+                    throttled = server.num_requests <= server.throttle_first or (
+                        server.capacity and server.in_flight > server.capacity
+                    )
+                    if throttled:
+                        server.num_throttled += 1
+                try:
+                    if throttled:
+                        return self._send(
+                            429,
+                            {
+                                "error": {
+                                    "message": "Rate limit reached",
+                                    "type": "requests",
+                                    "code": "rate_limit_exceeded",
+                                }
+                            },
+                        )
+                    inputs = request.get("input", [])
+                    if isinstance(inputs, str):
+                        inputs = [inputs]
+                    with server._lock:
+                        server.batch_sizes.append(len(inputs))
+                    time.sleep(server.latency)
+                    self._send(200, server.response(inputs, request))
+                finally:
+                    with server._lock:
+                        server.in_flight -= 1
+
+        return Handler
+
+    def response(self, inputs: list, request: dict) -> dict:
+        data = []
+        for i, text in enumerate(inputs):
+            vector = fake_vector(str(text), self.dim)
+            if request.get("encoding_format") == "base64":
+                vector = base64.b64encode(
+                    np.asarray(vector, dtype=np.float32).tobytes()
+                ).decode()
+            data.append({"object": "embedding", "index": i, "embedding": vector})
+        return {
+            "object": "list",
+            "data": data,
+            "model": request.get("model", "fake"),
+            "usage": {"prompt_tokens": 0, "total_tokens": 0},
+        }
+
+    def start(self) -> "FakeEmbeddingServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeEmbeddingServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+if __name__ == "__main__":
+    # 예: python tests/fake_embedding_server.py --port 8100 --latency 0.2 --capacity 4
+    parser = argparse.ArgumentParser(description="Fake OpenAI embedding server")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--capacity", type=int, default=0)
+    args = parser.parse_args()
+    server = FakeEmbeddingServer(
+        dim=args.dim, latency=args.latency, capacity=args.capacity, port=args.port
+    )
+    print(f"Fake embedding server: {server.url}")
+    server.start()._thread.join()
@@ -0,0 +1,135 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+import argparse
+import json
+import threading
+import time
+
+
+def fake_results(query: str, max_results: int) -> List[dict]:
+    """질의마다 항상 같은 검색 결과를 반환합니다."""
+    return [
+        {
+            "title": f"{query} - result {i}",
+            "url": f"https://example.com/{query.replace(' ', '-')}/{i}",
+            "content": f"Content {i} about {query}",
+            "score": 1.0 / (i + 1),
+        }
+        for i in range(max_results)
+    ]
+
+
+class FakeSearchServer:
+    """Tavily Search API(POST /search) 형식으로 응답하는 로컬 서버입니다.
+
+    TavilyBackend(base_url=server.url) 또는 TAVILY_BASE_URL로 네트워크 없이
+    웹 검색의 캐시, 중복 요청 합치기, 동시 요청 수를 확인할 때 사용합니다.
+
+    - latency: 요청마다 응답 전에 기다리는 시간(초)
+    - fail_first: 처음 n개 요청은 500을 반환합니다.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        fail_first: int = 0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        self.latency = latency
+        self.fail_first = fail_first
+
+        # 받은 요청 기록 (테스트에서 확인)
+        self.queries: List[str] = []
+        self.num_requests = 0
+        self.num_failed = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status: int, payload: dict) -> None:
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                if self.path.rstrip("/") != "/search":
+                    return self._send(404, {"detail": {"error": "Not found"}})
+
+                with server._lock:
+                    server.num_requests += 1
+                    server.in_flight += 1
+                    server.max_in_flight = max(server.max_in_flight, server.in_flight)
+                    failed = server.num_requests <= server.fail_first
+                    if failed:
+                        server.num_failed += 1
+                    else:
+                        server.queries.append(request.get("query", ""))
+                try:
+                    time.sleep(server.latency)
+                    if failed:
+                        return self._send(500, {"detail": {"error": "Server error"}})
+                    query = request.get("query", "")
+                    self._send(
+                        200,
+                        {
+                            "query": query,
+                            "results": fake_results(
+                                query, int(request.get("max_results", 5))
+                            ),
+                            "response_time": server.latency,
+                        },
+                    )
+                finally:
+                    with server._lock:
+                        server.in_flight -= 1
+
+        return Handler
+
+    def start(self) -> "FakeSearchServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeSearchServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+if __name__ == "__main__":
+    # 예: python tests/fake_search_server.py --port 8200 --latency 0.5
+    #     TAVILY_BASE_URL=http://127.0.0.1:8200 python mcp_rag_server.py
+    parser = argparse.ArgumentParser(description="Fake Tavily search server")
+    parser.add_argument("--port", type=int, default=8200)
+    parser.add_argument("--latency", type=float, default=0.5)
+    args = parser.parse_args()
+    server = FakeSearchServer(latency=args.latency, port=args.port)
+    print(f"Fake search server: {server.url}")
+    server.start()._thread.join()
@@ -0,0 +1,42 @@
+from langchain_core.documents import Document
+from rag.bm25 import BM25Index, tokenize
+
+
+def index(*texts):
+    keyword_index = BM25Index()
+    keyword_index.add_documents([Document(page_content=text) for text in texts])
+    return keyword_index
+
+
+def test_tokenize_splits_cjk_into_bigrams():
+    assert tokenize("고양이는 GPT-4o") == ["고양", "양이", "이는", "gpt", "4o"]
+    # 한 글자 구간만 글자 토큰으로 남깁니다.
+    assert tokenize("이 고양이") == ["이", "고양", "양이"]
+    assert tokenize("猫") == ["猫"]
+
+
+def test_korean_word_matches_word_with_particle():
+    keyword_index = index("고양이는 귀엽다", "강아지가 짖는다", "The cat is cute")
+    assert [doc.page_content for doc in keyword_index.search("고양이", 1)] == [
+        "고양이는 귀엽다"
+    ]
+    assert [doc.page_content for doc in keyword_index.search("강아지", 1)] == [
+        "강아지가 짖는다"
+    ]
+    assert [doc.page_content for doc in keyword_index.search("CAT", 1)] == [
+        "The cat is cute"
+    ]
+
+
+def test_bigrams_rank_exact_phrase_first():
+    keyword_index = index("이 고양이 사진", "양이 많은 고기")
+    assert keyword_index.search("고양이", 2)[0].page_content == "이 고양이 사진"
+
+
+def test_common_syllable_is_not_indexed_alone():
+    keyword_index = index("고양이는 귀엽다", "이것은 사과", "이 고양이 사진")
+    # "이"는 모든 문서에 나오지만 한 글자 구간이 있는 문서만 posting에 포함됩니다.
+    assert len(keyword_index.postings["이"]) == 1
+    assert [doc.page_content for doc in keyword_index.search("이", 3)] == [
+        "이 고양이 사진"
+    ]
@@ -0,0 +1,37 @@
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_community.vectorstores import FAISS
+from rag.chunks import ChunkSet
+from rag.mmap_store import load_vectorstore, write_vectorstore
+
+
+def merged_chunk():
+    return Document(
+        page_content="중복 제거로 합쳐진 청크",
+        metadata={
+            "source": "a.pdf",
+            "sources": [{"source": "a.pdf", "page": 0}, {"source": "b.pdf", "page": 3}],
+        },
+    )
+
+
+def mutate(doc: Document) -> None:
+    doc.metadata["sources"].append({"source": "c.pdf", "page": 1})
+    doc.metadata["sources"][0]["page"] = 99
+
+
+def test_chunk_set_documents_do_not_share_metadata():
+    doc = merged_chunk()
+    chunks = ChunkSet([doc.page_content], [doc.metadata], [0], [0], [4])
+    mutate(chunks[0])
+    assert chunks[0].metadata == merged_chunk().metadata
+
+
+def test_columnar_docstore_documents_do_not_share_metadata(tmp_path):
+    vectorstore = FAISS.from_documents(
+        [merged_chunk()], DeterministicFakeEmbedding(size=8)
+    )
+    write_vectorstore(tmp_path, vectorstore)
+    docstore = load_vectorstore(tmp_path, vectorstore.embeddings).docstore
+    mutate(docstore.search(0))
+    assert docstore.search(0).metadata == merged_chunk().metadata
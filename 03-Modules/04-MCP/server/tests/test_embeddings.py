@@ -0,0 +1,91 @@
+from langchain_openai import OpenAIEmbeddings
+from rag.embeddings import ConcurrentEmbeddings
+from fake_embedding_server import FakeEmbeddingServer, fake_vector
+import asyncio
+import numpy as np
+import pytest
+
+
+def client(server: FakeEmbeddingServer, **kwargs) -> ConcurrentEmbeddings:
+    embeddings = OpenAIEmbeddings(
+        model="text-embedding-3-small",
+        base_url=server.url,
+        api_key="test",
+        # 재시도는 ConcurrentEmbeddings가 처리합니다.
+        max_retries=0,
+        check_embedding_ctx_length=False,
+    )
+    return ConcurrentEmbeddings(embeddings, **kwargs)
+
+
+def texts(n: int):
+    return [f"chunk {i}" for i in range(n)]
+
+
+def assert_vectors(result, inputs, dim=8):
+    expected = np.array([fake_vector(text, dim) for text in inputs])
+    np.testing.assert_allclose(np.array(result), expected, rtol=1e-6)
+
+
+def test_batches_keep_order():
+    inputs = texts(1000)
+    with FakeEmbeddingServer() as server:
+        result = client(server, batch_size=64, max_concurrency=4).embed_documents(
+            inputs
+        )
+    assert sorted(server.batch_sizes) == [40] + [64] * 15
+    assert_vectors(result, inputs)
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_concurrency_is_capped(use_async):
+    inputs = texts(32 * 12)
+    with FakeEmbeddingServer(latency=0.05) as server:
+        embeddings = client(server, batch_size=32, max_concurrency=3)
+        if use_async:
+            result = asyncio.run(embeddings.aembed_documents(inputs))
+        else:
+            result = embeddings.embed_documents(inputs)
+    assert server.max_in_flight == 3
+    assert server.num_throttled == 0
+    assert_vectors(result, inputs)
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_backoff_when_throttled(use_async):
+    inputs = texts(32 * 16)
+    # 동시 요청이 2개를 넘거나 처음 3개 요청이면 429를 반환하는 서버
+    with FakeEmbeddingServer(latency=0.02, capacity=2, throttle_first=3) as server:
+        embeddings = client(
+            server, batch_size=32, max_concurrency=8, initial_backoff=0.01
+        )
+        if use_async:
+            result = asyncio.run(embeddings.aembed_documents(inputs))
+        else:
+            result = embeddings.embed_documents(inputs)
+    assert server.num_throttled >= 3
+    # 429를 받으면 동시 요청 수를 줄이므로 모든 배치가 결국 성공합니다.
+    assert len(server.batch_sizes) == 16
+    assert embeddings._limit < 8
+    assert_vectors(result, inputs)
+
+
+def test_gives_up_after_max_retries():
+    with FakeEmbeddingServer(throttle_first=100) as server:
+        embeddings = client(server, max_retries=2, initial_backoff=0.01)
+        with pytest.raises(Exception) as error:
+            embeddings.embed_documents(texts(4))
+    assert error.value.status_code == 429
+    assert server.num_requests == 3
+
+
+@pytest.mark.parametrize("concurrency", [1, 4])
+def test_batches_are_requested_concurrently(concurrency):
+    # 처리 시간 대신 서버가 동시에 처리한 요청 수로 배치 요청이 겹치는지 확인합니다.
+    inputs = texts(64 * 8)
+    with FakeEmbeddingServer(latency=0.05) as server:
+        client(server, batch_size=64, max_concurrency=concurrency).embed_documents(
+            inputs
+        )
+    assert server.max_in_flight == concurrency
+    assert len(server.batch_sizes) == 8
@@ -0,0 +1,49 @@
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from rag.live_index import WAL_ARCHIVE, WAL_FILE, LiveIndex
+import json
+
+
+def docs(*texts):
+    return [Document(page_content=text, metadata={"source": "test"}) for text in texts]
+
+
+def contents(live_index: LiveIndex):
+    with live_index.read() as (vector_store, _):
+        return sorted(doc.page_content for doc in vector_store.docstore._dict.values())
+
+
+def wal_seqs(path):
+    if not path.exists():
+        return []
+    return [json.loads(line)["seq"] for line in path.open("rb")]
+
+
+def test_snapshot_rotates_wal(tmp_path):
+    embeddings = DeterministicFakeEmbedding(size=8)
+    source = docs("source 0", "source 1")
+    source_vectors = embeddings.embed_documents([doc.page_content for doc in source])
+
+    live_index = LiveIndex(embeddings, tmp_path, snapshot_every=3)
+    live_index.build(source, source_vectors, source="v1")
+    for i in range(5):
+        live_index.add_documents_sync(docs(f"added {i}"))
+
+    # 스냅샷(seq 3)에 반영된 기록은 보관 파일로 옮겨지고 이후 기록만 WAL에 남습니다.
+    assert wal_seqs(tmp_path / WAL_FILE) == [4, 5]
+    assert wal_seqs(tmp_path / WAL_ARCHIVE) == [1, 2, 3]
+
+    # 재시작하면 스냅샷을 읽고 남은 WAL만 다시 적용합니다.
+    restarted = LiveIndex(embeddings, tmp_path, snapshot_every=3)
+    assert restarted.load(source="v1")
+    assert contents(restarted) == contents(live_index)
+    restarted.add_documents_sync(docs("added 5"))
+    assert wal_seqs(tmp_path / WAL_FILE) == []
+    assert wal_seqs(tmp_path / WAL_ARCHIVE) == [1, 2, 3, 4, 5, 6]
+
+    # 원본이 바뀌어 새로 만들 때는 보관된 기록을 포함해 추가한 문서를 모두 적용합니다.
+    rebuilt = LiveIndex(embeddings, tmp_path, snapshot_every=3)
+    assert not rebuilt.load(source="v2")
+    rebuilt.build(source[:1], source_vectors[:1], source="v2")
+    assert contents(rebuilt) == sorted(["source 0"] + [f"added {i}" for i in range(6)])
+    assert wal_seqs(tmp_path / WAL_ARCHIVE) == [1, 2, 3, 4, 5, 6]
@@ -0,0 +1,77 @@
+from langchain.embeddings.cache import CacheBackedEmbeddings
+from langchain.storage import InMemoryByteStore
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from rag.index import build_index
+from rag.metrics import MeteredEmbeddings, Metrics
+from rag.mmap_store import MMAP_READ_FLAGS
+from rag.retriever import BatchRetriever
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import faiss
+import numpy as np
+import pytest
+
+
+def chunk_count(metrics: Metrics) -> float:
+    return sum(metrics.snapshot()["counters"].get("chunks_embedded_total", {}).values())
+
+
+@pytest.mark.parametrize("search_type", ["similarity", "mmr"])
+def test_batched_search_does_not_cache_queries(search_type):
+    metrics = Metrics()
+    store = InMemoryByteStore()
+    embedding = CacheBackedEmbeddings(
+        MeteredEmbeddings(DeterministicFakeEmbedding(size=16), metrics), store
+    )
+    texts = [f"chunk {i}" for i in range(20)]
+    retriever = BatchRetriever(
+        vectorstore=FAISS.from_texts(texts, embedding),
+        search_type=search_type,
+        search_kwargs={"k": 2, "fetch_k": 5},
+    )
+    cached_keys = sorted(store.yield_keys())
+    assert len(cached_keys) == len(texts)
+    assert chunk_count(metrics) == len(texts)
+
+    queries = ["chunk 3", "new question", "another question"]
+    results = retriever.search_many(queries)
+    results += asyncio.run(retriever.asearch_many(queries))
+    assert [len(docs) for docs in results] == [2] * 6
+    if search_type == "similarity":
+        assert results[0][0].page_content == "chunk 3"
+
+    # 질의 벡터는 문서 임베딩 캐시에 저장되지 않고 청크 수에도 포함되지 않습니다.
+    assert sorted(store.yield_keys()) == cached_keys
+    assert chunk_count(metrics) == len(texts)
+    histograms = metrics.snapshot()["histograms"]["stage_duration_seconds"]
+    assert histograms['{stage="embed_query"}']["count"] == 2
+
+
+@pytest.mark.parametrize("mmap", [False, True])
+def test_mmr_on_ivf_index_does_not_modify_index_while_searching(tmp_path, mmap):
+    embedding = DeterministicFakeEmbedding(size=16)
+    texts = [f"chunk {i}" for i in range(200)]
+    vectorstore = FAISS.from_texts(texts, embedding)
+    vectors = vectorstore.index.reconstruct_n(0, len(texts))
+    index = build_index(vectors, "ivf_flat", nlist=4)
+    index.add(vectors)
+    if mmap:
+        faiss.write_index(index, str(tmp_path / "index.faiss"))
+        index = faiss.read_index(str(tmp_path / "index.faiss"), MMAP_READ_FLAGS)
+    vectorstore.index = index
+
+    retriever = BatchRetriever(
+        vectorstore=vectorstore,
+        search_type="mmr",
+        search_kwargs={"k": 3, "fetch_k": 10},
+    )
+    # direct map은 retriever를 생성할 때 한 번만 만듭니다.
+    ivf = faiss.extract_index_ivf(index)
+    assert ivf.direct_map.type != faiss.DirectMap.NoMap
+    np.testing.assert_array_equal(ivf.reconstruct_n(0, len(texts)), vectors)
+
+    queries = [f"question {i}" for i in range(32)]
+    with ThreadPoolExecutor(8) as executor:
+        results = list(executor.map(retriever.invoke, queries))
+    assert [len(docs) for docs in results] == [3] * len(queries)
@@ -0,0 +1,75 @@
+from rag.metrics import Metrics
+from rag.web_search import TavilyBackend, WebSearch
+from fake_search_server import FakeSearchServer, fake_results
+import asyncio
+import httpx
+import pytest
+
+
+def client(server: FakeSearchServer, cache_path, **kwargs) -> WebSearch:
+    return WebSearch(
+        TavilyBackend(api_key="test", base_url=server.url),
+        cache_path=cache_path,
+        metrics=Metrics(),
+        **kwargs,
+    )
+
+
+def expected(query: str, max_results: int = 3):
+    # TavilyBackend는 title, url, content만 반환합니다.
+    return [
+        {key: result[key] for key in ("title", "url", "content")}
+        for result in fake_results(query, max_results)
+    ]
+
+
+def search(web_search: WebSearch, *queries, max_results=3):
+    async def run():
+        try:
+            return await web_search.search_many(queries, max_results)
+        finally:
+            await web_search.aclose()
+
+    return asyncio.run(run())
+
+
+def test_results_are_cached_across_instances(tmp_path):
+    cache_path = tmp_path / "web_search.sqlite"
+    with FakeSearchServer() as server:
+        assert search(client(server, cache_path), "AI 정책") == [expected("AI 정책")]
+        # 대소문자와 공백이 달라도 같은 질의로 취급하며, 재시작 후에도 캐시를 사용합니다.
+        assert search(client(server, cache_path), "  ai   정책 ") == [expected("AI 정책")]
+        search(client(server, cache_path), "AI 정책", max_results=5)
+    assert server.queries == ["AI 정책", "AI 정책"]
+
+
+def test_concurrent_identical_queries_share_one_request(tmp_path):
+    with FakeSearchServer(latency=0.1) as server:
+        results = search(
+            client(server, tmp_path / "web_search.sqlite"), *["GPT-4o"] * 8
+        )
+    assert server.num_requests == 1
+    assert results == [expected("GPT-4o")] * 8
+
+
+def test_concurrency_is_capped(tmp_path):
+    queries = [f"query {i}" for i in range(12)]
+    with FakeSearchServer(latency=0.05) as server:
+        web_search = client(server, tmp_path / "web_search.sqlite", max_concurrency=3)
+        results = search(web_search, *queries)
+    assert server.max_in_flight == 3
+    assert results == [expected(query) for query in queries]
+
+
+def test_expired_cache_is_used_when_backend_fails(tmp_path):
+    cache_path = tmp_path / "web_search.sqlite"
+    with FakeSearchServer() as server:
+        search(client(server, cache_path), "RAG")
+    # 캐시가 만료되었고 백엔드 요청이 실패하면 만료된 결과를 반환합니다.
+    with FakeSearchServer(fail_first=1) as server:
+        assert search(client(server, cache_path, ttl=0), "RAG") == [expected("RAG")]
+        assert server.num_failed == 1
+    # 만료된 결과도 없으면 오류를 그대로 전달합니다.
+    with FakeSearchServer(fail_first=1) as server:
+        with pytest.raises(httpx.HTTPStatusError):
+            search(client(server, cache_path, ttl=0), "MCP")